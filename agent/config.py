@@ -7,4 +7,189 @@ load_dotenv()  # Automatically loads .env file
 TRAKT_URL = "https://api.trakt.tv"
 TRAKT_CLIENT_ID = os.getenv("TRAKT_CLIENT_ID")
 TRAKT_CLIENT_SECRET = os.getenv("TRAKT_CLIENT_SECRET")
-TRAKT_ACCESS_TOKEN = os.getenv("TRAKT_ACCESS_TOKEN")
\ No newline at end of file
+TRAKT_ACCESS_TOKEN = os.getenv("TRAKT_ACCESS_TOKEN")
+
+
+# TRENDING / POPULAR LIST CACHE
+# Seconds before a cached top list (trending, popular...) is refreshed in the background.
+TOP_LIST_SOFT_TTL_SECONDS = int(os.getenv("TOP_LIST_SOFT_TTL_SECONDS", 600))
+# Seconds between sweeps of the background refresher (0 disables the refresher thread).
+TOP_LIST_REFRESH_INTERVAL_SECONDS = int(os.getenv("TOP_LIST_REFRESH_INTERVAL_SECONDS", 0))
+
+
+# TRAKT USER LISTS
+# Seconds a mirrored page of a user's list (watchlist etc.) is served from memory.
+USER_LIST_CACHE_TTL_SECONDS = int(os.getenv("USER_LIST_CACHE_TTL_SECONDS", 120))
+
+
+# STARTUP
+# Warm Trakt/LLM connections and prefetch common lists in the background on launch.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "False") == "True"
+
+
+# MOVIE METADATA CACHES
+# Seconds raw movie metadata, people and title-search results are kept in memory.
+MOVIE_CACHE_TTL_SECONDS = int(os.getenv("MOVIE_CACHE_TTL_SECONDS", 86400))
+MOVIE_CACHE_MAX_ENTRIES = int(os.getenv("MOVIE_CACHE_MAX_ENTRIES", 20000))
+# Snapshot file loaded on startup (and optionally written on exit) so new replicas start warm.
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH")
+CACHE_SNAPSHOT_SAVE_ON_EXIT = os.getenv("CACHE_SNAPSHOT_SAVE_ON_EXIT", "False") == "True"
+
+
+# ASYNC CHAT
+# Max chat turns Gradio runs at once (0 = unlimited). Turns are async, so this is not tied to threads.
+CHAT_CONCURRENCY_LIMIT = int(os.getenv("CHAT_CONCURRENCY_LIMIT", 64))
+# Threads for the blocking Trakt calls made by async tools.
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", 16))
+# Most tool calls from one model message run at the same time (0: no limit)
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", 8))
+
+
+# CHAT SESSIONS
+# Messages kept per browser session (oldest are dropped first).
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", 20))
+# Seconds of inactivity before a session's history is dropped.
+SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", 3600))
+# Max live sessions, and max bytes of history held across all of them (least recently used evicted first).
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+SESSION_STORE_MAX_BYTES = int(os.getenv("SESSION_STORE_MAX_BYTES", 50_000_000))
+# Movies remembered per session so follow-ups ("add it") can reuse their trakt_id.
+SESSION_MAX_ENTITIES = int(os.getenv("SESSION_MAX_ENTITIES", 50))
+
+
+# PROMPT BUDGET
+# Estimated tokens allowed per agent prompt (system prompt + tool schemas + history).
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000))
+# Characters per token used by the local token estimator (tune with `calibration_stats()`).
+TOKEN_ESTIMATE_CHARS_PER_TOKEN = float(os.getenv("TOKEN_ESTIMATE_CHARS_PER_TOKEN", 3.5))
+# Mark the system prompt, tool schemas and conversation summary as cacheable (Anthropic).
+PROMPT_CACHING_ENABLED = os.getenv("PROMPT_CACHING_ENABLED", "True") == "True"
+
+
+# ROLLING SUMMARY
+# Fold older turns into a running summary (movies, trakt_ids, preferences) after each reply.
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "True") == "True"
+# Most recent messages always sent verbatim rather than summarized.
+SUMMARY_KEEP_RECENT_MESSAGES = int(os.getenv("SUMMARY_KEEP_RECENT_MESSAGES", 6))
+# Older messages that must pile up before the summary is regenerated.
+SUMMARY_MIN_NEW_MESSAGES = int(os.getenv("SUMMARY_MIN_NEW_MESSAGES", 4))
+
+
+# LLM RESPONSE CACHE
+# Reuse answers to identical deterministic helper prompts (expect_json or low temperature).
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True") == "True"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2048))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 86400))
+# Highest temperature cached for calls that do not expect JSON.
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.2))
+# SQLite file for a persistent second tier (unset = memory only).
+LLM_CACHE_SQLITE_PATH = os.getenv("LLM_CACHE_SQLITE_PATH")
+
+
+# INTENT ROUTER
+# Send simple commands (trending, show watchlist, add/remove X) straight to their tool.
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "True") == "True"
+
+
+# LOCAL RENDERING
+# Actions whose results are rendered to Markdown locally; the LLM then only writes a
+# short wrapper instead of formatting every movie. Comma-separated action names out of
+# GetTrending, GetSimilar, GetUserList, GetMovieDetails, GetMovieDetailsBatch,
+# AddOrRemoveFromWatchList.
+LOCAL_RENDER_ACTIONS = [
+    a.strip() for a in os.getenv(
+        "LOCAL_RENDER_ACTIONS", "GetTrending,GetSimilar,GetUserList,GetMovieDetails"
+    ).split(",") if a.strip()
+]
+
+
+# TOOL OUTPUT ENCODING
+# Send tool results without null/empty fields and movie lists as a header + rows table,
+# instead of the full model JSON. Long descriptions are cut to TOOL_OUTPUT_DESCRIPTION_CHARS.
+TOOL_OUTPUT_COMPACT = os.getenv("TOOL_OUTPUT_COMPACT", "True") == "True"
+TOOL_OUTPUT_DESCRIPTION_CHARS = int(os.getenv("TOOL_OUTPUT_DESCRIPTION_CHARS", 300))
+
+
+# TOOL SELECTION
+# Offer the agent only the tools relevant to each message (smaller tool schema payload).
+TOOL_SELECTION_ENABLED = os.getenv("TOOL_SELECTION_ENABLED", "True") == "True"
+
+
+# TOOL MEMO
+# Reuse results of repeated read-only tool calls with the same arguments. Scope "turn"
+# keeps them for one agent turn, "session" for TOOL_MEMO_SESSION_TTL_SECONDS per chat session.
+TOOL_MEMO_ENABLED = os.getenv("TOOL_MEMO_ENABLED", "True") == "True"
+TOOL_MEMO_SCOPE = os.getenv("TOOL_MEMO_SCOPE", "turn")
+TOOL_MEMO_SESSION_TTL_SECONDS = int(os.getenv("TOOL_MEMO_SESSION_TTL_SECONDS", 300))
+
+
+# BATCH MOVIE DETAILS
+# Lookups run at once by the multi-movie details tool, and most movies it accepts per call.
+BATCH_DETAILS_MAX_WORKERS = int(os.getenv("BATCH_DETAILS_MAX_WORKERS", 5))
+BATCH_DETAILS_MAX_MOVIES = int(os.getenv("BATCH_DETAILS_MAX_MOVIES", 10))
+
+
+# LLM ADMISSION
+# Process-wide limits on LLM calls: requests in flight at once and estimated input tokens
+# per minute (0 = no limit; both 0 disables admission control). Waiting calls are served
+# round-robin across chat sessions. A call that would wait longer than
+# LLM_MAX_QUEUE_WAIT_SECONDS is turned away with a "busy, try again" reply.
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 16))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+LLM_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("LLM_MAX_QUEUE_WAIT_SECONDS", 20))
+
+
+# LLM FAILOVER
+# Backup LLM backends tried after the primary model, as comma-separated provider:model
+# pairs (e.g. "anthropic:claude-sonnet-4-5,openai:gpt-4o-mini"). Empty = primary only.
+LLM_FALLBACK_BACKENDS = [
+    b.strip() for b in os.getenv("LLM_FALLBACK_BACKENDS", "").split(",") if b.strip()
+]
+# Seconds a backend gets to answer (to send its first chunk when streaming) before the next is tried.
+LLM_BACKEND_TIMEOUT_SECONDS = float(os.getenv("LLM_BACKEND_TIMEOUT_SECONDS", 30))
+# A backend whose error rate over its last LLM_BACKEND_WINDOW calls reaches
+# LLM_BACKEND_MAX_ERROR_RATE is skipped for LLM_BACKEND_COOLDOWN_SECONDS.
+LLM_BACKEND_WINDOW = int(os.getenv("LLM_BACKEND_WINDOW", 20))
+LLM_BACKEND_MAX_ERROR_RATE = float(os.getenv("LLM_BACKEND_MAX_ERROR_RATE", 0.5))
+LLM_BACKEND_COOLDOWN_SECONDS = float(os.getenv("LLM_BACKEND_COOLDOWN_SECONDS", 30))
+
+
+# MODEL TIERS
+# Larger model, as "provider:model" (e.g. "anthropic:claude-sonnet-4-5"), that writes the
+# agent's replies from tool results. The main model then only decides which tools to call
+# and answers simple messages itself. Empty = the main model does everything.
+LLM_RESPONSE_MODEL = os.getenv("LLM_RESPONSE_MODEL", "")
+
+
+# AGENT BUDGETS
+# Per-turn limits on the agent loop: model calls (the final answer included), tool calls
+# and model tokens (input + output). Once one is reached the model must answer from the
+# results it already has. 0 = no limit.
+AGENT_MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", 8))
+AGENT_MAX_TOOL_CALLS = int(os.getenv("AGENT_MAX_TOOL_CALLS", 12))
+AGENT_MAX_TURN_TOKENS = int(os.getenv("AGENT_MAX_TURN_TOKENS", 60000))
+
+
+# TRACING
+# Share of chat turns traced (0 to 1), as nested spans for the turn, the agent, each model
+# call, each tool, each Trakt request and Trakt-to-model mapping. 0 = off.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+# Also keep turns that were not sampled when they take at least this many seconds. This
+# records every turn and only exports the slow ones. 0 = sampled turns only.
+TRACE_SLOW_TURN_SECONDS = float(os.getenv("TRACE_SLOW_TURN_SECONDS", 0))
+# Where kept turns are written: a JSONL file (one span per line), a file of OTLP/JSON
+# export requests (one turn per line), and/or an OTLP/HTTP collector endpoint
+# (e.g. "http://localhost:4318/v1/traces"). Empty = not written there.
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "")
+TRACE_OTLP_PATH = os.getenv("TRACE_OTLP_PATH", "")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+
+
+# METRICS
+# Serve Prometheus metrics (tool / Trakt latency, cache hit rates, tokens per turn, active
+# sessions, queue depths) at METRICS_PATH next to the chat UI. The app is then run by
+# uvicorn on SERVER_NAME:SERVER_PORT; otherwise Gradio launches it as before.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+SERVER_NAME = os.getenv("GRADIO_SERVER_NAME", "127.0.0.1")
+SERVER_PORT = int(os.getenv("GRADIO_SERVER_PORT", 7860))
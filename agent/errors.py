@@ -168,4 +168,25 @@ class LLMEmptyResponse(LLMError):
             message="LLM returned an empty response",
             provider=provider,
             model=model,
-        )
\ No newline at end of file
+        )
+
+class LLMOverloadedError(LLMError):
+    """
+    Raised when an LLM call is not admitted because the process-wide queue would make
+    it wait longer than allowed. `user_message` is safe to show in the chat.
+    """
+
+    def __init__(
+        self,
+        estimated_wait_seconds: Optional[float] = None,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+    ):
+        self.estimated_wait_seconds = estimated_wait_seconds
+        self.user_message = (
+            "I'm handling a lot of requests right now. Please try again in a few seconds."
+        )
+        message = "LLM admission queue is full"
+        if estimated_wait_seconds is not None:
+            message += f" (estimated wait {estimated_wait_seconds:.1f}s)"
+        super().__init__(message=message, provider=provider, model=model)
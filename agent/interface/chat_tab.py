@@ -1,18 +1,36 @@
 import os
-import uuid
+import time
 
 import gradio as gr
-from langchain_anthropic.chat_models import ChatAnthropic
-from langchain_core.chat_history import InMemoryChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.messages import HumanMessage, AIMessage
 
-from agent.movie_agent import movie_agent_runnable
+from agent.config import (
+    CHAT_CONCURRENCY_LIMIT,
+    INTENT_ROUTER_ENABLED,
+    SUMMARY_ENABLED,
+    TOOL_SELECTION_ENABLED,
+)
+from agent.errors import LLMOverloadedError
+from agent.utils import tracing
+from agent.utils.background import run_blocking
+from agent.utils.metrics import TURN_DURATION, TURNS_IN_PROGRESS
+from agent.utils.session_store import CONVERSATION_STORE
+
+# Status line shown while a tool runs
+TOOL_STATUS_LABELS = {
+    "get_trending": "Fetching trending movies",
+    "get_movie_details": "Looking up movie details",
+    "get_multiple_movie_details": "Looking up movie details",
+    "get_similar_movies": "Finding similar movies",
+    "get_user_list": "Loading your watchlist",
+    "update_watchlist": "Updating your watchlist",
+}
+
+
+def tool_status_html(tool_name: str) -> str:
+    label = TOOL_STATUS_LABELS.get(tool_name, f"Running {tool_name}")
+    return f"<span>🔎 {label}…</span>"
 
-session_id = str(uuid.uuid4())
-
-# --- Multi-session memory ---
-SESSION_HISTORY = []
 
 # --- Chat tab ---
 def get_chat_tab():
@@ -37,30 +55,129 @@ def get_chat_tab():
 
         # --- Message processing ---
 
-        def process_message(user_message, gradio_history_list):
+        async def process_message(user_message, gradio_history_list, request: gr.Request):
+            """
+            Stream the agent's reply into the chat as it is generated. Yields
+            (chat history, cleared textbox, tool status HTML) after every update.
+
+            Runs on the event loop: model calls are awaited and tools run on a
+            small I/O pool, so an in-flight turn does not hold a Gradio worker thread.
+            """
             if not user_message.strip():
-                return gradio_history_list, "", ""
+                yield gradio_history_list, "", ""
+                return
 
-            # Append user message to
-            SESSION_HISTORY.append(HumanMessage(content=user_message))
+            # Each browser session gets its own history
+            session_id = request.session_hash if request else "default"
 
-            # --- Call LLM with 6 messages of memory ---
-            ai_resp = movie_agent_runnable.invoke(SESSION_HISTORY[-6:])
+            # Root span of this turn's trace (a no-op unless the turn is sampled)
+            turn_span = tracing.start_turn("process_message", session_id=session_id)
+            started_at = time.perf_counter()
+
+            # Append user message to
+            CONVERSATION_STORE.append(session_id, HumanMessage(content=user_message))
+
+            # Show the user's message straight away with an empty reply to fill in
+            gradio_history_list.append((user_message, ""))
+            yield gradio_history_list, "", ""
+
+            # --- Call LLM with as much recent memory as fits CONTEXT_TOKEN_BUDGET ---
+            # Imported lazily: building the agent pulls in langchain and compiles the graph
+            from agent.movie_agent import (
+                conversation_summarizer,
+                get_movie_agent,
+                intent_router,
+                tool_selector,
+            )
+            from agent.logic.entity_memory import entity_table_section
+
+            streamed_text = ""
+            final_text = ""
+
+            # Simple commands go straight to their tool; everything else to the agent
+            routed_intent = intent_router.route(user_message) if INTENT_ROUTER_ENABLED else None
+            if routed_intent:
+                turn_span.set_attribute("routed_intent", routed_intent["intent"])
+                events = intent_router.astream(
+                    routed_intent, user_message, session_id=session_id, parent_span=turn_span
+                )
+            else:
+                # The first turn may still be waiting on the agent build; don't block the loop on it
+                movie_agent = await run_blocking(get_movie_agent)
+
+                # Turns already folded into the rolling summary are sent as the summary instead,
+                # and movies resolved earlier in the session as a compact trakt_id table
+                context_sections = {
+                    **conversation_summarizer.context_sections(session_id),
+                    **entity_table_section(session_id),
+                }
+                # Only the tools relevant to this message are offered (smaller prompt)
+                tool_names = (
+                    tool_selector.select(user_message, session_id) if TOOL_SELECTION_ENABLED else None
+                )
+                events = movie_agent.astream(
+                    CONVERSATION_STORE.history(session_id, include_summarized=False),
+                    context_sections=context_sections,
+                    session_id=session_id,
+                    tool_names=tool_names,
+                    parent_span=turn_span,
+                )
+
+            TURNS_IN_PROGRESS.inc()
+            try:
+                async for event in events:
+                    if event["type"] == "token":
+                        streamed_text += event["text"]
+                        gradio_history_list[-1] = (user_message, streamed_text)
+                        yield gradio_history_list, "", ""
+
+                    elif event["type"] == "tool_start":
+                        # Text before a tool call is the model thinking aloud, not the answer
+                        streamed_text = ""
+                        gradio_history_list[-1] = (user_message, "")
+                        yield gradio_history_list, "", tool_status_html(event["tool"])
+
+                    elif event["type"] == "final":
+                        final_text = event["content"]
+                        if not routed_intent:
+                            intent_router.record_agent_turn(event["timings"]["total_time"])
+            except LLMOverloadedError as e:
+                # Too many LLM calls queued across all users: say so rather than wait past the deadline
+                final_text = e.user_message
+                turn_span.record_error(e)
+            except Exception as e:
+                turn_span.record_error(e)
+                raise
+            finally:
+                turn_span.end()
+                TURNS_IN_PROGRESS.dec()
+                TURN_DURATION.observe(
+                    time.perf_counter() - started_at, route="router" if routed_intent else "agent"
+                )
 
             # --- Append AI response to memory ---
-            SESSION_HISTORY.append(ai_resp)
+            CONVERSATION_STORE.append(session_id, AIMessage(content=final_text))
+            if SUMMARY_ENABLED:
+                conversation_summarizer.schedule(session_id)
 
             # --- Update Gradio chat history ---
-            gradio_history_list.append((user_message, ai_resp.content))
+            gradio_history_list[-1] = (user_message, final_text)
+
+            yield gradio_history_list, "", ""
 
-            return gradio_history_list, "", ""
         # Prebuilt I/O for reuse
         inputs = [message, chatbot]
         outputs = [chatbot, message, status_text]
 
+        # Concurrent turns are cheap coroutines, so allow many at once (0 = unlimited)
+        concurrency = {
+            "concurrency_limit": CHAT_CONCURRENCY_LIMIT or None,
+            "concurrency_id": "chat",
+        }
+
         # Bind both "Send" button and Enter key submission
-        submit_btn.click(fn=process_message, inputs=inputs, outputs=outputs)
-        message.submit(fn=process_message, inputs=inputs, outputs=outputs)
+        submit_btn.click(fn=process_message, inputs=inputs, outputs=outputs, **concurrency)
+        message.submit(fn=process_message, inputs=inputs, outputs=outputs, **concurrency)
 
     return
 
@@ -0,0 +1,319 @@
+# admission.py
+"""
+Process-wide admission control for LLM calls.
+
+Every chat turn calls the provider directly, so a burst of users runs into the
+provider's rate limits and slows every session at once. Model calls are admitted
+through one `LLMAdmissionController` instead: at most `max_in_flight` run at the same
+time, and their estimated input tokens are drawn from a bucket refilled at
+`tokens_per_minute`. Calls that cannot start are queued per chat session and served
+round-robin, so one busy session cannot starve the others. A call whose estimated wait
+is longer than `max_queue_wait_seconds` is rejected with LLMOverloadedError straight
+away, rather than timing out after the user has already waited.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+from agent.config import LLM_MAX_IN_FLIGHT, LLM_MAX_QUEUE_WAIT_SECONDS, LLM_TOKENS_PER_MINUTE
+from agent.errors import LLMOverloadedError
+from agent.utils.metrics import IN_FLIGHT, QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# Duration assumed for a model call until one has finished, and weight of each new sample
+INITIAL_SERVICE_SECONDS = 2.0
+SERVICE_TIME_SMOOTHING = 0.2
+# Recent queue waits kept for the wait-time figures in `stats()`
+WAIT_SAMPLES = 1024
+# Queue name for calls made outside a chat session (e.g. background summaries)
+DEFAULT_SESSION = "default"
+
+
+class _Waiter:
+    """A queued call. `grant` is called (under the controller lock) once it is admitted."""
+
+    __slots__ = ("session_id", "cost", "enqueued_at", "grant", "admitted")
+
+    def __init__(self, session_id: str, cost: int, grant: Callable[[], None]):
+        self.session_id = session_id
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.grant = grant
+        self.admitted = False
+
+
+class LLMAdmissionController:
+    """
+    Caps concurrent LLM calls and their token throughput, with fair per-session queuing.
+
+    Use `admit` (blocking) or `aadmit` (async) around the provider call:
+
+        >>> with LLM_ADMISSION.admit(session_id, tokens=1200):
+        ...     response = chat_model.invoke(messages)
+
+    Attributes:
+        max_in_flight (Optional[int]): Calls allowed to run at once (None: no limit).
+        tokens_per_minute (Optional[int]): Estimated input tokens admitted per minute
+            (None: no limit). A call larger than the whole bucket is charged the bucket.
+        max_queue_wait_seconds (Optional[float]): Longest a call may wait to be admitted
+            (None: wait indefinitely).
+    """
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int] = LLM_MAX_IN_FLIGHT,
+        tokens_per_minute: Optional[int] = LLM_TOKENS_PER_MINUTE,
+        max_queue_wait_seconds: Optional[float] = LLM_MAX_QUEUE_WAIT_SECONDS,
+    ):
+        self.max_in_flight = max_in_flight or None
+        self.tokens_per_minute = tokens_per_minute or None
+        self.max_queue_wait_seconds = max_queue_wait_seconds or None
+
+        self.in_flight = 0
+        # Session id -> its waiting calls; the first session in order is served next
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._queued = 0
+        self._queued_tokens = 0
+        self._tokens = float(self.tokens_per_minute or 0)
+        self._refilled_at = time.monotonic()
+        self._refill_timer: Optional[threading.Timer] = None
+        self._service_seconds = INITIAL_SERVICE_SECONDS
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._lock = threading.Lock()
+
+    # --- Bookkeeping (all called with the lock held) ---
+    def _cost(self, tokens: int) -> int:
+        return min(max(int(tokens), 0), self.tokens_per_minute) if self.tokens_per_minute else 0
+
+    def _refill(self, now: float) -> None:
+        if self.tokens_per_minute:
+            per_second = self.tokens_per_minute / 60
+            self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled_at) * per_second)
+        self._refilled_at = now
+
+    def _has_slot(self) -> bool:
+        return self.max_in_flight is None or self.in_flight < self.max_in_flight
+
+    def _start(self, cost: int, waited: float) -> None:
+        self.in_flight += 1
+        self._tokens -= cost
+        self.admitted += 1
+        self._waits.append(waited)
+
+    def _estimate_wait(self, cost: int) -> float:
+        """Seconds a call queued now would wait: for a slot behind every queued call,
+        and for the bucket to refill the queued calls' tokens plus its own."""
+        wait = 0.0
+        if self.max_in_flight and not self._has_slot():
+            position = self._queued + 1
+            wait = math.ceil(position / self.max_in_flight) * self._service_seconds
+        if self.tokens_per_minute:
+            deficit = self._queued_tokens + cost - self._tokens
+            wait = max(wait, deficit / (self.tokens_per_minute / 60))
+        return wait
+
+    def _dispatch(self) -> None:
+        """Admit queued calls, one per session in turn, while capacity allows."""
+        now = time.monotonic()
+        self._refill(now)
+        while self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if not self._has_slot() or self._tokens < waiter.cost:
+                break
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            self._queued -= 1
+            self._queued_tokens -= waiter.cost
+            waiter.admitted = True
+            self._start(waiter.cost, now - waiter.enqueued_at)
+            waiter.grant()
+
+        # Waiting on tokens rather than on a finishing call: check back once they have refilled
+        if self.tokens_per_minute and self._queues and self._has_slot() and self._refill_timer is None:
+            waiter = next(iter(self._queues.values()))[0]
+            delay = (waiter.cost - self._tokens) / (self.tokens_per_minute / 60)
+            self._refill_timer = threading.Timer(max(delay, 0.01), self._on_refill)
+            self._refill_timer.daemon = True
+            self._refill_timer.start()
+
+    def _on_refill(self) -> None:
+        with self._lock:
+            self._refill_timer = None
+            self._dispatch()
+
+    # --- Queue entry / exit ---
+    def _enqueue(
+        self,
+        session_id: Optional[str],
+        tokens: int,
+        grant: Callable[[], None],
+    ) -> Optional[_Waiter]:
+        """
+        Admit the call now (returns None) or queue it (returns its waiter).
+
+        Raises:
+            LLMOverloadedError: If the estimated wait exceeds max_queue_wait_seconds.
+        """
+        session_id = session_id or DEFAULT_SESSION
+        with self._lock:
+            self._refill(time.monotonic())
+            cost = self._cost(tokens)
+            if not self._queues and self._has_slot() and self._tokens >= cost:
+                self._start(cost, 0.0)
+                return None
+
+            estimated = self._estimate_wait(cost)
+            if self.max_queue_wait_seconds is not None and estimated > self.max_queue_wait_seconds:
+                self.rejected += 1
+                logger.warning(
+                    "LLM call rejected: estimated wait %.1fs | in flight: %s | queued: %s",
+                    estimated, self.in_flight, self._queued,
+                )
+                raise LLMOverloadedError(estimated_wait_seconds=estimated)
+
+            waiter = _Waiter(session_id, cost, grant)
+            self._queues.setdefault(session_id, deque()).append(waiter)
+            self._queued += 1
+            self._queued_tokens += cost
+            self._dispatch()
+            return waiter
+
+    def _abandon(self, waiter: _Waiter, timed_out: bool = True) -> bool:
+        """
+        Take a waiter that gave up out of its queue. Returns True if it was admitted in
+        the meantime, in which case it holds a slot and must be released.
+        """
+        with self._lock:
+            if waiter.admitted:
+                return True
+            queue = self._queues.get(waiter.session_id)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                self._queued -= 1
+                self._queued_tokens -= waiter.cost
+                if not queue:
+                    del self._queues[waiter.session_id]
+            self.timed_out += int(timed_out)
+            # The waiter may have been blocking the calls queued behind it
+            self._dispatch()
+            return False
+
+    def _release(self, started_at: Optional[float]) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if started_at is not None:
+                seconds = time.monotonic() - started_at
+                self._service_seconds += SERVICE_TIME_SMOOTHING * (seconds - self._service_seconds)
+            self._dispatch()
+
+    def _log_wait(self, waiter: Optional[_Waiter]) -> None:
+        if waiter is not None:
+            logger.info(
+                "LLM call admitted after %.2fs in queue (session %s)",
+                time.monotonic() - waiter.enqueued_at, waiter.session_id,
+            )
+
+    # --- Public API ---
+    @contextmanager
+    def admit(self, session_id: Optional[str] = None, tokens: int = 0) -> Iterator[None]:
+        """
+        Hold an admission slot for the duration of the block, waiting for one if needed.
+
+        Args:
+            session_id: Chat session making the call; calls of one session queue behind
+                each other, sessions take turns.
+            tokens: Estimated input tokens of the call.
+
+        Raises:
+            LLMOverloadedError: If the call would wait (or has waited) longer than
+                max_queue_wait_seconds.
+        """
+        admitted = threading.Event()
+        waiter = self._enqueue(session_id, tokens, admitted.set)
+        if waiter is not None and not admitted.wait(self.max_queue_wait_seconds):
+            if not self._abandon(waiter):
+                raise LLMOverloadedError(estimated_wait_seconds=self.max_queue_wait_seconds)
+        self._log_wait(waiter)
+
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(started_at)
+
+    @asynccontextmanager
+    async def aadmit(self, session_id: Optional[str] = None, tokens: int = 0) -> AsyncIterator[None]:
+        """Async version of `admit`: waits on the event loop instead of blocking a thread."""
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def grant() -> None:
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+        waiter = self._enqueue(session_id, tokens, grant)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(admitted), self.max_queue_wait_seconds)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise LLMOverloadedError(estimated_wait_seconds=self.max_queue_wait_seconds)
+            except asyncio.CancelledError:
+                # The turn was cancelled (e.g. the user left) while it was queued
+                if self._abandon(waiter, timed_out=False):
+                    self._release(None)
+                raise
+        self._log_wait(waiter)
+
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(started_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return calls in flight, queue depth (calls and sessions waiting), admitted /
+        rejected / timed out counts, and the average, p95 and max queue wait in seconds
+        over the last WAIT_SAMPLES admissions.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            waits = sorted(self._waits)
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": self._queued,
+                "queued_sessions": len(self._queues),
+                "queued_tokens": self._queued_tokens,
+                "tokens_available": int(self._tokens) if self.tokens_per_minute else None,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_seconds": (sum(waits) / len(waits)) if waits else 0.0,
+                "p95_wait_seconds": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                "max_wait_seconds": waits[-1] if waits else 0.0,
+                "avg_service_seconds": round(self._service_seconds, 3),
+            }
+
+
+# Shared by every LLMClient (and so every agent) unless another controller (or None) is passed in
+LLM_ADMISSION: Optional[LLMAdmissionController] = (
+    LLMAdmissionController() if (LLM_MAX_IN_FLIGHT or LLM_TOKENS_PER_MINUTE) else None
+)
+if LLM_ADMISSION is not None:
+    QUEUE_DEPTH.set_function(lambda: LLM_ADMISSION._queued, queue="llm_admission")
+    IN_FLIGHT.set_function(lambda: LLM_ADMISSION.in_flight, queue="llm_admission")
@@ -0,0 +1,373 @@
+# failover.py
+"""
+Failover across several chat model backends.
+
+With a single provider model, one slow or failing backend stalls every session.
+`FailoverChatModel` wraps an ordered pool of chat models (e.g. Claude Haiku, then a
+second Anthropic model or another provider) behind the normal chat model interface, so
+LLMClient, the agent graph and the intent router use it unchanged. Each call goes to the
+healthiest backend first:
+
+- backends whose recent error rate reached LLM_BACKEND_MAX_ERROR_RATE are set aside
+  for LLM_BACKEND_COOLDOWN_SECONDS, then tried again;
+- among the others, the configured order wins unless a backend is much slower (by
+  rolling latency) than the fastest one.
+
+A call that raises, or gets no answer (no first chunk when streaming) within
+LLM_BACKEND_TIMEOUT_SECONDS, moves on to the next backend. A stream that fails after
+text was already sent cannot be replayed elsewhere and raises.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableBinding
+from pydantic import Field
+
+from agent.config import (
+    LLM_BACKEND_COOLDOWN_SECONDS,
+    LLM_BACKEND_MAX_ERROR_RATE,
+    LLM_BACKEND_TIMEOUT_SECONDS,
+    LLM_BACKEND_WINDOW,
+)
+
+logger = logging.getLogger(__name__)
+
+# A backend is preferred over the ones listed before it only when they are this much
+# slower (as a fraction of its own rolling latency)
+LATENCY_TOLERANCE = 0.5
+# Weight of each new latency sample in the rolling average
+LATENCY_SMOOTHING = 0.2
+
+# Runs blocking backend calls that have a deadline. A call that overruns keeps its
+# thread until the provider answers; the caller has moved on by then.
+_DEADLINE_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-failover")
+
+# Backends are called with no callbacks: the wrapping model already reports the call,
+# and the agent's stream handler would otherwise emit every token twice. (A tool-bound
+# backend is unwrapped first, as a RunnableBinding adds the caller's callbacks back.)
+_BACKEND_CONFIG = {"callbacks": []}
+
+
+class BackendHealth:
+    """
+    Rolling health of each backend in a pool: outcomes of its last `window` calls,
+    average latency of its successful calls and, once its error rate reaches
+    `max_error_rate`, the time until which it is set aside.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        window: int = LLM_BACKEND_WINDOW,
+        max_error_rate: float = LLM_BACKEND_MAX_ERROR_RATE,
+        cooldown_seconds: float = LLM_BACKEND_COOLDOWN_SECONDS,
+    ):
+        self.max_error_rate = max_error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self._outcomes: Dict[str, Deque[bool]] = {name: deque(maxlen=window) for name in names}
+        self._latency: Dict[str, Optional[float]] = {name: None for name in names}
+        self._counts: Dict[str, Dict[str, int]] = {
+            name: {"calls": 0, "errors": 0, "timeouts": 0, "failovers": 0} for name in names
+        }
+        self._unhealthy_until: Dict[str, float] = {name: 0.0 for name in names}
+        self._lock = threading.Lock()
+
+    def _error_rate(self, name: str) -> float:
+        outcomes = self._outcomes[name]
+        return (outcomes.count(False) / len(outcomes)) if outcomes else 0.0
+
+    def order(self, names: Sequence[str]) -> List[int]:
+        """Indexes of `names` in the order they should be tried."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [i for i, name in enumerate(names) if self._unhealthy_until[name] <= now]
+            resting = sorted(
+                (i for i in range(len(names)) if i not in healthy),
+                key=lambda i: self._unhealthy_until[names[i]],
+            )
+            known = [self._latency[names[i]] for i in healthy if self._latency[names[i]] is not None]
+            if known:
+                limit = min(known) * (1 + LATENCY_TOLERANCE)
+                fast = [
+                    i for i in healthy
+                    if self._latency[names[i]] is None or self._latency[names[i]] <= limit
+                ]
+                slow = sorted((i for i in healthy if i not in fast), key=lambda i: self._latency[names[i]])
+                healthy = fast + slow
+        return healthy + resting
+
+    def record_success(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._counts[name]["calls"] += 1
+            self._outcomes[name].append(True)
+            latency = self._latency[name]
+            self._latency[name] = seconds if latency is None else latency + LATENCY_SMOOTHING * (seconds - latency)
+
+    def record_failure(self, name: str, timed_out: bool = False, failed_over: bool = True) -> None:
+        with self._lock:
+            counts = self._counts[name]
+            counts["calls"] += 1
+            counts["errors"] += 1
+            counts["timeouts"] += int(timed_out)
+            counts["failovers"] += int(failed_over)
+            self._outcomes[name].append(False)
+            if self._error_rate(name) >= self.max_error_rate:
+                self._unhealthy_until[name] = time.monotonic() + self.cooldown_seconds
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per backend: calls, errors, timeouts, failovers, recent error rate, rolling
+        latency in seconds and whether it is currently taking traffic."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    **counts,
+                    "error_rate": round(self._error_rate(name), 3),
+                    "latency_seconds": (
+                        round(self._latency[name], 3) if self._latency[name] is not None else None
+                    ),
+                    "healthy": self._unhealthy_until[name] <= now,
+                }
+                for name, counts in self._counts.items()
+            }
+
+
+def tool_choice_for(model: Any, tool_choice: Any) -> Any:
+    """
+    `tool_choice` in the form `model`'s provider expects. Only "no tools" differs:
+    ChatAnthropic takes {"type": "none"} (the string "none" would name a tool), the
+    other providers take "none". Other values are returned as is.
+    """
+    if tool_choice not in ("none", {"type": "none"}):
+        return tool_choice
+    model = getattr(model, "bound", model)
+    return {"type": "none"} if getattr(model, "_llm_type", None) == "anthropic-chat" else "none"
+
+
+class FailoverChatModel(BaseChatModel):
+    """
+    Chat model that sends each call to the healthiest of several backends and fails
+    over to the next one on an error or a missed deadline.
+
+    Attributes:
+        backends (List[Any]): Chat models (or tool-bound chat models), in preference order.
+        names (List[str]): Name of each backend, e.g. "anthropic:claude-haiku-4-5".
+        timeout_seconds (Optional[float]): Deadline for a backend's answer (for streams,
+            its first chunk). None waits indefinitely.
+        health (BackendHealth): Rolling health, shared with every tool-bound copy.
+
+    Example:
+        >>> model = FailoverChatModel.from_backends({
+        ...     "anthropic:claude-haiku-4-5": ChatAnthropic(model="claude-haiku-4-5"),
+        ...     "anthropic:claude-sonnet-4-5": ChatAnthropic(model="claude-sonnet-4-5"),
+        ... })
+        >>> model.invoke("Hello").content
+        'Hello! How can I help you today?'
+    """
+
+    backends: List[Any]
+    names: List[str]
+    timeout_seconds: Optional[float] = LLM_BACKEND_TIMEOUT_SECONDS
+    health: Any = Field(default=None, exclude=True)
+
+    @classmethod
+    def from_backends(cls, backends: Dict[str, Any], **kwargs) -> "FailoverChatModel":
+        """Build a pool from {name: chat model}, in preference order."""
+        names = list(backends)
+        return cls(
+            backends=list(backends.values()),
+            names=names,
+            health=BackendHealth(names),
+            **kwargs,
+        )
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        if self.health is None:
+            self.health = BackendHealth(self.names)
+
+    @property
+    def _llm_type(self) -> str:
+        # A pool of one provider reports that provider, so provider-specific features
+        # (e.g. Anthropic prompt caching) stay on
+        types = {getattr(backend, "_llm_type", None) for backend in self.backends}
+        return types.pop() if len(types) == 1 and None not in types else "failover-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FailoverChatModel":
+        """Bind `tools` on every backend (each formats them, and `tool_choice`, for its
+        own provider)."""
+        return self.model_copy(update={
+            "backends": [
+                backend.bind_tools(tools, **{
+                    **kwargs,
+                    **({"tool_choice": tool_choice_for(backend, kwargs["tool_choice"])}
+                       if kwargs.get("tool_choice") is not None else {}),
+                })
+                for backend in self.backends
+            ],
+        })
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Rolling health of each backend (see BackendHealth.stats)."""
+        return self.health.stats()
+
+    def _attempts(self, kwargs: Dict[str, Any]):
+        """(name, chat model, call kwargs, is last) in the order backends should be tried."""
+        order = self.health.order(self.names)
+        for position, i in enumerate(order):
+            backend, call_kwargs = self.backends[i], kwargs
+            if isinstance(backend, RunnableBinding):
+                backend, call_kwargs = backend.bound, {**backend.kwargs, **kwargs}
+            yield self.names[i], backend, call_kwargs, position == len(order) - 1
+
+    def _failed(self, name: str, error: BaseException, is_last: bool, timed_out: bool = False) -> None:
+        self.health.record_failure(name, timed_out=timed_out, failed_over=not is_last)
+        reason = f"no answer within {self.timeout_seconds}s" if timed_out else f"{type(error).__name__}: {error}"
+        if is_last:
+            logger.error("LLM backend %s failed (%s); no backends left", name, reason)
+        else:
+            logger.warning("LLM backend %s failed (%s); failing over", name, reason)
+
+    # --- Blocking calls ---
+    def _call_with_deadline(self, fn, *args, **kwargs) -> Any:
+        if not self.timeout_seconds:
+            return fn(*args, **kwargs)
+        context = contextvars.copy_context()
+        future = _DEADLINE_EXECUTOR.submit(context.run, fn, *args, **kwargs)
+        return future.result(timeout=self.timeout_seconds)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        for name, backend, call_kwargs, is_last in self._attempts(kwargs):
+            started_at = time.perf_counter()
+            try:
+                message: AIMessage = self._call_with_deadline(
+                    backend.invoke, messages, _BACKEND_CONFIG, stop=stop, **call_kwargs
+                )
+            except FutureTimeoutError as e:
+                self._failed(name, e, is_last, timed_out=True)
+                if is_last:
+                    raise TimeoutError(f"LLM backend {name} gave no answer within {self.timeout_seconds}s")
+                continue
+            except Exception as e:
+                self._failed(name, e, is_last)
+                if is_last:
+                    raise
+                continue
+            self.health.record_success(name, time.perf_counter() - started_at)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for name, backend, call_kwargs, is_last in self._attempts(kwargs):
+            started_at = time.perf_counter()
+            chunks = backend.stream(messages, _BACKEND_CONFIG, stop=stop, **call_kwargs)
+            try:
+                first = self._call_with_deadline(next, chunks, None)
+            except FutureTimeoutError as e:
+                self._failed(name, e, is_last, timed_out=True)
+                if is_last:
+                    raise TimeoutError(f"LLM backend {name} gave no answer within {self.timeout_seconds}s")
+                continue
+            except Exception as e:
+                self._failed(name, e, is_last)
+                if is_last:
+                    raise
+                continue
+
+            try:
+                if first is not None:
+                    yield ChatGenerationChunk(message=first)
+                for chunk in chunks:
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception:
+                # Part of the answer is already out: it cannot be retried elsewhere
+                self.health.record_failure(name, failed_over=False)
+                raise
+            self.health.record_success(name, time.perf_counter() - started_at)
+            return
+
+    # --- Async calls ---
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        for name, backend, call_kwargs, is_last in self._attempts(kwargs):
+            started_at = time.perf_counter()
+            try:
+                message: AIMessage = await asyncio.wait_for(
+                    backend.ainvoke(messages, _BACKEND_CONFIG, stop=stop, **call_kwargs),
+                    self.timeout_seconds or None,
+                )
+            except asyncio.TimeoutError as e:
+                self._failed(name, e, is_last, timed_out=True)
+                if is_last:
+                    raise
+                continue
+            except Exception as e:
+                self._failed(name, e, is_last)
+                if is_last:
+                    raise
+                continue
+            self.health.record_success(name, time.perf_counter() - started_at)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for name, backend, call_kwargs, is_last in self._attempts(kwargs):
+            started_at = time.perf_counter()
+            chunks = backend.astream(messages, _BACKEND_CONFIG, stop=stop, **call_kwargs).__aiter__()
+            try:
+                first = await asyncio.wait_for(chunks.__anext__(), self.timeout_seconds or None)
+            except StopAsyncIteration:
+                first = None
+            except asyncio.TimeoutError as e:
+                self._failed(name, e, is_last, timed_out=True)
+                if is_last:
+                    raise
+                continue
+            except Exception as e:
+                self._failed(name, e, is_last)
+                if is_last:
+                    raise
+                continue
+
+            try:
+                if first is not None:
+                    yield ChatGenerationChunk(message=first)
+                    async for chunk in chunks:
+                        yield ChatGenerationChunk(message=chunk)
+            except Exception:
+                # Part of the answer is already out: it cannot be retried elsewhere
+                self.health.record_failure(name, failed_over=False)
+                raise
+            self.health.record_success(name, time.perf_counter() - started_at)
+            return
@@ -1,24 +1,46 @@
-# llm_client.py
-import os
-from typing import Optional, Literal, Any, Dict, List
-from dotenv import load_dotenv
+# llm_agent.py
+import logging
+import time
+from typing import Any
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
 
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.tools import tool
-from langchain.agents import create_agent
+from dotenv import load_dotenv
 
-from agent.errors import (
-    LLMConfigError,
-    LLMInitializationError
+from langchain_core.messages import (
+    HumanMessage,
+    AIMessage,
+    AIMessageChunk,
+    SystemMessage,
+    ToolMessage,
 )
-from agent.test_tools.dice import dice
+from langchain_core.tools import BaseTool
 
+from agent.config import (
+    AGENT_MAX_STEPS,
+    AGENT_MAX_TOOL_CALLS,
+    AGENT_MAX_TURN_TOKENS,
+    PROMPT_CACHING_ENABLED,
+    TOOL_MAX_CONCURRENCY,
+)
 from agent.llm.llm_client import LLMClient
+from agent.utils import tracing
+from agent.utils.metrics import record_turn_tokens
+from agent.llm.tokens import (
+    estimate_message_tokens,
+    estimate_tokens,
+    estimate_tool_tokens,
+    record_usage,
+    select_history,
+)
 
 SUPPORTED_PROVIDERS = ["anthropic"]
 load_dotenv()
-from langchain_core.tools import BaseTool
-from collections.abc import Awaitable, Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+# ToolMessage artifact key for a tool result rendered locally; it is shown to the user
+# below the model's reply (see TurnContextMiddleware)
+RENDERED_ARTIFACT_KEY = "rendered_markdown"
 
 class LLMAgent:
     def __init__(
@@ -26,13 +48,150 @@ class LLMAgent:
         llm_client: LLMClient,
         system_prompt: str = None,
         tools: Sequence[BaseTool | Callable | dict[str, Any]] | None = None,
+        context_token_budget: int | None = None,
+        prompt_caching: bool | None = None,
+        cached_sections: Sequence[str] = (),
+        max_tool_concurrency: int | None = TOOL_MAX_CONCURRENCY,
+        response_client: LLMClient | None = None,
+        max_steps: int | None = AGENT_MAX_STEPS,
+        max_tool_calls: int | None = AGENT_MAX_TOOL_CALLS,
+        max_turn_tokens: int | None = AGENT_MAX_TURN_TOKENS,
     ):
+        """
+        Args:
+            llm_client (LLMClient): Initialized client whose chat model drives the agent.
+            system_prompt (str, optional): System prompt sent with every turn.
+            tools (Sequence, optional): Tools the agent may call.
+            context_token_budget (int, optional): Estimated prompt tokens allowed per turn,
+                including the system prompt and tool schemas. Older history is left out
+                to fit. `None` sends all history it is given.
+            prompt_caching (bool, optional): Mark the tool schemas, system prompt and
+                `cached_sections` as an Anthropic prompt-cache prefix. Defaults to
+                PROMPT_CACHING_ENABLED when the client is ChatAnthropic.
+            cached_sections (Sequence[str], optional): Headings of context sections that
+                change rarely (e.g. the conversation summary) and belong in the cached prefix.
+            max_tool_concurrency (int, optional): Most tool calls from one model message
+                run at the same time (None or 0: no limit).
+            response_client (LLMClient, optional): Client of a larger model that writes
+                replies from tool results, while `llm_client`'s model only decides which
+                tools to call (see ModelTierMiddleware). None uses `llm_client` for both.
+            max_steps (int, optional): Most model calls per turn, the final answer included.
+            max_tool_calls (int, optional): Most tool calls per turn.
+            max_turn_tokens (int, optional): Most model tokens (input and output) per turn.
+                When a limit is reached the model answers from the results it has so far
+                (see TurnBudgetMiddleware). None or 0: no limit.
+        """
+        # Imported here: `langchain.agents` is slow to import and only needed once an
+        # agent is actually built.
+        from langchain.agents import create_agent
+        from agent.llm.middleware import (
+            AdmissionMiddleware,
+            ModelTierMiddleware,
+            ToolExecutionMiddleware,
+            TracingMiddleware,
+            TurnBudgetMiddleware,
+            TurnContextMiddleware,
+        )
+
+        if prompt_caching is None:
+            prompt_caching = (
+                PROMPT_CACHING_ENABLED
+                and getattr(llm_client.client, "_llm_type", None) == "anthropic-chat"
+            )
+
+        self.context_token_budget = context_token_budget
+        # Schema size of each tool, computed once so per-turn subsets are cheap to cost
+        self.tool_schema_tokens = {
+            self._tool_name(tool): estimate_tool_tokens([tool]) for tool in (tools or [])
+        }
+        self.system_prompt_tokens = estimate_tokens(system_prompt or "")
+        # Fixed cost of every turn offering all tools, counted against the budget before any history
+        self.prompt_overhead_tokens = self.system_prompt_tokens + sum(self.tool_schema_tokens.values())
+
+        # Tool calls of one model message already run concurrently; this caps how many
+        self.run_config = {"max_concurrency": max_tool_concurrency} if max_tool_concurrency else None
+        if max_steps:
+            # Backstop should the budget middleware ever be bypassed: each step is a model
+            # node and a tools node, plus a few for the graph's own entry and exit
+            self.run_config = {**(self.run_config or {}), "recursion_limit": 2 * max_steps + 5}
+        self.tool_execution = ToolExecutionMiddleware()
+        self.turn_budget = TurnBudgetMiddleware(
+            max_steps=max_steps,
+            max_tool_calls=max_tool_calls,
+            max_tokens=max_turn_tokens,
+        )
+
+        middleware = [
+            TracingMiddleware(),
+            TurnContextMiddleware(prompt_caching=prompt_caching, cached_sections=cached_sections),
+            self.tool_execution,
+            self.turn_budget,
+        ]
+        # Tool decisions on the small model, replies from tool results on the larger one
+        self.model_tiers = None
+        if response_client is not None and response_client.client is not llm_client.client:
+            self.model_tiers = ModelTierMiddleware(
+                routing_model=llm_client.client,
+                response_model=response_client.client,
+                tool_names=list(self.tool_schema_tokens),
+            )
+            middleware.append(self.model_tiers)
+        # Model calls wait for the client's process-wide admission slot (see agent.llm.admission)
+        self.admission = getattr(llm_client, "admission", None)
+        if self.admission is not None:
+            middleware.append(AdmissionMiddleware(self.admission, self.tool_schema_tokens))
+
         self.agent = create_agent(
             model=llm_client.client,
             tools=tools,
             system_prompt=system_prompt,
+            middleware=middleware,
         )
 
+    def tool_stats(self) -> dict:
+        """Per-tool call counts, errors and run times (see ToolExecutionMiddleware)."""
+        return self.tool_execution.stats()
+
+    def budget_stats(self) -> dict:
+        """Per-turn limits and how often each one cut a turn short (see TurnBudgetMiddleware)."""
+        return self.turn_budget.stats()
+
+    def tier_stats(self) -> dict:
+        """Per-tier calls, latency, tokens and escalations (empty without a response model)."""
+        return self.model_tiers.stats() if self.model_tiers is not None else {}
+
+    @staticmethod
+    def _tool_name(tool: BaseTool | Callable | dict[str, Any]) -> str:
+        if isinstance(tool, dict):
+            return tool.get("name") or tool.get("function", {}).get("name", "")
+        return getattr(tool, "name", None) or getattr(tool, "__name__", "")
+
+    def schema_tokens(self, tool_names: Sequence[str] | None = None) -> int:
+        """Estimated tokens of the tool schemas sent when offering `tool_names` (None: all tools)."""
+        if tool_names is None:
+            return sum(self.tool_schema_tokens.values())
+        return sum(self.tool_schema_tokens.get(name, 0) for name in tool_names)
+
+    @staticmethod
+    def _run_context(
+        context_sections: dict[str, str] | None,
+        session_id: str | None,
+        tool_names: Sequence[str] | None,
+        span: Any = None,
+    ) -> dict:
+        """Runtime context read by TurnContextMiddleware (and TracingMiddleware)."""
+        from agent.utils.tool_memo import memo_for_turn
+
+        context = {
+            "sections": context_sections or {},
+            "session_id": session_id,
+            "tool_memo": memo_for_turn(session_id),
+            "span": span,
+        }
+        if tool_names is not None:
+            context["tools"] = list(tool_names)
+        return context
+
     def _normalize_messages_for_agent(self, messages):
         """
         Convert HumanMessage/AIMessage/SystemMessage or dict-like items
@@ -59,6 +218,92 @@ class LLMAgent:
         return normalized
 
 
+    def _prepare_messages(
+        self,
+        messages: list,
+        context_sections: dict[str, str] | None = None,
+        tool_names: Sequence[str] | None = None,
+    ) -> tuple[list[dict], int]:
+        """
+        Fit `messages` into `context_token_budget` and normalize them for the agent.
+        Context sections are appended to the system prompt and the offered tools' schemas
+        are sent with it, so they are counted first.
+
+        Returns:
+            tuple: (agent messages, estimated prompt tokens including system prompt and tools)
+        """
+        from agent.llm.middleware import render_context_sections
+
+        schema_tokens = self.schema_tokens(tool_names)
+        if tool_names is not None:
+            logger.info(
+                "Tool schemas: ~%s of ~%s tokens (%s of %s tools)",
+                schema_tokens, self.schema_tokens(), len(tool_names), len(self.tool_schema_tokens),
+            )
+        fixed_tokens = self.system_prompt_tokens + schema_tokens + estimate_tokens(
+            render_context_sections(context_sections)
+        )
+        if self.context_token_budget is not None:
+            messages = select_history(messages, self.context_token_budget - fixed_tokens)
+        agent_messages = self._normalize_messages_for_agent(messages)
+        estimated_tokens = fixed_tokens + sum(estimate_message_tokens(m) for m in agent_messages)
+        return agent_messages, estimated_tokens
+
+    def _record_turn_usage(self, estimated_tokens: int, new_messages: list) -> None:
+        """
+        Log the turn's token usage and compare the estimate with the first model call,
+        which is the only one whose prompt is exactly what was estimated.
+        """
+        model_usages = [
+            m.usage_metadata for m in new_messages
+            if isinstance(m, AIMessage) and m.usage_metadata
+        ]
+        if not model_usages:
+            return
+
+        first_call_input = model_usages[0].get("input_tokens")
+        record_usage(estimated_tokens, first_call_input)
+        turn_input = sum(u.get("input_tokens") or 0 for u in model_usages)
+        turn_output = sum(u.get("output_tokens") or 0 for u in model_usages)
+        record_turn_tokens("agent", turn_input, turn_output)
+        logger.info(
+            "Turn tokens | estimated prompt: %s | actual prompt: %s | "
+            "model calls: %s | turn input: %s | turn output: %s | cache read: %s | cache write: %s",
+            estimated_tokens,
+            first_call_input,
+            len(model_usages),
+            turn_input,
+            turn_output,
+            sum(u.get("input_token_details", {}).get("cache_read", 0) for u in model_usages),
+            sum(u.get("input_token_details", {}).get("cache_creation", 0) for u in model_usages),
+        )
+
+    @staticmethod
+    def _message_text(content: str | list) -> str:
+        """
+        Return only the text of a message's content. Anthropic wraps content in a list of
+        blocks (text, tool_use, input_json_delta...), of which only text is shown to users.
+        """
+        if isinstance(content, str):
+            return content
+        return "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+            if isinstance(part, str) or part.get("type") == "text"
+        )
+
+    @staticmethod
+    def _rendered_results(messages: list) -> list[str]:
+        """Locally rendered tool results since the latest user message, in call order."""
+        rendered = []
+        for msg in reversed(messages):
+            if isinstance(msg, HumanMessage):
+                break
+            if isinstance(msg, ToolMessage) and isinstance(msg.artifact, dict):
+                if msg.artifact.get(RENDERED_ARTIFACT_KEY):
+                    rendered.append(msg.artifact[RENDERED_ARTIFACT_KEY])
+        return rendered[::-1]
+
     def _parse_agent_result(self, result: dict):
         """
         Extract the latest AI response message and token usage from a LangChain agent result.
@@ -71,7 +316,6 @@ class LLMAgent:
         # Find the last AIMessage (skip ToolMessages)
         final_ai_msg = None
         for msg in reversed(messages):
-            from langchain_core.messages import AIMessage
             if isinstance(msg, AIMessage):
                 final_ai_msg = msg
                 break
@@ -79,40 +323,257 @@ class LLMAgent:
         if final_ai_msg is None:
             return "", {}
 
-        # Extract content
-        content = final_ai_msg.content
-        if isinstance(content, list):
-            # Anthropic sometimes wraps in list of dicts
-            content = " ".join(
-                part.get("text", str(part)) if isinstance(part, dict) else str(part)
-                for part in content
-            )
+        # Extract content, followed by any tool results of this turn rendered locally
+        content = self._message_text(final_ai_msg.content).strip()
+        rendered = self._rendered_results(messages)
+        if rendered:
+            content = "\n\n".join([content, *rendered]) if content else "\n\n".join(rendered)
 
         # Extract token usage
         usage = {}
-        if hasattr(final_ai_msg, "usage_metadata"):
+        if final_ai_msg.usage_metadata:
             usage_meta = final_ai_msg.usage_metadata
             usage = {
                 "input_tokens": usage_meta.get("input_tokens"),
                 "output_tokens": usage_meta.get("output_tokens"),
                 "total_tokens": usage_meta.get("total_tokens"),
+                # Prompt caching: part of input_tokens read from / written to the cache
+                "cache_read_tokens": usage_meta.get("input_token_details", {}).get("cache_read", 0),
+                "cache_creation_tokens": usage_meta.get("input_token_details", {}).get("cache_creation", 0),
             }
         elif final_ai_msg.response_metadata.get("usage"):
             usage = final_ai_msg.response_metadata.get("usage")
 
         return content.strip(), usage
 
-    def invoke(self, messages: list) -> AIMessage:
+    @staticmethod
+    def _trace_usage(span: Any, usage: dict | None) -> None:
+        """Add the turn's token usage (from `_parse_agent_result`) to its trace span."""
+        usage = usage or {}
+        span.set_attributes(**{
+            "llm.input_tokens": usage.get("input_tokens"),
+            "llm.output_tokens": usage.get("output_tokens"),
+        })
+
+    def invoke(
+        self,
+        messages: list,
+        context_sections: dict[str, str] | None = None,
+        session_id: str | None = None,
+        tool_names: Sequence[str] | None = None,
+        parent_span: Any = None,
+    ) -> AIMessage:
         # history should be list of HumanMessage / AIMessage
+        # context_sections ({heading: text}, e.g. the conversation summary) are added to the system prompt
+        # session_id is bound for tools so they can use the session's entity memory
+        # tool_names limits the tools offered to the model this turn (None offers all)
+        # parent_span nests the turn's trace spans (default: the current span)
         # Build input dict for invocation
-        agent_messages = self._normalize_messages_for_agent(messages)
+        agent_messages, estimated_tokens = self._prepare_messages(messages, context_sections, tool_names)
         
-        agent_response = self.agent.invoke({
-            "messages": agent_messages
-        })
+        with tracing.span("LLMAgent.invoke", parent_span, session_id=session_id) as span:
+            agent_response = self.agent.invoke(
+                {"messages": agent_messages},
+                context=self._run_context(context_sections, session_id, tool_names, span),
+                config=self.run_config,
+            )
+            self._record_turn_usage(estimated_tokens, agent_response["messages"][len(agent_messages):])
         
-        result_message, tokens_used = self._parse_agent_result(agent_response)
+            result_message, tokens_used = self._parse_agent_result(agent_response)
+            self._trace_usage(span, tokens_used)
         
         # The result will likely contain structured return — might need to adapt output parsing
-        # For simplicity, assume result is a string answer
-        return AIMessage(content=str(result_message))
\ No newline at end of file
+        # For simplicity, assume result is a string answer; the final call's usage goes along
+        return AIMessage(content=str(result_message), response_metadata={"usage": tokens_used})
+
+    async def ainvoke(
+        self,
+        messages: list,
+        context_sections: dict[str, str] | None = None,
+        session_id: str | None = None,
+        tool_names: Sequence[str] | None = None,
+        parent_span: Any = None,
+    ) -> AIMessage:
+        """
+        Async version of `invoke`. Model calls are awaited on the provider's async client
+        and tools run through their coroutines, so no thread is held while waiting.
+        """
+        agent_messages, estimated_tokens = self._prepare_messages(messages, context_sections, tool_names)
+
+        with tracing.span("LLMAgent.ainvoke", parent_span, session_id=session_id) as span:
+            agent_response = await self.agent.ainvoke(
+                {"messages": agent_messages},
+                context=self._run_context(context_sections, session_id, tool_names, span),
+                config=self.run_config,
+            )
+            self._record_turn_usage(estimated_tokens, agent_response["messages"][len(agent_messages):])
+
+            result_message, tokens_used = self._parse_agent_result(agent_response)
+            self._trace_usage(span, tokens_used)
+        return AIMessage(content=str(result_message), response_metadata={"usage": tokens_used})
+
+    # --- STREAMING ---
+    def stream(
+        self,
+        messages: list,
+        context_sections: dict[str, str] | None = None,
+        session_id: str | None = None,
+        tool_names: Sequence[str] | None = None,
+        parent_span: Any = None,
+    ) -> Iterator[dict]:
+        """
+        Run one agent turn and yield progress as it happens instead of blocking until
+        the whole graph finishes.
+
+        Args:
+            messages (list): Conversation history, oldest first.
+            context_sections (dict, optional): {heading: text} blocks (e.g. the conversation
+                summary) appended to the system prompt for this turn.
+            session_id (str, optional): Chat session the turn belongs to, bound to
+                CURRENT_SESSION_ID while tools run.
+            tool_names (Sequence[str], optional): Names of the tools offered to the model
+                this turn (e.g. from a ToolSelector). None offers every tool.
+            parent_span (optional): Trace span the turn's spans nest under (see
+                agent.utils.tracing). Defaults to the current span.
+
+        Yields dict events:
+            {"type": "token", "text": str}
+                A text fragment from the model. Fragments produced before a tool call
+                are the model "thinking aloud" and are superseded by the final answer.
+            {"type": "tool_start", "tool": str, "args": dict}
+            {"type": "tool_end", "tool": str, "status": "success" | "error", "duration": float}
+                Tool calls from the same model message run concurrently; `duration` is
+                each one's own run time in seconds.
+            {"type": "final", "content": str, "usage": dict, "timings": dict,
+             "tool_schema_tokens": int}
+                Always the last event. `timings` holds `time_to_first_token` (None if no
+                text was streamed) and `total_time`, both in seconds. `tool_schema_tokens`
+                is the estimated size of the tool schemas offered this turn.
+        """
+        agent_messages, estimated_tokens = self._prepare_messages(messages, context_sections, tool_names)
+        translator = _AgentStreamTranslator(self, estimated_tokens, self.schema_tokens(tool_names))
+        # Not bound to CURRENT_SPAN: the caller's context may differ between yields
+        span = tracing.start_span("LLMAgent.stream", parent_span, session_id=session_id)
+
+        try:
+            for mode, payload in self.agent.stream(
+                {"messages": agent_messages},
+                stream_mode=["messages", "updates"],
+                context=self._run_context(context_sections, session_id, tool_names, span),
+                config=self.run_config,
+            ):
+                yield from translator.translate(mode, payload)
+
+            final_event = translator.final_event()
+            self._trace_usage(span, final_event["usage"])
+            yield final_event
+        except Exception as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
+
+    async def astream(
+        self,
+        messages: list,
+        context_sections: dict[str, str] | None = None,
+        session_id: str | None = None,
+        tool_names: Sequence[str] | None = None,
+        parent_span: Any = None,
+    ) -> AsyncIterator[dict]:
+        """Async version of `stream`, yielding the same events."""
+        agent_messages, estimated_tokens = self._prepare_messages(messages, context_sections, tool_names)
+        translator = _AgentStreamTranslator(self, estimated_tokens, self.schema_tokens(tool_names))
+        span = tracing.start_span("LLMAgent.astream", parent_span, session_id=session_id)
+
+        try:
+            async for mode, payload in self.agent.astream(
+                {"messages": agent_messages},
+                stream_mode=["messages", "updates"],
+                context=self._run_context(context_sections, session_id, tool_names, span),
+                config=self.run_config,
+            ):
+                for event in translator.translate(mode, payload):
+                    yield event
+
+            final_event = translator.final_event()
+            self._trace_usage(span, final_event["usage"])
+            yield final_event
+        except Exception as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
+
+
+class _AgentStreamTranslator:
+    """
+    Turns LangGraph `messages` / `updates` stream payloads into LLMAgent stream events
+    and keeps the per-turn timings.
+    """
+
+    def __init__(self, llm_agent: LLMAgent, estimated_tokens: int = 0, tool_schema_tokens: int = 0):
+        self.llm_agent = llm_agent
+        self.estimated_tokens = estimated_tokens
+        self.tool_schema_tokens = tool_schema_tokens
+        self.messages = []
+        self.tool_names_by_call_id = {}
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+
+    def translate(self, mode: str, payload: Any) -> list[dict]:
+        events = []
+
+        if mode == "messages":
+            chunk, metadata = payload
+            # Only stream the model's own output (not tool results echoed back)
+            if isinstance(chunk, AIMessageChunk) and metadata.get("langgraph_node") == "model":
+                text = self.llm_agent._message_text(chunk.content)
+                if text:
+                    if self.first_token_at is None:
+                        self.first_token_at = time.perf_counter()
+                    events.append({"type": "token", "text": text})
+
+        elif mode == "updates":
+            for update in payload.values():
+                # Middleware nodes can report no update at all
+                if not isinstance(update, dict):
+                    continue
+                for msg in update.get("messages", []):
+                    self.messages.append(msg)
+                    if isinstance(msg, AIMessage):
+                        for tool_call in msg.tool_calls:
+                            self.tool_names_by_call_id[tool_call["id"]] = tool_call["name"]
+                            events.append({
+                                "type": "tool_start",
+                                "tool": tool_call["name"],
+                                "args": tool_call["args"],
+                            })
+                    elif isinstance(msg, ToolMessage):
+                        events.append({
+                            "type": "tool_end",
+                            "tool": msg.name or self.tool_names_by_call_id.get(msg.tool_call_id),
+                            "status": msg.status,
+                            "duration": msg.response_metadata.get("duration"),
+                        })
+
+        return events
+
+    def final_event(self) -> dict:
+        content, usage = self.llm_agent._parse_agent_result({"messages": self.messages})
+        finished_at = time.perf_counter()
+        timings = {
+            "time_to_first_token": (
+                round(self.first_token_at - self.started_at, 3) if self.first_token_at else None
+            ),
+            "total_time": round(finished_at - self.started_at, 3),
+        }
+        logger.info("Agent turn streamed | timings: %s | usage: %s", timings, usage)
+        self.llm_agent._record_turn_usage(self.estimated_tokens, self.messages)
+        return {
+            "type": "final",
+            "content": content,
+            "usage": usage,
+            "timings": timings,
+            "tool_schema_tokens": self.tool_schema_tokens,
+        }
@@ -5,29 +5,40 @@ Universal LangChain-based client for multiple LLM providers.
 Supports Anthropic (Claude), OpenAI, and Mistral.
 Includes configuration validation, flexible prompting, and optional JSON parsing.
 """
+import importlib.util
 import json
 import os
 import re
-from typing import Optional, Any, Dict, Literal
+from typing import Optional, Any, Dict, List, Literal, Sequence, Tuple
 import warnings
+from contextlib import nullcontext
 
 from dotenv import load_dotenv
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 
+from agent.config import LLM_FALLBACK_BACKENDS
 from agent.errors import (
     LLMConfigError,
     LLMInitializationError,
     LLMQueryError,
-    LLMEmptyResponse
+    LLMEmptyResponse,
+    LLMOverloadedError,
 )
-
-from agent.tests.test_variables import (
-    create_mock_llm_response
-)
-
-SUPPORTED_PROVIDERS = ["anthropic"]
+from agent.llm.admission import LLM_ADMISSION, LLMAdmissionController
+from agent.llm.response_cache import LLM_RESPONSE_CACHE, LLMResponseCache
+from agent.llm.tokens import estimate_tokens
+from agent.utils.session_store import CURRENT_SESSION_ID
+
+SUPPORTED_PROVIDERS = ["anthropic", "openai", "mistral"]
+# Provider -> (module, pip package) of its LangChain chat model. Only anthropic is in
+# requirements.txt; the others are in requirements-optional.txt
+PROVIDER_PACKAGES = {
+    "anthropic": ("langchain_anthropic", "langchain-anthropic"),
+    "openai": ("langchain_openai", "langchain-openai"),
+    "mistral": ("langchain_mistralai", "langchain-mistralai"),
+}
 load_dotenv()
 
 class LLMClient:
@@ -52,12 +63,18 @@ class LLMClient:
         fallback_message (Optional[str]): Default message returned when the model response is empty.
         test_mode (bool): If True, returns mock responses instead of making real API calls.
         test_response_type (str): Mock response type used in test mode.
+        response_cache (Optional[LLMResponseCache]): Cache for deterministic `query` calls.
+        admission (Optional[LLMAdmissionController]): Process-wide limiter every model call
+            made through this client (and agents built on it) is admitted by.
+        fallback_backends (List[Tuple[str, str, str]]): (provider, model, api key) of the
+            backends tried after the primary one, in order.
         client (Any): Initialized LangChain chat model client.
     
     Raises:
         LLMConfigError: If required environment variables are missing or invalid.
         LLMInitializationError: If the model client cannot be initialized.
         LLMQueryError: If a query fails during execution.
+        LLMOverloadedError: If a query is turned away by the admission controller.
 
     Example:
         >>> client = LLMClient(provider="anthropic", model="claude-haiku-4-5")
@@ -78,6 +95,9 @@ class LLMClient:
         fallback_message: Optional[str] = None,
         test_mode: Optional[bool] = False,
         test_response_type: Literal["success", "failed", "unexpected_json", "not_json"] = "success",
+        response_cache: Optional[LLMResponseCache] = LLM_RESPONSE_CACHE,
+        admission: Optional[LLMAdmissionController] = LLM_ADMISSION,
+        fallback_backends: Optional[Sequence[str]] = LLM_FALLBACK_BACKENDS,
     ):
         """Initialize an LLMClient instance and resolve provider-specific configuration.
 
@@ -92,8 +112,19 @@ class LLMClient:
                 instead of querying the live LLM. Defaults to False.
             test_response_type (Literal["success", "failed", "unexpected_json", "not_json"], optional):
                 Type of mock response to use when `test_mode` is True. Defaults to "success".
+            response_cache (Optional[LLMResponseCache], optional): Cache consulted by `query` for
+                `expect_json` / low-temperature calls. Defaults to the shared LLM_RESPONSE_CACHE;
+                pass None to always query the model.
+            admission (Optional[LLMAdmissionController], optional): Limits concurrent calls and
+                token throughput across the process. Defaults to the shared LLM_ADMISSION;
+                pass None to call the model without admission control.
+            fallback_backends (Optional[Sequence[str]], optional): "provider:model" backends to
+                fail over to when the primary model errors or is too slow (see
+                agent.llm.failover). Defaults to LLM_FALLBACK_BACKENDS; empty uses the primary only.
         """
         self.function_name = function_name
+        self.response_cache = response_cache
+        self.admission = admission
         self.fallback_message = fallback_message
         self.test_mode = test_mode
         self.test_response_type = test_response_type
@@ -104,6 +135,7 @@ class LLMClient:
         
         self._resolve_model(model)
         self._resolve_api_key()
+        self._resolve_fallback_backends(fallback_backends)
 
         # Only fill client when `initialize_client()` is run
         self.client = None
@@ -121,6 +153,24 @@ class LLMClient:
                 variable_name="LLM_PROVIDER",
                 extra_info=f"Choices are: {SUPPORTED_PROVIDERS}"
             )
+        self._check_provider_package(self.provider, "LLM_PROVIDER")
+
+    @staticmethod
+    def _check_provider_package(provider: str, variable_name: str) -> None:
+        """
+        Check that the LangChain package of `provider` is installed, so a missing optional
+        provider fails when the config is read rather than on the first LLM call.
+
+        Raises:
+            LLMConfigError: If the package cannot be imported.
+        """
+        module, package = PROVIDER_PACKAGES[provider]
+        if importlib.util.find_spec(module) is None:
+            raise LLMConfigError(
+                variable_name=variable_name,
+                message=f"Provider `{provider}` needs the `{package}` package.",
+                extra_info=f"Install it with `pip install -r requirements-optional.txt` (or `pip install {package}`)"
+            )
 
     def _resolve_model(self, model: Optional[str]) -> None:
         """
@@ -130,21 +180,27 @@ class LLMClient:
         Raises:
             LLMConfigError: If no model ID is provided or available for the selected provider.
         """
+        self.model = self._model_for(self.provider, model)
+
+    @staticmethod
+    def _model_for(provider: str, model: Optional[str]) -> str:
+        """Return `model`, or the default model of `provider`."""
         default_models = {
             "anthropic": "claude-haiku-4-5",
+            "openai": "gpt-4o-mini",
+            "mistral": "mistral-large-latest",
         }
 
-        resolved_model = model or default_models.get(self.provider)
+        resolved_model = model or default_models.get(provider)
         if not resolved_model:
             raise LLMConfigError(
-                variable_name=f"{self.provider}_MODEL_ID",
+                variable_name=f"{provider}_MODEL_ID",
                 message=(
-                    f"You must provide a model ID for `{self.provider}` "
+                    f"You must provide a model ID for `{provider}` "
                     "by explicitly passing `model` when initializing LLMClient."
                 )
             )
-
-        self.model = resolved_model
+        return resolved_model
 
     def _resolve_api_key(self) -> None:
         """
@@ -154,34 +210,80 @@ class LLMClient:
         Raises:
             LLMConfigError: If the API key is missing or the provider is invalid.
         """
+        self.api_key = self._api_key_for(self.provider)
+
+    @staticmethod
+    def _api_key_for(provider: str) -> str:
+        """Load the API key of `provider` from environment variables."""
         api_key_map = {
             "anthropic": "ANTHROPIC_API_KEY",
+            "openai": "OPENAI_API_KEY",
+            "mistral": "MISTRAL_API_KEY",
         }
 
-        key_name = api_key_map.get(self.provider)
+        key_name = api_key_map.get(provider)
         if not key_name:
             raise LLMConfigError(
                 variable_name="LLM_PROVIDER",
-                message=f"No API key mapping defined for provider `{self.provider}`"
+                message=f"No API key mapping defined for provider `{provider}`"
             )
 
         api_key = os.getenv(key_name)
         if not api_key or api_key == "<REPLACE_ME>":
             raise LLMConfigError(
-                variable_name=f"{self.provider}_API_KEY",
+                variable_name=f"{provider}_API_KEY",
                 message=(
-                    f"You must set a `{self.provider}` API key in your environment variables "
+                    f"You must set a `{provider}` API key in your environment variables "
                     "to run LLM queries to their services."
                 )
             )
+        return api_key
+
+    def _resolve_fallback_backends(self, fallback_backends: Optional[Sequence[str]]) -> None:
+        """
+        Parse "provider:model" fallback backends (a bare provider uses its default model)
+        and load their API keys.
 
-        self.api_key = api_key
+        Raises:
+            LLMConfigError: If a backend's provider is unsupported or its API key is missing.
+        """
+        self.fallback_backends: List[Tuple[str, str, str]] = []
+        for spec in fallback_backends or []:
+            provider, _, model = spec.partition(":")
+            provider = provider.strip()
+            if provider not in SUPPORTED_PROVIDERS:
+                raise LLMConfigError(
+                    variable_name="LLM_FALLBACK_BACKENDS",
+                    extra_info=f"Unsupported provider `{provider}`. Choices are: {SUPPORTED_PROVIDERS}"
+                )
+            self._check_provider_package(provider, "LLM_FALLBACK_BACKENDS")
+            model = self._model_for(provider, model.strip() or None)
+            if (provider, model) != (self.provider, self.model):
+                self.fallback_backends.append((provider, model, self._api_key_for(provider)))
+
+    @staticmethod
+    def _build_chat_model(provider: str, model: str, api_key: str) -> Any:
+        """Create the LangChain chat model of one provider (imported on demand)."""
+        if provider == "anthropic":
+            from langchain_anthropic import ChatAnthropic
+            return ChatAnthropic(model=model, anthropic_api_key=api_key, temperature=0.5)
+        if provider == "openai":
+            from langchain_openai import ChatOpenAI
+            return ChatOpenAI(model=model, api_key=api_key, temperature=0.5)
+        if provider == "mistral":
+            from langchain_mistralai import ChatMistralAI
+            return ChatMistralAI(model=model, api_key=api_key, temperature=0.5)
+        raise LLMConfigError(
+            variable_name="LLM_PROVIDER",
+            extra_info=f"Unsupported provider: {provider}"
+        )
     
     def initialize_client(self) -> None:
         """
         Initialize the LangChain chat model client for the selected provider.
         - Imports the provider-specific client dynamically.
         - Initializes the client using the resolved `self.model` and `self.api_key`.
+        - With fallback backends, wraps them all in a FailoverChatModel (primary first).
         - Assigns the initialized client to `self.client`.
 
         Notes:
@@ -199,18 +301,16 @@ class LLMClient:
             True
         """
         try:
-            if self.provider == "anthropic":
-                from langchain_anthropic import ChatAnthropic
-                self.client = ChatAnthropic(
-                    model=self.model,
-                    anthropic_api_key=self.api_key,
-                    temperature=0.5
-                )
+            primary = self._build_chat_model(self.provider, self.model, self.api_key)
+            if self.fallback_backends:
+                from agent.llm.failover import FailoverChatModel
+
+                backends = {f"{self.provider}:{self.model}": primary}
+                for provider, model, api_key in self.fallback_backends:
+                    backends[f"{provider}:{model}"] = self._build_chat_model(provider, model, api_key)
+                self.client = FailoverChatModel.from_backends(backends)
             else:
-                raise LLMConfigError(
-                    variable_name="LLM_PROVIDER",
-                    extra_info=f"Unsupported provider: {self.provider}"
-                )
+                self.client = primary
         except Exception as e:
             raise LLMInitializationError(
                 provider=self.provider,
@@ -218,6 +318,69 @@ class LLMClient:
                 original_exception=e
             )
 
+    def warm_connection(self) -> None:
+        """
+        Open the provider's pooled HTTPS connection ahead of the first real query so the
+        first user does not pay for the TLS handshake.
+
+        Notes:
+            - Uses the chat model's public token counting call, which Anthropic answers
+              from its free count_tokens endpoint over the same connection pool, so no
+              tokens are spent.
+            - Initializes the client first if needed.
+
+        Raises:
+            LLMInitializationError: If the connection could not be opened.
+        """
+        if not self.client:
+            self.initialize_client()
+
+        # Every backend of a failover pool is warmed
+        chat_models = getattr(self.client, "backends", None) or [self.client]
+        try:
+            for chat_model in chat_models:
+                if getattr(chat_model, "_llm_type", None) == "anthropic-chat":
+                    chat_model.get_num_tokens_from_messages([HumanMessage(content="ping")])
+        except Exception as e:
+            raise LLMInitializationError(
+                provider=self.provider,
+                model=self.model,
+                original_exception=e,
+                additional_message="Connection warm-up failed"
+            )
+
+    def backend_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Rolling latency, error rate and health of each backend of a failover pool (see
+        agent.llm.failover). Empty for a single-backend client.
+        """
+        stats = getattr(self.client, "stats", None)
+        return stats() if callable(stats) else {}
+
+    # --- ADMISSION ---
+    def admit(self, tokens: int = 0, session_id: Optional[str] = None):
+        """
+        Context manager holding an admission slot around a model call (a no-op without
+        an admission controller).
+
+        Args:
+            tokens (int): Estimated input tokens of the call.
+            session_id (Optional[str]): Chat session the call belongs to. Defaults to the
+                session bound to CURRENT_SESSION_ID.
+
+        Raises:
+            LLMOverloadedError: If the call would wait longer than the admission deadline.
+        """
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.admit(session_id or CURRENT_SESSION_ID.get(), tokens)
+
+    def aadmit(self, tokens: int = 0, session_id: Optional[str] = None):
+        """Async version of `admit`, for `async with`."""
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.aadmit(session_id or CURRENT_SESSION_ID.get(), tokens)
+
     # --- QUERY EXECUTION ---
     def query(
         self,
@@ -248,16 +411,34 @@ class LLMClient:
         ]
         messages = [m for m in messages if m]  # Remove None
 
+        # Deterministic calls with identical inputs are answered from the cache
+        cache_key = None
+        cached = None
+        if (
+            self.response_cache is not None
+            and not self.test_mode
+            and self.response_cache.cacheable(temperature, expect_json)
+        ):
+            cache_key = self.response_cache.make_key(
+                self.provider, self.model, temperature, system_prompt, user_prompt
+            )
+            cached = self.response_cache.get(cache_key)
+
         try:
-            if self.test_mode == False:
-                # Query the LLM
-                response: AIMessage = self.client.invoke(
-                    messages,
-                    temperature=temperature
-                )
+            if cached is not None:
+                response = AIMessage(content=cached["content"])
+
+            elif self.test_mode == False:
+                # Query the LLM once admitted
+                with self.admit(tokens=estimate_tokens(system_prompt or "") + estimate_tokens(user_prompt)):
+                    response: AIMessage = self.client.invoke(
+                        messages,
+                        temperature=temperature
+                    )
                 
             elif self.function_name and self.test_response_type:
                 # Return a mock LLM response (for testing)
+                from agent.tests.test_variables import create_mock_llm_response
                 response: AIMessage = create_mock_llm_response(
                     function_name=self.function_name,
                     response_type=self.test_response_type,
@@ -281,12 +462,15 @@ class LLMClient:
             
             # Get the result text
             response_content = response.content.strip()
+            cache_response = cache_key is not None and cached is None
             
             if expect_json:
                 try:
                     # Try to parse the json
                     response_content = self._clean_llm_json_response(response_text=response_content)
                 except Exception as e:
+                    # Never cache a malformed answer
+                    cache_response = False
                     # Warn the user if we're expecting a json response but didn't get one (LLM faliure)
                     warnings.warn(
                         (
@@ -301,12 +485,24 @@ class LLMClient:
                         category=UserWarning,
                     )
             
+            if cache_response:
+                usage = response.usage_metadata or {}
+                self.response_cache.set(
+                    cache_key,
+                    response.content,
+                    input_tokens=usage.get("input_tokens"),
+                    output_tokens=usage.get("output_tokens"),
+                )
+
             # Return fallback message if result text is empty
             if not response_content:
                 response_content = self.fallback_message or "No query result"
 
             return response_content
 
+        except LLMOverloadedError:
+            # Surfaced as is, so callers can show its friendly message
+            raise
         except Exception as e:
             raise LLMQueryError(provider=self.provider, model=self.model, original_exception=e)
     
@@ -0,0 +1,744 @@
+# middleware.py
+"""
+Agent middleware used by LLMAgent. Kept out of llm_agent.py because `langchain.agents`
+is slow to import; LLMAgent imports this module only when it builds an agent.
+"""
+import json
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain.tools.tool_node import ToolCallRequest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.errors import GraphBubbleUp
+from langgraph.types import Command
+
+from agent.llm.failover import tool_choice_for
+from agent.llm.llm_agent import RENDERED_ARTIFACT_KEY
+from agent.utils import tracing
+from agent.utils.metrics import TOOL_DURATION
+from agent.utils.session_store import CURRENT_SESSION_ID
+from agent.utils.tool_memo import CURRENT_TOOL_MEMO
+
+logger = logging.getLogger(__name__)
+
+# Anthropic prompt-cache breakpoint (5 minute TTL, refreshed on every hit)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def render_context_sections(sections: Optional[Dict[str, str]]) -> str:
+    """Render {heading: text} context sections as the block appended to the system prompt."""
+    return "\n\n".join(
+        f"## {heading}\n{text.strip()}"
+        for heading, text in (sections or {}).items()
+        if text and text.strip()
+    )
+
+
+class TurnContextMiddleware(AgentMiddleware):
+    """
+    Applies the per-turn runtime context passed when the agent is invoked as
+    `context={"sections": {heading: text}, "session_id": str, "tools": [name, ...]}`:
+
+    - Sections (conversation summary, known movie ids...) are appended to the system
+      prompt of every model call. Anthropic accepts a single system prompt, so they
+      cannot be sent as extra system messages.
+    - If "tools" is given, only those tools are offered to the model. Every tool stays
+      registered, so a call to another one (e.g. named in history) still runs.
+    - The session id is bound to CURRENT_SESSION_ID while each tool runs, so tools can
+      use that session's entity memory, and the turn's "tool_memo" to CURRENT_TOOL_MEMO.
+
+    With `prompt_caching=True` (Anthropic only) the stable prefix of every call is marked
+    with cache breakpoints: the last tool schema, the static system prompt, and the
+    sections listed in `cached_sections` (e.g. the conversation summary), which are placed
+    before the sections that change every turn.
+    """
+
+    def __init__(self, prompt_caching: bool = False, cached_sections: Sequence[str] = ()):
+        super().__init__()
+        self.prompt_caching = prompt_caching
+        self.cached_sections = tuple(cached_sections)
+        self._cached_tools: Dict[tuple, List[dict]] = {}
+        self._tool_subsets: Dict[tuple, List[Any]] = {}
+
+    @staticmethod
+    def _tool_name(tool: Any) -> str:
+        return tool.get("name", "") if isinstance(tool, dict) else getattr(tool, "name", "")
+
+    def _offered_tools(self, tools: List[Any], names: Optional[Sequence[str]]) -> List[Any]:
+        """The subset of `tools` named in `names`, cached so each subset is built (and,
+        with prompt caching, converted to schemas) once."""
+        if names is None or not tools:
+            return tools
+        key = (tuple(id(tool) for tool in tools), tuple(names))
+        if key not in self._tool_subsets:
+            wanted = set(names)
+            self._tool_subsets[key] = [tool for tool in tools if self._tool_name(tool) in wanted]
+        return self._tool_subsets[key]
+
+    def _with_context(self, request: ModelRequest) -> ModelRequest:
+        context: Any = request.runtime.context if request.runtime else None
+        if not isinstance(context, dict):
+            context = {}
+        sections = context.get("sections") or {}
+        if context.get("tools") is not None:
+            request = request.override(tools=self._offered_tools(request.tools, context["tools"]))
+        if self.prompt_caching:
+            return self._with_cache_markers(request, sections)
+
+        block = render_context_sections(sections)
+        if not block:
+            return request
+
+        system_prompt = f"{request.system_prompt}\n\n{block}" if request.system_prompt else block
+        return request.override(system_prompt=system_prompt)
+
+    def _with_cache_markers(self, request: ModelRequest, sections: Dict[str, str]) -> ModelRequest:
+        """
+        Send the system prompt as content blocks (a str system prompt cannot carry
+        `cache_control`) and the tools as Anthropic tool dicts with a breakpoint on the last.
+        """
+        cached = {h: t for h, t in sections.items() if h in self.cached_sections}
+        volatile = {h: t for h, t in sections.items() if h not in self.cached_sections}
+
+        blocks = []
+        for text in (request.system_prompt, render_context_sections(cached)):
+            if text:
+                blocks.append({"type": "text", "text": text, "cache_control": CACHE_CONTROL})
+        volatile_text = render_context_sections(volatile)
+        if volatile_text:
+            blocks.append({"type": "text", "text": volatile_text})
+
+        overrides: Dict[str, Any] = {"tools": self._tools_with_cache_marker(request.tools)}
+        if blocks:
+            overrides["system_prompt"] = None
+            overrides["messages"] = [SystemMessage(content=blocks), *request.messages]
+        return request.override(**overrides)
+
+    def _tools_with_cache_marker(self, tools: List[Any]) -> List[Any]:
+        if not tools:
+            return tools
+        key = tuple(id(tool) for tool in tools)
+        if key not in self._cached_tools:
+            from langchain_anthropic.chat_models import convert_to_anthropic_tool
+
+            converted = [
+                dict(tool) if isinstance(tool, dict) else convert_to_anthropic_tool(tool)
+                for tool in tools
+            ]
+            converted[-1] = {**converted[-1], "cache_control": CACHE_CONTROL}
+            self._cached_tools[key] = converted
+        return self._cached_tools[key]
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        return handler(self._with_context(request))
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        return await handler(self._with_context(request))
+
+    @staticmethod
+    def _bind_turn(request: ToolCallRequest) -> tuple:
+        """Bind the turn's session id and tool memo; returns the tokens to reset them."""
+        context: Any = request.runtime.context if request.runtime else None
+        if not isinstance(context, dict):
+            context = {}
+        return (
+            CURRENT_SESSION_ID.set(context.get("session_id")),
+            CURRENT_TOOL_MEMO.set(context.get("tool_memo")),
+        )
+
+    @staticmethod
+    def _unbind_turn(tokens: tuple) -> None:
+        session_token, memo_token = tokens
+        CURRENT_TOOL_MEMO.reset(memo_token)
+        CURRENT_SESSION_ID.reset(session_token)
+
+    @staticmethod
+    def _split_rendered(result: ToolMessage | Command) -> ToolMessage | Command:
+        """
+        Move a locally rendered result ("rendered_markdown", see agent.logic.render) from
+        the tool output into the message artifact: the model never reads it, and LLMAgent
+        shows it to the user below the model's reply.
+        """
+        if not isinstance(result, ToolMessage) or not isinstance(result.content, str):
+            return result
+        if '"rendered_markdown"' not in result.content:
+            return result
+        try:
+            payload = json.loads(result.content)
+        except ValueError:
+            return result
+        if not isinstance(payload, dict) or "rendered_markdown" not in payload:
+            return result
+
+        rendered = payload.pop("rendered_markdown")
+        return result.model_copy(update={
+            "content": json.dumps(payload, ensure_ascii=False),
+            "artifact": {RENDERED_ARTIFACT_KEY: rendered},
+        })
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], ToolMessage | Command],
+    ) -> ToolMessage | Command:
+        tokens = self._bind_turn(request)
+        try:
+            return self._split_rendered(handler(request))
+        finally:
+            self._unbind_turn(tokens)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        tokens = self._bind_turn(request)
+        try:
+            return self._split_rendered(await handler(request))
+        finally:
+            self._unbind_turn(tokens)
+
+
+class ToolExecutionMiddleware(AgentMiddleware):
+    """
+    Times every tool call and isolates failures.
+
+    The agent already runs all tool calls of one model message concurrently (one graph
+    task each) and adds their results in call order. A tool that raises would otherwise
+    fail the whole turn, including its siblings' results. Here the exception becomes an
+    error ToolMessage instead, so the model can still answer with whatever succeeded.
+
+    Each ToolMessage gets its run time as `response_metadata["duration"]` (seconds), and
+    per-tool totals are kept for `stats()`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, tool_name: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                tool_name, {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        TOOL_DURATION.observe(seconds, tool=tool_name, status="error" if failed else "success")
+
+    def _finish(
+        self,
+        request: ToolCallRequest,
+        started_at: float,
+        result: ToolMessage | Command | None = None,
+        error: Exception | None = None,
+    ) -> ToolMessage | Command:
+        seconds = time.perf_counter() - started_at
+        tool_call = request.tool_call
+        if error is not None:
+            logger.warning("Tool %s failed after %.3fs: %s", tool_call["name"], seconds, error)
+            result = ToolMessage(
+                content=json.dumps({"status": "error", "error": f"{type(error).__name__}: {error}"}),
+                name=tool_call["name"],
+                tool_call_id=tool_call["id"],
+                status="error",
+            )
+        else:
+            logger.info("Tool %s took %.3fs", tool_call["name"], seconds)
+
+        failed = error is not None or getattr(result, "status", None) == "error"
+        self._record(tool_call["name"], seconds, failed=failed)
+        if isinstance(result, ToolMessage):
+            result.response_metadata = {**result.response_metadata, "duration": round(seconds, 3)}
+        return result
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], ToolMessage | Command],
+    ) -> ToolMessage | Command:
+        started_at = time.perf_counter()
+        try:
+            result = handler(request)
+        except GraphBubbleUp:
+            # Interrupts and parent-graph commands are control flow, not failures
+            raise
+        except Exception as e:
+            return self._finish(request, started_at, error=e)
+        return self._finish(request, started_at, result=result)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        started_at = time.perf_counter()
+        try:
+            result = await handler(request)
+        except GraphBubbleUp:
+            # Interrupts and parent-graph commands are control flow, not failures
+            raise
+        except Exception as e:
+            return self._finish(request, started_at, error=e)
+        return self._finish(request, started_at, result=result)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per tool: calls, errors, total / average / max run time in seconds."""
+        with self._lock:
+            return {
+                name: {**stats, "avg_seconds": stats["total_seconds"] / stats["calls"]}
+                for name, stats in self._stats.items()
+            }
+
+
+
+class AdmissionMiddleware(AgentMiddleware):
+    """
+    Admits every model call of the agent through the process-wide LLMAdmissionController
+    (see agent.llm.admission), queued under the turn's session id. The call's input
+    tokens are estimated from the request as sent: system prompt, messages and the
+    schemas of the tools offered.
+
+    Listed after TurnContextMiddleware so it sees the request with the context sections
+    added and the tool subset applied.
+    """
+
+    def __init__(self, admission: Any, tool_schema_tokens: Optional[Dict[str, int]] = None):
+        super().__init__()
+        self.admission = admission
+        self.tool_schema_tokens = tool_schema_tokens or {}
+
+    def _estimate(self, request: ModelRequest) -> tuple:
+        """(session id, estimated input tokens) of a model call."""
+        from agent.llm.tokens import estimate_message_tokens, estimate_tokens
+
+        context: Any = request.runtime.context if request.runtime else None
+        session_id = context.get("session_id") if isinstance(context, dict) else None
+        tokens = estimate_tokens(request.system_prompt or "")
+        tokens += sum(estimate_message_tokens(m) for m in request.messages)
+        tokens += sum(
+            self.tool_schema_tokens.get(TurnContextMiddleware._tool_name(tool), 0)
+            for tool in request.tools or []
+        )
+        return session_id, tokens
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        session_id, tokens = self._estimate(request)
+        with self.admission.admit(session_id, tokens):
+            return handler(request)
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        session_id, tokens = self._estimate(request)
+        async with self.admission.aadmit(session_id, tokens):
+            return await handler(request)
+
+
+class ModelTierMiddleware(AgentMiddleware):
+    """
+    Sends each model call of a turn to one of two models:
+
+    - "routing" (small, fast): calls that decide which tools to run, i.e. right after
+      the user's message, and calls whose tool results were all rendered locally (the
+      model only writes a one-line intro, see agent.logic.render). A direct answer that
+      needs no tools is kept as the reply.
+    - "response" (larger): calls that write the reply from tool results.
+
+    A routing answer that cannot be used is escalated: the same call is repeated on the
+    response model. It cannot be used when it has malformed tool calls, calls a tool
+    the agent does not have, or has neither text nor tool calls.
+
+    Each call's tier is set as `response_metadata["model_tier"]` on its message, and
+    per-tier calls, time, tokens and escalations are kept for `stats()`.
+    """
+
+    def __init__(self, routing_model: Any, response_model: Any, tool_names: Sequence[str] = ()):
+        super().__init__()
+        self.models = {"routing": routing_model, "response": response_model}
+        self.tool_names = set(tool_names)
+        self._stats: Dict[str, Dict[str, float]] = {
+            tier: {"calls": 0, "total_seconds": 0.0, "input_tokens": 0, "output_tokens": 0}
+            for tier in self.models
+        }
+        self._escalations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _on(self, request: ModelRequest, tier: str) -> ModelRequest:
+        """`request` sent to the tier's model, with its tool_choice in that model's form."""
+        model = self.models[tier]
+        return request.override(model=model, tool_choice=tool_choice_for(model, request.tool_choice))
+
+    @staticmethod
+    def tier_for(request: ModelRequest) -> str:
+        """The tier a call starts on, from the messages that precede it."""
+        results = []
+        for message in reversed(request.messages):
+            if not isinstance(message, ToolMessage):
+                break
+            results.append(message)
+        if not results:
+            return "routing"
+        rendered = all(
+            isinstance(m.artifact, dict) and m.artifact.get(RENDERED_ARTIFACT_KEY) for m in results
+        )
+        return "routing" if rendered else "response"
+
+    @staticmethod
+    def _message(response: Any) -> Any:
+        if isinstance(response, ModelResponse):
+            return next((m for m in response.result if isinstance(m, AIMessage)), None)
+        return response if isinstance(response, AIMessage) else None
+
+    def unusable_reason(self, response: Any, request: ModelRequest) -> Optional[str]:
+        """Why a routing answer has to be escalated, or None if it can be used."""
+        message = self._message(response)
+        if message is None:
+            return "no_message"
+        if message.invalid_tool_calls:
+            return "malformed_tool_call"
+        known = self.tool_names or {TurnContextMiddleware._tool_name(t) for t in request.tools or []}
+        if any(call["name"] not in known for call in message.tool_calls):
+            return "unknown_tool"
+        text = message.content if isinstance(message.content, str) else "".join(
+            part.get("text", "") for part in message.content if isinstance(part, dict)
+        )
+        if not message.tool_calls and not text.strip():
+            return "empty"
+        return None
+
+    def _record(self, tier: str, response: Any, seconds: float) -> None:
+        message = self._message(response)
+        usage = (message.usage_metadata if message is not None else None) or {}
+        if message is not None:
+            message.response_metadata = {**message.response_metadata, "model_tier": tier}
+        with self._lock:
+            stats = self._stats[tier]
+            stats["calls"] += 1
+            stats["total_seconds"] += seconds
+            stats["input_tokens"] += usage.get("input_tokens") or 0
+            stats["output_tokens"] += usage.get("output_tokens") or 0
+        logger.info(
+            "Model call on %s tier took %.3fs | input: %s | output: %s",
+            tier, seconds, usage.get("input_tokens"), usage.get("output_tokens"),
+        )
+
+    def _escalate(self, reason: str) -> None:
+        logger.warning("Routing model answer unusable (%s); escalating to response model", reason)
+        with self._lock:
+            self._escalations[reason] = self._escalations.get(reason, 0) + 1
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        tier = self.tier_for(request)
+        if tier == "routing":
+            started_at = time.perf_counter()
+            response = handler(self._on(request, "routing"))
+            self._record("routing", response, time.perf_counter() - started_at)
+            reason = self.unusable_reason(response, request)
+            if reason is None:
+                return response
+            self._escalate(reason)
+
+        started_at = time.perf_counter()
+        response = handler(self._on(request, "response"))
+        self._record("response", response, time.perf_counter() - started_at)
+        return response
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        tier = self.tier_for(request)
+        if tier == "routing":
+            started_at = time.perf_counter()
+            response = await handler(self._on(request, "routing"))
+            self._record("routing", response, time.perf_counter() - started_at)
+            reason = self.unusable_reason(response, request)
+            if reason is None:
+                return response
+            self._escalate(reason)
+
+        started_at = time.perf_counter()
+        response = await handler(self._on(request, "response"))
+        self._record("response", response, time.perf_counter() - started_at)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Per tier: calls, total / average seconds and tokens; escalations by reason."""
+        with self._lock:
+            tiers = {
+                tier: {
+                    **stats,
+                    "avg_seconds": (stats["total_seconds"] / stats["calls"]) if stats["calls"] else 0.0,
+                }
+                for tier, stats in self._stats.items()
+            }
+            return {"tiers": tiers, "escalations": dict(self._escalations)}
+
+
+# Appended to the system prompt of the last model call of a turn that ran out of budget
+BUDGET_NOTE = (
+    "This turn has reached its limit of lookups. Do not call any more tools: answer the "
+    "user now using only the results you already have, and say briefly what you could "
+    "not check."
+)
+# Reply used if that last call produces no text
+BUDGET_FALLBACK_REPLY = (
+    "Sorry, I couldn't finish looking that up. Here is what I found so far; "
+    "try asking about fewer movies at once."
+)
+
+
+class TurnBudgetMiddleware(AgentMiddleware):
+    """
+    Enforces per-turn limits on model calls ("steps"), tool calls and tokens, so a
+    confused model cannot loop tool calls (e.g. re-searching an ambiguous title).
+
+    Usage is counted from the turn's messages (everything after the latest user
+    message). Once a limit is reached, the next model call is the last one: it runs with
+    tool use disabled and BUDGET_NOTE added to the system prompt, so the model answers
+    from the partial results it has. Tool calls beyond the remaining allowance in one
+    model message are dropped. `stats()` counts how often each limit fired.
+
+    Limits of None or 0 are not enforced.
+    """
+
+    def __init__(
+        self,
+        max_steps: Optional[int] = None,
+        max_tool_calls: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ):
+        super().__init__()
+        self.max_steps = max_steps or None
+        self.max_tool_calls = max_tool_calls or None
+        self.max_tokens = max_tokens or None
+        self._trips: Dict[str, int] = {"steps": 0, "tool_calls": 0, "tokens": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def turn_usage(messages: Sequence[Any]) -> Dict[str, int]:
+        """Model calls, tool calls and tokens of the current turn so far."""
+        usage = {"steps": 0, "tool_calls": 0, "tokens": 0}
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                usage["steps"] += 1
+                usage["tool_calls"] += len(message.tool_calls)
+                usage["tokens"] += (message.usage_metadata or {}).get("total_tokens") or 0
+        return usage
+
+    def exceeded(self, usage: Dict[str, int]) -> Optional[str]:
+        """The first limit the turn has reached, if any. The step limit counts the final
+        answer, so it is reached one call early."""
+        if self.max_steps and usage["steps"] >= self.max_steps - 1:
+            return "steps"
+        if self.max_tool_calls and usage["tool_calls"] >= self.max_tool_calls:
+            return "tool_calls"
+        if self.max_tokens and usage["tokens"] >= self.max_tokens:
+            return "tokens"
+        return None
+
+    def _trip(self, limit: str, usage: Dict[str, int]) -> None:
+        logger.warning("Turn budget reached (%s) | usage so far: %s", limit, usage)
+        with self._lock:
+            self._trips[limit] += 1
+
+    @staticmethod
+    def _final_call(request: ModelRequest) -> ModelRequest:
+        """
+        The request with tool use disabled and BUDGET_NOTE added to the system prompt.
+        The tool_choice is translated again for whichever model is finally called (see
+        ModelTierMiddleware and FailoverChatModel.bind_tools).
+        """
+        overrides: Dict[str, Any] = {"tool_choice": tool_choice_for(request.model, "none")}
+        messages = request.messages
+        if request.system_prompt is not None or not messages or not isinstance(messages[0], SystemMessage):
+            overrides["system_prompt"] = (
+                f"{request.system_prompt}\n\n{BUDGET_NOTE}" if request.system_prompt else BUDGET_NOTE
+            )
+        else:
+            # Cache-marked system prompt (content blocks): add the note as its own block
+            system = messages[0]
+            blocks = system.content if isinstance(system.content, list) else [
+                {"type": "text", "text": system.content}
+            ]
+            overrides["messages"] = [
+                SystemMessage(content=[*blocks, {"type": "text", "text": BUDGET_NOTE}]),
+                *messages[1:],
+            ]
+        return request.override(**overrides)
+
+    @staticmethod
+    def _keep_tool_calls(response: Any, keep: int) -> None:
+        """Drop all but the first `keep` tool calls of the response message (and their
+        tool_use content blocks)."""
+        message = ModelTierMiddleware._message(response)
+        if message is None:
+            return
+        kept = message.tool_calls[:keep]
+        kept_ids = {call["id"] for call in kept}
+        if isinstance(message.content, list):
+            message.content = [
+                block for block in message.content
+                if not (isinstance(block, dict) and block.get("type") == "tool_use"
+                        and block.get("id") not in kept_ids)
+            ]
+        message.tool_calls = kept
+        if not message.content and not kept:
+            message.content = BUDGET_FALLBACK_REPLY
+
+    def _after_call(self, response: Any, usage: Dict[str, int], final: Optional[str]) -> Any:
+        if final:
+            self._keep_tool_calls(response, 0)
+            message = ModelTierMiddleware._message(response)
+            if message is not None:
+                message.response_metadata = {**message.response_metadata, "budget_trip": final}
+            return response
+
+        message = ModelTierMiddleware._message(response)
+        if self.max_tool_calls and message is not None:
+            remaining = self.max_tool_calls - usage["tool_calls"]
+            if len(message.tool_calls) > remaining:
+                # Not a trip of its own: the kept calls use up the allowance, so the next
+                # call is the forced final one, which counts the "tool_calls" trip
+                self._keep_tool_calls(response, remaining)
+        return response
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        usage = self.turn_usage(request.messages)
+        final = self.exceeded(usage)
+        if final:
+            self._trip(final, usage)
+            request = self._final_call(request)
+        return self._after_call(handler(request), usage, final)
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        usage = self.turn_usage(request.messages)
+        final = self.exceeded(usage)
+        if final:
+            self._trip(final, usage)
+            request = self._final_call(request)
+        return self._after_call(await handler(request), usage, final)
+
+    def stats(self) -> Dict[str, Any]:
+        """Configured limits and how many times each one fired."""
+        with self._lock:
+            return {
+                "limits": {
+                    "steps": self.max_steps,
+                    "tool_calls": self.max_tool_calls,
+                    "tokens": self.max_tokens,
+                },
+                "trips": dict(self._trips),
+            }
+
+
+class TracingMiddleware(AgentMiddleware):
+    """
+    Records every model call and tool call of a traced turn as a span (see
+    agent.utils.tracing), nested under the span passed in the runtime context as "span".
+    Tool spans are bound to CURRENT_SPAN while the tool runs, so its Trakt requests nest
+    under them. Listed first, so the spans cover the other middleware's work too.
+    """
+
+    @staticmethod
+    def _parent(request: ModelRequest | ToolCallRequest) -> Any:
+        context: Any = request.runtime.context if request.runtime else None
+        return context.get("span") if isinstance(context, dict) else None
+
+    @staticmethod
+    def _record_model_call(span: Any, response: ModelResponse) -> None:
+        message = ModelTierMiddleware._message(response)
+        if message is None:
+            return
+        usage = message.usage_metadata or {}
+        span.set_attributes(**{
+            "llm.tool_calls": len(message.tool_calls),
+            "llm.input_tokens": usage.get("input_tokens"),
+            "llm.output_tokens": usage.get("output_tokens"),
+            "llm.model_tier": message.response_metadata.get("model_tier"),
+            "agent.budget_trip": message.response_metadata.get("budget_trip"),
+        })
+
+    @staticmethod
+    def _record_tool_call(span: Any, result: ToolMessage | Command) -> None:
+        if isinstance(result, ToolMessage):
+            span.set_attribute("tool.status", result.status)
+            if result.status == "error":
+                span.record_error(str(result.content)[:200])
+
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        with tracing.span("llm.call", self._parent(request)) as span:
+            response = handler(request)
+            self._record_model_call(span, response)
+            return response
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        with tracing.span("llm.call", self._parent(request)) as span:
+            response = await handler(request)
+            self._record_model_call(span, response)
+            return response
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], ToolMessage | Command],
+    ) -> ToolMessage | Command:
+        name = request.tool_call["name"]
+        with tracing.span(f"tool.{name}", self._parent(request), **{"tool.name": name}) as span:
+            result = handler(request)
+            self._record_tool_call(span, result)
+            return result
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        name = request.tool_call["name"]
+        with tracing.span(f"tool.{name}", self._parent(request), **{"tool.name": name}) as span:
+            result = await handler(request)
+            self._record_tool_call(span, result)
+            return result
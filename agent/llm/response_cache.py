@@ -0,0 +1,176 @@
+# response_cache.py
+"""
+Exact-match cache for `LLMClient.query` responses.
+
+Only deterministic calls are cached (`expect_json` or temperature at most
+`max_temperature`): the same prompts then give the same answer, so re-asking the model
+only costs latency and tokens. Entries live in an in-memory LRU+TTL tier and, if a
+path is configured, in a SQLite file that survives restarts and is shared between
+processes on the same host.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from agent.config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_MAX_TEMPERATURE,
+    LLM_CACHE_SQLITE_PATH,
+    LLM_CACHE_TTL_SECONDS,
+)
+from agent.utils.cache import TTLCache
+from agent.utils.metrics import register_cache
+
+
+class LLMResponseCache:
+    """
+    Two-tier (memory, optional SQLite) cache of raw LLM response text plus the tokens
+    the original call used, so hits can report what they saved.
+
+    Attributes:
+        max_temperature (float): Highest temperature that is cached without `expect_json`.
+        ttl_seconds (Optional[float]): Seconds an entry stays valid in either tier.
+        sqlite_path (Optional[str]): SQLite file for the persistent tier (None disables it).
+
+    Example:
+        >>> cache = LLMResponseCache(sqlite_path="llm_cache.sqlite3")
+        >>> key = cache.make_key("anthropic", "claude-haiku-4-5", 0.0, "system", "user")
+        >>> cache.set(key, '{"title": "Inception"}', input_tokens=120, output_tokens=12)
+        >>> cache.get(key)["content"]
+        '{"title": "Inception"}'
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds: Optional[float] = LLM_CACHE_TTL_SECONDS,
+        sqlite_path: Optional[str] = LLM_CACHE_SQLITE_PATH,
+        max_temperature: float = LLM_CACHE_MAX_TEMPERATURE,
+    ):
+        self.max_temperature = max_temperature
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.sqlite_hits = 0
+        self.saved_input_tokens = 0
+        self.saved_output_tokens = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, "
+                "input_tokens INTEGER, output_tokens INTEGER, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def cacheable(self, temperature: float, expect_json: bool) -> bool:
+        """Whether a call with these settings is deterministic enough to cache."""
+        return expect_json or temperature <= self.max_temperature
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: str,
+        temperature: float,
+        system_prompt: Optional[str],
+        user_prompt: str,
+    ) -> str:
+        """Hash everything that determines the response into a fixed-size key."""
+        payload = json.dumps([provider, model, temperature, system_prompt or "", user_prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _record_hit(self, entry: Dict[str, Any], from_sqlite: bool) -> None:
+        with self._lock:
+            self.hits += 1
+            self.sqlite_hits += int(from_sqlite)
+            self.saved_input_tokens += entry.get("input_tokens") or 0
+            self.saved_output_tokens += entry.get("output_tokens") or 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            Optional[dict]: {"content", "input_tokens", "output_tokens"} or None on a miss.
+        """
+        entry = self.memory.get(key)
+        if entry is not None:
+            self._record_hit(entry, from_sqlite=False)
+            return entry
+
+        if self._db is not None:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT content, input_tokens, output_tokens, created_at "
+                    "FROM llm_response_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+            if row is not None:
+                content, input_tokens, output_tokens, created_at = row
+                if self.ttl_seconds is None or time.time() - created_at <= self.ttl_seconds:
+                    entry = {
+                        "content": content,
+                        "input_tokens": input_tokens,
+                        "output_tokens": output_tokens,
+                    }
+                    self.memory.set(key, entry)
+                    self._record_hit(entry, from_sqlite=True)
+                    return entry
+                with self._lock:
+                    self._db.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(
+        self,
+        key: str,
+        content: str,
+        input_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+    ) -> None:
+        entry = {"content": content, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        self.memory.set(key, entry)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_response_cache "
+                    "(key, content, input_tokens, output_tokens, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, content, input_tokens, output_tokens, time.time()),
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM llm_response_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counts, hit rate and the tokens hits avoided spending."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "sqlite_hits": self.sqlite_hits,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "saved_input_tokens": self.saved_input_tokens,
+                "saved_output_tokens": self.saved_output_tokens,
+            }
+
+
+# Shared by every LLMClient unless another cache (or None) is passed in
+LLM_RESPONSE_CACHE: Optional[LLMResponseCache] = LLMResponseCache() if LLM_CACHE_ENABLED else None
+if LLM_RESPONSE_CACHE is not None:
+    register_cache("llm_response", LLM_RESPONSE_CACHE.stats)
@@ -0,0 +1,153 @@
+# summarizer.py
+"""
+Rolling conversation summary. Turns that fall out of the recent window are folded into
+a compact summary (movies discussed with their trakt_ids, the user's preferences) which
+is sent with every later turn, so long sessions keep a roughly constant prompt size.
+"""
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+from agent.config import SUMMARY_KEEP_RECENT_MESSAGES, SUMMARY_MIN_NEW_MESSAGES
+from agent.llm.llm_client import LLMClient
+from agent.utils.background import submit_background
+from agent.utils.session_store import CONVERSATION_STORE, ConversationStore
+
+logger = logging.getLogger(__name__)
+
+# Heading the summary is sent under (see LLMAgent `context_sections`)
+SUMMARY_SECTION = "Conversation summary"
+
+SUMMARY_SYSTEM_PROMPT = """
+You maintain a compact memory of a conversation between a user and a movie assistant.
+You will be given the previous memory (possibly empty) and new conversation turns.
+
+Return **only** a JSON object with keys:
+- "movies": list of {"title": str, "year": int | null, "trakt_id": int | null} for every
+  movie discussed, most recent last. Keep trakt_ids exactly as they appear. Max 20 entries.
+- "preferences": list of short phrases describing the user's stated tastes, dislikes,
+  streaming services or other preferences.
+- "notes": one short sentence on anything else still relevant (open questions, pending
+  watchlist changes), or "".
+"""
+
+
+def render_summary(summary_json: dict) -> str:
+    """Render the summarizer's JSON as the compact text sent to the agent."""
+    lines = []
+    movies = summary_json.get("movies") or []
+    if movies:
+        lines.append("Movies discussed: " + "; ".join(
+            f"{m.get('title')}"
+            + (f" ({m['year']})" if m.get("year") else "")
+            + (f" [trakt_id {m['trakt_id']}]" if m.get("trakt_id") else "")
+            for m in movies
+            if isinstance(m, dict) and m.get("title")
+        ))
+    preferences = summary_json.get("preferences") or []
+    if preferences:
+        lines.append("User preferences: " + "; ".join(str(p) for p in preferences))
+    if summary_json.get("notes"):
+        lines.append(f"Notes: {summary_json['notes']}")
+    return "\n".join(lines)
+
+
+def _format_turns(messages: List[BaseMessage]) -> str:
+    return "\n".join(
+        f"{'User' if m.type == 'human' else 'Assistant'}: {m.content}"
+        for m in messages
+    )
+
+
+class ConversationSummarizer:
+    """
+    Folds older turns of each session in a ConversationStore into its rolling summary.
+
+    `schedule(session_id)` is called after a turn completes and runs the update on the
+    background executor, so summarizing never delays a reply. At most one update runs
+    per session at a time.
+
+    Attributes:
+        get_llm_client (Callable[[], LLMClient]): Returns the client used to summarize.
+        store (ConversationStore): Where history is read from and summaries are written.
+        keep_recent (int): Most recent messages always left verbatim.
+        min_new_messages (int): Older messages required before a (paid) update runs.
+    """
+
+    def __init__(
+        self,
+        get_llm_client: Callable[[], LLMClient],
+        store: ConversationStore = CONVERSATION_STORE,
+        keep_recent: int = SUMMARY_KEEP_RECENT_MESSAGES,
+        min_new_messages: int = SUMMARY_MIN_NEW_MESSAGES,
+    ):
+        self.get_llm_client = get_llm_client
+        self.store = store
+        self.keep_recent = keep_recent
+        self.min_new_messages = min_new_messages
+        self._in_flight: set = set()
+        self._lock = threading.Lock()
+
+    def context_sections(self, session_id: str) -> Dict[str, str]:
+        """Return the session's summary as LLMAgent context sections (empty if none)."""
+        summary = self.store.summary(session_id)
+        return {SUMMARY_SECTION: summary} if summary else {}
+
+    def update(self, session_id: str) -> bool:
+        """
+        Fold the session's older unsummarized messages into its summary.
+
+        Returns:
+            bool: Whether a new summary was stored.
+        """
+        previous, to_fold, through = self.store.messages_to_summarize(session_id, self.keep_recent)
+        if len(to_fold) < self.min_new_messages:
+            return False
+
+        response = self.get_llm_client().query(
+            system_prompt=SUMMARY_SYSTEM_PROMPT,
+            user_prompt=(
+                f"Previous memory:\n{previous or '(empty)'}\n\n"
+                f"New turns:\n{_format_turns(to_fold)}"
+            ),
+            temperature=0,
+            expect_json=True,
+        )
+        if not isinstance(response, dict):
+            # Unparseable; the same turns are retried after the next reply
+            logger.warning("Summary update for session %s returned no JSON", session_id)
+            return False
+
+        summary = render_summary(response)
+        self.store.set_summary(session_id, summary, through)
+        logger.info(
+            "Summarized %s messages for session %s (%s chars)", len(to_fold), session_id, len(summary)
+        )
+        return True
+
+    def _update_quietly(self, session_id: str) -> bool:
+        try:
+            return self.update(session_id)
+        except Exception as e:
+            logger.warning("Summary update for session %s failed: %s", session_id, e)
+            return False
+        finally:
+            with self._lock:
+                self._in_flight.discard(session_id)
+
+    def schedule(self, session_id: str) -> Optional[Future]:
+        """
+        Update the session's summary in the background.
+
+        Returns:
+            Optional[Future]: Resolves to `update`'s result, or None if an update for this
+                session is already running.
+        """
+        with self._lock:
+            if session_id in self._in_flight:
+                return None
+            self._in_flight.add(session_id)
+        return submit_background(self._update_quietly, session_id)
@@ -0,0 +1,99 @@
+# tokens.py
+"""
+Fast local token estimates, used to fit chat history into a prompt budget without a
+round trip to the provider's token-counting endpoint.
+
+Estimates are character based (`TOKEN_ESTIMATE_CHARS_PER_TOKEN`). Every agent turn
+records its estimate next to the provider-reported input tokens (see `record_usage`),
+so `calibration_stats()` shows how far off the ratio is for real traffic.
+"""
+import json
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from agent.config import TOKEN_ESTIMATE_CHARS_PER_TOKEN
+
+# Role markers and separators the provider adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str, chars_per_token: float = TOKEN_ESTIMATE_CHARS_PER_TOKEN) -> int:
+    """Estimate the number of tokens in `text`."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / chars_per_token)
+
+
+def estimate_message_tokens(message: BaseMessage | dict) -> int:
+    """Estimate the tokens a single chat message adds to a prompt."""
+    content = message["content"] if isinstance(message, dict) else message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def estimate_tool_tokens(tools: Optional[Sequence[Any]]) -> int:
+    """Estimate the tokens taken by the JSON schemas of `tools` when bound to a model."""
+    if not tools:
+        return 0
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    return sum(
+        estimate_tokens(json.dumps(tool if isinstance(tool, dict) else convert_to_openai_tool(tool)))
+        for tool in tools
+    )
+
+
+def select_history(messages: Sequence[BaseMessage], budget_tokens: int) -> List[BaseMessage]:
+    """
+    Pack the most recent messages that fit into `budget_tokens`, oldest first.
+
+    The latest message is always kept, even if it alone exceeds the budget. The
+    selection never starts with an assistant message, since a prompt has to open
+    with the user's turn.
+    """
+    selected: List[BaseMessage] = []
+    used = 0
+    for message in reversed(messages):
+        cost = estimate_message_tokens(message)
+        if selected and used + cost > budget_tokens:
+            break
+        selected.append(message)
+        used += cost
+
+    selected.reverse()
+    while len(selected) > 1 and isinstance(selected[0], AIMessage):
+        selected.pop(0)
+    return selected
+
+
+# --- CALIBRATION ---
+_calibration_lock = threading.Lock()
+_calibration = {"turns": 0, "estimated_tokens": 0, "actual_tokens": 0}
+
+
+def record_usage(estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+    """Record one turn's estimated vs provider-reported input tokens."""
+    if not actual_tokens:
+        return
+    with _calibration_lock:
+        _calibration["turns"] += 1
+        _calibration["estimated_tokens"] += estimated_tokens
+        _calibration["actual_tokens"] += actual_tokens
+
+
+def calibration_stats() -> Dict[str, Any]:
+    """
+    Return totals recorded by `record_usage` plus `actual_per_estimated`: multiply
+    estimates by it (or divide TOKEN_ESTIMATE_CHARS_PER_TOKEN by it) to match the provider.
+    """
+    with _calibration_lock:
+        stats = dict(_calibration)
+    stats["actual_per_estimated"] = (
+        round(stats["actual_tokens"] / stats["estimated_tokens"], 3)
+        if stats["estimated_tokens"] else None
+    )
+    return stats
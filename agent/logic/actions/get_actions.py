@@ -6,12 +6,16 @@ from agent.logic.services.trakt.get_movies import (
     query_top_trakt_movies,
     search_trakt_movie,
     query_trakt_movie,
+    query_trakt_movies,
     query_related_movies,
 )
 from agent.logic.services.trakt.trakt_lists import query_user_trakt_list
 
 from textwrap import dedent
 
+# Title matches scoring at or below this are shown to the user to confirm, not as a match
+CONFIDENT_MATCH_SCORE = 0.6
+
 class GetTrending:
     action_prompt_template = """
         You are a helpful movie information agent. You will be provided with a JSON list
@@ -205,7 +209,7 @@ class GetMovieDetails:
                 }
 
         elif query_result['status'] == "match":
-            if query_result.get('match_score', 0) > 0.6:
+            if query_result.get('match_score', 0) > CONFIDENT_MATCH_SCORE:
                 # A proper match has been found!
                 prompt = generate_system_prompt_from_model_instance(
                     action_prompt_template=GetMovieDetails.action_prompt_template,
@@ -222,7 +226,8 @@ class GetMovieDetails:
             return {
                 "status": "success",
                 "model_instance": query_result['movie'],
-                "action_prompt": prompt
+                "action_prompt": prompt,
+                "confident_match": query_result.get('match_score', 0) > CONFIDENT_MATCH_SCORE,
             }
         
         return {
@@ -231,6 +236,83 @@ class GetMovieDetails:
             "action_prompt": None
         }
         
+class GetMovieDetailsBatch:
+    action_prompt_template = """
+        You are a helpful movie information agent. You will be provided with a JSON list of
+        the movies the user asked about, in the order they asked. Each has a "match_status":
+
+        - "match": present metadata inline like a movie capsule with (runtime, rating,
+          release_date), director and cast on one line, then a short, engaging summary.
+          Abridge what is provided.
+        - "multiple_candidates": say the title was ambiguous or not a confident match and
+          list its "candidates" (title, year AND trakt_id), asking which one the user meant.
+        - "no_match": say briefly that no movie with that title was found.
+
+        Format as a numeric list in the order given. If the user asked to compare the movies,
+        finish with a few sentences comparing the matched ones using only the data provided.
+
+        If a trailer is provided always put the raw url as the last line for that movie.
+    """
+
+    @staticmethod
+    def get_movie_details_batch(
+        movies: List[dict],
+    ) -> dict:
+        """
+        Look up several movies at once.
+
+        Args:
+            movies: One {"title", "year", "trakt_id"} dict per requested movie.
+
+        Returns a dictionary with:
+            - model_instance: MovieList with one entry per requested movie, in order, each
+              carrying its `match_status` (and `candidates` when ambiguous)
+            - action_prompt: One prompt formatting the whole list
+        """
+        movies = [m for m in movies if m.get("title") or m.get("trakt_id")]
+        if not movies:
+            return {
+                "status": "error",
+                "model_instance": MovieList(),
+                "action_prompt": GetMovieDetails.error_prompt_no_title,
+            }
+
+        results = query_trakt_movies(movies)
+
+        entries = []
+        for requested, result in zip(movies, results):
+            label = requested.get("title") or f"trakt_id {requested.get('trakt_id')}"
+            if result["status"] == "match" and result.get("movie") is not None:
+                if result.get("match_score", 0) > CONFIDENT_MATCH_SCORE:
+                    entries.append(result["movie"].model_copy(update={"match_status": "match"}))
+                    continue
+                # Same as GetMovieDetails: a weak match is offered for the user to confirm
+                candidates = [result["movie"]]
+            elif result["status"] == "multiple_candidates":
+                candidates = result["potential_matches"].movies
+            else:
+                candidates = []
+
+            if candidates:
+                entries.append(Movie(
+                    title=label,
+                    year=requested.get("year"),
+                    match_status="multiple_candidates",
+                    candidates=[
+                        f"{m.title}" + (f" ({m.year})" if m.year else "") + f" [trakt_id {m.trakt_id}]"
+                        for m in candidates
+                    ],
+                ))
+            else:
+                entries.append(Movie(title=label, year=requested.get("year"), match_status="no_match"))
+
+        return {
+            "status": "success",
+            "model_instance": MovieList(movies=entries),
+            "action_prompt": dedent(GetMovieDetailsBatch.action_prompt_template),
+        }
+
+
 class GetRelatedMovies:
     action_prompt_template = """
         You are a helpful movie information agent. Do not comment on the movie the user asked
@@ -0,0 +1,146 @@
+# entity_memory.py
+"""
+Per-session memory of the movies tools have resolved, so follow-ups like "add it to my
+watchlist" reuse the trakt_id from an earlier turn instead of searching Trakt again.
+
+Tools call `resolve_movie_reference` before querying and `remember_movies` after. Both
+act on the session in CURRENT_SESSION_ID, which the agent binds for each tool call.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from agent.models import Movie, MovieList
+from agent.utils.session_store import CONVERSATION_STORE, CURRENT_SESSION_ID
+
+# Words for the movie in focus. Tools take them as an explicit `reference`; as a `title`
+# they only count as one when no year is given and a movie is in focus, since "It" (2017)
+# and "The One" (2001) are also films.
+PRONOUN_REFERENCES = {
+    "it", "this", "that", "this one", "that one", "the one",
+    "this movie", "that movie", "the movie", "this film", "that film", "the film",
+    "same movie", "same film",
+}
+
+# Prompt for a pronoun with no movie in focus, so the model asks instead of guessing
+UNRESOLVED_REFERENCE_PROMPT = (
+    "The user referred to a movie (\"{reference}\") but no movie has been discussed yet. "
+    "Do not guess: ask the user which movie they mean."
+)
+
+# Heading the id table is sent under (see LLMAgent `context_sections`)
+ENTITY_SECTION = "Known movies (title (year): trakt_id)"
+# Most recent movies listed in the id table
+ENTITY_TABLE_SIZE = 10
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase and strip punctuation so "Spider-Man: No Way Home" == "spider man no way home"."""
+    return re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+
+
+def resolve_movie_reference(
+    title: Optional[str] = None,
+    year: Optional[int] = None,
+    trakt_id: Optional[int] = None,
+    session_id: Optional[str] = None,
+    reference: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Look up a movie the current session already resolved.
+
+    - A `reference` ("it", "that movie"...) or a missing title resolves to the movie in
+      focus. So does a pronoun passed as the title without a year, if a movie is in focus.
+    - Otherwise the title (and year, if given) must match a remembered movie exactly
+      after normalization. If several remembered movies match (e.g. the candidates of
+      an ambiguous search), the title is not resolved, so the tool disambiguates again.
+
+    Returns:
+        Optional[dict]: {"title", "year", "trakt_id"} of the remembered movie, or None if
+            `trakt_id` was already given or not exactly one movie matches.
+    """
+    session_id = session_id or CURRENT_SESSION_ID.get()
+    if trakt_id or not session_id:
+        return None
+
+    if reference or not title or (not year and is_pronoun_reference(title)):
+        focus = CONVERSATION_STORE.focus_entity(session_id)
+        if focus or not title:
+            return focus
+
+    wanted = normalize_title(title)
+    matches = [
+        entity for entity in CONVERSATION_STORE.entities(session_id)
+        if normalize_title(entity.get("title") or "") == wanted
+        and not (year and entity.get("year") and entity["year"] != year)
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+
+def is_pronoun_reference(title: Optional[str]) -> bool:
+    """True if `title` is a pronoun ("it", "that movie"...) rather than a movie title."""
+    return bool(title) and normalize_title(title) in PRONOUN_REFERENCES
+
+
+def is_unresolved_reference(
+    reference: Optional[str],
+    title: Optional[str] = None,
+    trakt_id: Optional[int] = None,
+) -> bool:
+    """
+    True if a tool was given a `reference` that `resolve_movie_reference` could not
+    resolve and has no real title or trakt_id of its own to search for instead.
+    """
+    return bool(reference) and not trakt_id and (not title or is_pronoun_reference(title))
+
+
+def unresolved_reference_result(action_name: str, reference: str) -> Dict[str, Any]:
+    """
+    Tool result for a reference with no movie in focus. Tools return it instead of
+    searching Trakt for (or writing) the reference itself, which would find movies
+    literally titled "It" or "This".
+    """
+    return {
+        "status": "error",
+        "action_name": action_name,
+        "message": f"No movie in this conversation to resolve \"{reference}\" to.",
+        "action_prompt": UNRESOLVED_REFERENCE_PROMPT.format(reference=reference),
+    }
+
+
+def remember_movies(
+    model_instance: Movie | MovieList | List[Movie] | None,
+    focus: bool = False,
+    session_id: Optional[str] = None,
+) -> None:
+    """
+    Record every movie with a trakt_id in `model_instance` for the current session.
+    Pass `focus=True` when the user asked about this one movie specifically.
+    """
+    session_id = session_id or CURRENT_SESSION_ID.get()
+    if not session_id or model_instance is None:
+        return
+
+    if isinstance(model_instance, Movie):
+        movies = [model_instance]
+    elif isinstance(model_instance, MovieList):
+        movies = model_instance.movies
+    else:
+        movies = list(model_instance)
+
+    CONVERSATION_STORE.remember_movies(
+        session_id,
+        [{"title": m.title, "year": m.year, "trakt_id": m.trakt_id} for m in movies if m.trakt_id],
+        focus=focus,
+    )
+
+
+def entity_table_section(session_id: str, limit: int = ENTITY_TABLE_SIZE) -> Dict[str, str]:
+    """Return the session's most recent movies as a compact id table context section."""
+    entities = CONVERSATION_STORE.entities(session_id)[-limit:]
+    if not entities:
+        return {}
+    rows = [
+        f"{e['title']}" + (f" ({e['year']})" if e.get("year") else "") + f": {e['trakt_id']}"
+        for e in entities
+    ]
+    return {ENTITY_SECTION: "\n".join(rows)}
@@ -0,0 +1,277 @@
+# intent_router.py
+"""
+Deterministic fast path in front of the movie agent.
+
+Common, unambiguous commands ("what's trending", "show my watchlist", "add Dune to my
+watchlist") are matched with anchored patterns and sent straight to the tool, skipping
+the LLM round trip that would only decide to call it. Anything that does not match a
+pattern in full, or names no single concrete title ("add the second one", "remove all
+of them"), falls through to the agent.
+"""
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agent.llm.llm_client import LLMClient
+from agent.llm.tokens import estimate_message_tokens
+from agent.logic.entity_memory import is_pronoun_reference
+from agent.utils import tracing
+from agent.utils.background import run_blocking
+from agent.utils.metrics import TOOL_DURATION, record_turn_tokens
+from agent.utils.session_store import CURRENT_SESSION_ID
+from agent.utils.tool_memo import CURRENT_TOOL_MEMO, memo_for_turn
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_NUM = r"(?P<num>\d{1,2}|" + "|".join(NUMBER_WORDS) + r")"
+_POLITE = r"(?:(?:please|hey|ok|okay|can you|could you|would you)[, ]+)*"
+_END = r"\s*(?:please)?\s*[.!?]*"
+
+# (intent, pattern) pairs. Every pattern must match the whole message.
+INTENT_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    ("get_trending", re.compile(
+        rf"^{_POLITE}(?:show me |give me |list |tell me |what(?:'s| is| are) )?(?:the )?"
+        rf"(?:top )?(?:{_NUM} )?(?:trending)(?: movies| films)?"
+        rf"(?: right now| now| today| this week)?{_END}$",
+        re.IGNORECASE,
+    )),
+    ("get_user_list", re.compile(
+        rf"^{_POLITE}(?:show(?: me)?|list|display|view|open|see|get|what(?:'s| is) (?:on|in))"
+        rf" my watch ?list{_END}$",
+        re.IGNORECASE,
+    )),
+    ("update_watchlist", re.compile(
+        rf"^{_POLITE}(?P<verb>add|put|save|remove|delete|take) (?P<title>.+?)"
+        rf"(?: \(\d{{4}}\))? (?:to|on|onto|into|in|from|off|off of|out of) my watch ?list{_END}$",
+        re.IGNORECASE,
+    )),
+]
+
+REMOVE_VERBS = {"remove", "delete", "take"}
+
+_ORDINALS = (
+    r"first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth"
+    r"|last|next|previous|former|latter|\d+(?:st|nd|rd|th)|#\d+"
+)
+# Watchlist "titles" that refer to movies instead of naming one: pronouns, ordinals,
+# quantifiers, and several titles joined by a conjunction. Only the agent, with the
+# conversation in view, can tell which movies these mean.
+REFERENCE_TITLE = re.compile(
+    r"^(?:"
+    r"(?:the |this |that |these |those )?(?:one|ones|movie|movies|film|films)"
+    r"|it|this|that|these|those|them|they|everything|the rest|the lot"
+    rf"|(?:the )?(?:{_ORDINALS})(?: one| movie| film)?(?: (?:on|in|from) (?:the|that|this|your|my) list)?"
+    r"|(?:all|both|each|every|any|some|none|most|either|neither|several)"
+    r"(?: (?:of )?(?:them|those|these|it|the movies|the films|the ones|movies|films|one|ones))?"
+    r")$"
+    r"|\band\b|&|,|\bor\b|\bplus\b|\bas well as\b|\balong with\b",
+    re.IGNORECASE,
+)
+
+FORMAT_USER_PROMPT = """
+The user said: {message}
+
+Tool result:
+{payload}
+"""
+
+
+def match_intent(message: str) -> Optional[Dict[str, Any]]:
+    """
+    Match `message` against INTENT_PATTERNS.
+
+    Returns:
+        Optional[dict]: {"intent": tool name, "args": tool arguments}, or None to fall
+            through to the agent.
+    """
+    text = " ".join(message.strip().split())
+    for intent, pattern in INTENT_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        groups = match.groupdict()
+
+        if intent == "get_trending":
+            num = groups.get("num")
+            args = {"num": int(NUMBER_WORDS.get(num.lower(), num))} if num else {}
+        elif intent == "get_user_list":
+            args = {}
+        else:
+            title = groups["title"].strip(" \"'")
+            if REFERENCE_TITLE.search(title) or is_pronoun_reference(title):
+                return None
+            args = {
+                "mode": "remove" if groups["verb"].lower() in REMOVE_VERBS else "add",
+                "title": title,
+            }
+        return {"intent": intent, "args": args}
+    return None
+
+
+class IntentRouter:
+    """
+    Runs matched intents directly against the agent's tools and streams the reply with
+    the same events as `LLMAgent.astream`, so the chat handler treats both paths alike.
+
+    The tool result is phrased by the LLM in a single call instead of a tool-calling
+    round trip followed by a formatting turn. Results rendered locally (see
+    agent.logic.render) only get a short LLM intro and are streamed below it as is.
+
+    Attributes:
+        tools (Dict[str, Any]): Tool name -> LangChain tool, for the routable intents.
+        get_llm_client (Callable[[], LLMClient]): Returns the client used for formatting.
+    """
+
+    def __init__(self, tools: Dict[str, Any], get_llm_client: Callable[[], LLMClient]):
+        self.tools = tools
+        self.get_llm_client = get_llm_client
+        self.routed = 0
+        self.fallthrough = 0
+        self.routed_by_intent: Dict[str, int] = {}
+        self.routed_seconds = 0.0
+        self.agent_seconds = 0.0
+        self.agent_turns = 0
+        self._lock = threading.Lock()
+
+    def route(self, message: str) -> Optional[Dict[str, Any]]:
+        """Return the intent for `message` if it is routable (and counted), else None."""
+        intent = match_intent(message)
+        with self._lock:
+            if intent is None or intent["intent"] not in self.tools:
+                self.fallthrough += 1
+                return None
+            self.routed += 1
+            self.routed_by_intent[intent["intent"]] = self.routed_by_intent.get(intent["intent"], 0) + 1
+        return intent
+
+    def record_agent_turn(self, seconds: float) -> None:
+        """Record how long a fall-through turn took in the agent, to estimate savings."""
+        with self._lock:
+            self.agent_turns += 1
+            self.agent_seconds += seconds
+
+    async def astream(
+        self,
+        intent: Dict[str, Any],
+        message: str,
+        session_id: Optional[str] = None,
+        parent_span: Any = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Run `intent` (from `route`) and yield token / tool / final events. The tool call
+        and the formatting call are traced under `parent_span` (default: the current span).
+        """
+        span = tracing.start_span("IntentRouter.astream", parent_span, intent=intent["intent"])
+        try:
+            async for event in self._astream(intent, message, session_id, span):
+                yield event
+        except Exception as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
+
+    async def _astream(
+        self,
+        intent: Dict[str, Any],
+        message: str,
+        session_id: Optional[str],
+        span: Any,
+    ) -> AsyncIterator[dict]:
+        started_at = time.perf_counter()
+        first_token_at = None
+        tool_name, args = intent["intent"], intent["args"]
+
+        yield {"type": "tool_start", "tool": tool_name, "args": args}
+        token = CURRENT_SESSION_ID.set(session_id)
+        memo_token = CURRENT_TOOL_MEMO.set(memo_for_turn(session_id))
+        tool_started_at = time.perf_counter()
+        status = "error"
+        try:
+            with tracing.span(f"tool.{tool_name}", span, **{"tool.name": tool_name}):
+                result = await run_blocking(self.tools[tool_name].func, **args)
+            status = "error" if result.get("status") == "error" else "success"
+        finally:
+            CURRENT_TOOL_MEMO.reset(memo_token)
+            CURRENT_SESSION_ID.reset(token)
+            TOOL_DURATION.observe(time.perf_counter() - tool_started_at, tool=tool_name, status=status)
+        yield {"type": "tool_end", "tool": tool_name, "status": result.get("status", "success")}
+
+        rendered = result.get("rendered_markdown")
+        payload = "\n".join(
+            f"{k}: {v}" for k, v in result.items() if k not in ("action_prompt", "rendered_markdown")
+        )
+        messages = [
+            SystemMessage(content=result.get("action_prompt") or "Summarize the tool result for the user."),
+            HumanMessage(content=FORMAT_USER_PROMPT.format(message=message, payload=payload)),
+        ]
+
+        content = ""
+        usage: Dict[str, Any] = {}
+        llm_client = self.get_llm_client()
+        tokens = sum(estimate_message_tokens(m) for m in messages)
+        with tracing.span("llm.call", span) as llm_span:
+            async with llm_client.aadmit(tokens=tokens, session_id=session_id):
+                async for chunk in llm_client.client.astream(messages):
+                    text = chunk.content if isinstance(chunk.content, str) else "".join(
+                        part.get("text", "") for part in chunk.content if isinstance(part, dict)
+                    )
+                    if text:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        content += text
+                        yield {"type": "token", "text": text}
+                    if chunk.usage_metadata:
+                        usage = dict(chunk.usage_metadata)
+            llm_span.set_attributes(**{
+                "llm.input_tokens": usage.get("input_tokens"),
+                "llm.output_tokens": usage.get("output_tokens"),
+            })
+        record_turn_tokens("router", usage.get("input_tokens"), usage.get("output_tokens"))
+
+        if rendered:
+            content = f"{content.strip()}\n\n{rendered}" if content.strip() else rendered
+            yield {"type": "token", "text": f"\n\n{rendered}"}
+
+        total_time = time.perf_counter() - started_at
+        with self._lock:
+            self.routed_seconds += total_time
+
+        yield {
+            "type": "final",
+            "content": content.strip(),
+            "usage": usage,
+            "timings": {
+                "time_to_first_token": round(first_token_at - started_at, 3) if first_token_at else None,
+                "total_time": round(total_time, 3),
+            },
+            "routed_intent": tool_name,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit rate per intent and the estimated seconds saved: routed turns times
+        the difference between the average agent turn and the average routed turn.
+        """
+        with self._lock:
+            total = self.routed + self.fallthrough
+            avg_routed = self.routed_seconds / self.routed if self.routed else None
+            avg_agent = self.agent_seconds / self.agent_turns if self.agent_turns else None
+            saved = (
+                round(self.routed * (avg_agent - avg_routed), 3)
+                if avg_routed is not None and avg_agent is not None else None
+            )
+            return {
+                "routed": self.routed,
+                "fallthrough": self.fallthrough,
+                "hit_rate": (self.routed / total) if total else 0.0,
+                "routed_by_intent": dict(self.routed_by_intent),
+                "avg_routed_seconds": avg_routed,
+                "avg_agent_seconds": avg_agent,
+                "estimated_seconds_saved": saved,
+            }
@@ -0,0 +1,199 @@
+# render.py
+"""
+Local Markdown rendering of action results.
+
+The action prompts ask the LLM to turn result JSON into a numbered list of movie
+capsules (runtime, rating, release date / director and cast / abridged description /
+trailer URL). These renderers produce that layout directly, so for actions listed in
+LOCAL_RENDER_ACTIONS the LLM only writes a one-line conversational wrapper and the
+rendered block is shown to the user below it.
+"""
+from typing import Any, Dict, List, Optional
+
+from agent.config import LOCAL_RENDER_ACTIONS
+from agent.models import Movie, MovieList, TraktListActionResult
+
+# Action prompt used instead of the formatting prompt when the result is rendered locally
+WRAPPER_PROMPT = """
+You are a helpful movie information agent. The result of this action has already been
+formatted and will be shown to the user directly below your reply.
+
+Write one short, friendly sentence introducing it. Never repeat, list or reformat the
+movies, and never mention JSON, tools or formatting.
+"""
+
+# Descriptions in lists are abridged to roughly this many characters
+LIST_DESCRIPTION_CHARS = 240
+# Cast members shown per movie
+CAST_SIZE = 3
+
+
+def _abridge(text: str, max_chars: int) -> str:
+    """Cut `text` at the last sentence (or word) boundary within `max_chars`."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = cut.rfind(". ")
+    if sentence_end >= max_chars // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0].rstrip(",;:") + "…"
+
+
+def _capsule(movie: Movie) -> str:
+    """Inline metadata capsule: runtime · age rating · rating · release date."""
+    parts = []
+    if movie.runtime:
+        parts.append(f"{movie.runtime} min")
+    if movie.age_rating:
+        parts.append(movie.age_rating)
+    if movie.trakt_rating:
+        parts.append(f"★ {movie.trakt_rating:.1f}/10")
+    if movie.release_date:
+        parts.append(f"Released {movie.release_date}")
+    return " · ".join(parts)
+
+
+def _credits(movie: Movie) -> str:
+    """Director and lead cast on one line."""
+    parts = []
+    if movie.director:
+        parts.append(f"Directed by {movie.director}")
+    if movie.cast:
+        parts.append("Starring " + ", ".join(movie.cast[:CAST_SIZE]))
+    return " · ".join(parts)
+
+
+def _flavor(movie: Movie) -> str:
+    """Genres and country as a short lead-in to the description."""
+    genres = ", ".join(g.replace("-", " ") for g in (movie.genres or [])[:3])
+    country = movie.country.upper() if movie.country else ""
+    return " · ".join(p for p in (genres.capitalize(), country) if p)
+
+
+def _title_line(movie: Movie) -> str:
+    return f"**{movie.title}**" + (f" ({movie.year})" if movie.year else "")
+
+
+def render_movie(
+    movie: Movie,
+    description_chars: Optional[int] = None,
+    include_trailer: bool = True,
+) -> str:
+    """
+    Render a single movie as a capsule block (no list numbering).
+
+    Args:
+        movie: The movie to render.
+        description_chars: Abridge the description to about this many characters
+            (None keeps it whole).
+        include_trailer: End the block with the raw trailer URL, if there is one.
+    """
+    # Unresolved entries of a batch lookup
+    if movie.match_status == "no_match":
+        return f"{_title_line(movie)} — no movie with this title was found on Trakt."
+    if movie.match_status == "multiple_candidates":
+        return "\n".join([
+            f"{_title_line(movie)} — which one did you mean?",
+            *(f"- {candidate}" for candidate in movie.candidates or []),
+        ])
+
+    lines = [_title_line(movie)]
+    for line in (_capsule(movie), _credits(movie)):
+        if line:
+            lines.append(line)
+    if movie.tagline:
+        lines.append(f"_{movie.tagline}_")
+
+    description = movie.description or ""
+    if description and description_chars:
+        description = _abridge(description, description_chars)
+    flavor = _flavor(movie)
+    if description or flavor:
+        lines.append(f"{flavor} — {description}" if flavor and description else flavor or description)
+
+    if include_trailer and movie.trailer:
+        lines.append(movie.trailer)
+    return "\n".join(lines)
+
+
+def render_movie_details(movie: Movie) -> str:
+    """Render the full details of one movie, as the GetMovieDetails prompt describes."""
+    blocks = [render_movie(movie, include_trailer=False)]
+    comments = [" ".join(c.split()) for c in (movie.comments or []) if c and c.strip()]
+    if comments:
+        blocks.append("People say:\n" + "\n".join(f'> "{c}"' for c in comments))
+    if movie.trailer:
+        blocks.append(movie.trailer)
+    blocks.append("Want me to add it to your Trakt watchlist?")
+    return "\n\n".join(blocks)
+
+
+def render_movie_list(
+    movie_list: MovieList | List[Movie],
+    description_chars: Optional[int] = LIST_DESCRIPTION_CHARS,
+) -> str:
+    """Render movies as a numbered list of capsules, in the order given."""
+    movies = movie_list.movies if isinstance(movie_list, MovieList) else list(movie_list)
+    if not movies:
+        return "No movies found."
+
+    blocks = []
+    for i, movie in enumerate(movies, start=1):
+        first, *rest = render_movie(movie, description_chars=description_chars).split("\n")
+        blocks.append("\n".join([f"{i}. {first}", *(f"   {line}" for line in rest)]))
+    return "\n\n".join(blocks)
+
+
+def render_list_action_result(result: TraktListActionResult) -> str:
+    """Render the outcome of adding / removing movies on a Trakt list."""
+    list_name = result.target_list.replace("_", " ")
+    verb = "Removed from" if result.action_name.startswith("remove") else "Added to"
+    lines = []
+    if result.successfully_updated_titles:
+        titles = ", ".join(f"**{t}**" for t in result.successfully_updated_titles)
+        lines.append(f"{verb} your {list_name}: {titles}")
+    if result.non_updated_error_titles:
+        titles = ", ".join(f"**{t}**" for t in result.non_updated_error_titles)
+        lines.append(f"Couldn't update your {list_name}: {titles}")
+    if not lines:
+        lines.append(result.message)
+    return "\n\n".join(lines)
+
+
+def render_model_instance(model_instance: Any) -> Optional[str]:
+    """Render any supported result model, or None if it has no local renderer."""
+    if isinstance(model_instance, Movie):
+        return render_movie_details(model_instance)
+    if isinstance(model_instance, (MovieList, list)):
+        return render_movie_list(model_instance)
+    if isinstance(model_instance, TraktListActionResult):
+        return render_list_action_result(model_instance)
+    return None
+
+
+def render_locally(
+    tool_result: Dict[str, Any],
+    model_instance: Any,
+    actions: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Render `model_instance` locally if the tool result's action is selected for it.
+
+    Adds the Markdown as "rendered_markdown" (moved out of the LLM's view by the agent
+    middleware and shown to the user below the reply) and swaps the formatting prompt for
+    WRAPPER_PROMPT. Results of other actions, or that cannot be rendered, are returned as is.
+
+    Args:
+        tool_result: The tool's response dict (with "action_name" and "action_prompt").
+        model_instance: The result model the action returned.
+        actions: Action names rendered locally (defaults to LOCAL_RENDER_ACTIONS).
+    """
+    selected = LOCAL_RENDER_ACTIONS if actions is None else actions
+    if tool_result.get("action_name") not in selected or tool_result.get("status") == "error":
+        return tool_result
+
+    rendered = render_model_instance(model_instance)
+    if rendered is None:
+        return tool_result
+    return {**tool_result, "action_prompt": WRAPPER_PROMPT, "rendered_markdown": rendered}
@@ -2,9 +2,11 @@ import requests
 from typing import Any, Optional, Set, List, Tuple, Dict
 
 from agent.models import Movie, MovieList
+from agent.utils.tracing import traced
 
 BASE = "https://api.trakt.tv"
 
+@traced("map_trakt_to_movie")
 def map_trakt_to_movie(
     core_data: dict,
     people_data: Optional[dict] = None,
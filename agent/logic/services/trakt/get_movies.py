@@ -1,12 +1,27 @@
 import difflib
+import logging
 import random
-import requests
+import threading
 from typing import Optional, Set, List, Tuple, Dict,Literal
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from agent.models import Movie, MovieList
-from agent.config import TRAKT_CLIENT_ID, TRAKT_CLIENT_SECRET
+from agent.config import (
+    TRAKT_CLIENT_ID,
+    TRAKT_CLIENT_SECRET,
+    TOP_LIST_SOFT_TTL_SECONDS,
+    TOP_LIST_REFRESH_INTERVAL_SECONDS,
+    MOVIE_CACHE_TTL_SECONDS,
+    MOVIE_CACHE_MAX_ENTRIES,
+    BATCH_DETAILS_MAX_WORKERS,
+)
 from agent.logic.services.trakt.filtering import *
+from agent.logic.services.trakt.session import TRAKT_SESSION
+from agent.utils.cache import StaleWhileRevalidateCache, TTLCache
+from agent.utils.metrics import register_cache
+from agent.utils.tracing import bind_span
+
+logger = logging.getLogger(__name__)
 
 # TRAKT_URL settings for all Trakt API calls
 TRAKT_URL = "https://api.trakt.tv"
@@ -16,6 +31,71 @@ HEADERS = {
     "trakt-api-version": "2"
 }
 
+# Caches for raw Trakt data that rarely changes. Exported/imported as one snapshot
+# by agent.logic.services.trakt.snapshot so new replicas start warm.
+MOVIE_METADATA_CACHE = TTLCache(max_entries=MOVIE_CACHE_MAX_ENTRIES, ttl_seconds=MOVIE_CACHE_TTL_SECONDS)
+MOVIE_PEOPLE_CACHE = TTLCache(max_entries=MOVIE_CACHE_MAX_ENTRIES, ttl_seconds=MOVIE_CACHE_TTL_SECONDS)
+# (normalized title, year) -> raw /search/movie results
+TITLE_INDEX_CACHE = TTLCache(max_entries=MOVIE_CACHE_MAX_ENTRIES, ttl_seconds=MOVIE_CACHE_TTL_SECONDS)
+register_cache("movie_metadata", MOVIE_METADATA_CACHE.stats)
+register_cache("movie_people", MOVIE_PEOPLE_CACHE.stats)
+register_cache("title_index", TITLE_INDEX_CACHE.stats)
+
+
+def fetch_movie_core(trakt_id: int) -> Optional[dict]:
+    """
+    Fetch the raw `extended=full` movie payload for `trakt_id` (cached).
+
+    Returns:
+        Optional[dict]: Raw Trakt movie data, or None if Trakt has no such movie.
+    """
+    core_data = MOVIE_METADATA_CACHE.get(trakt_id)
+    if core_data is not None:
+        return core_data
+
+    core_resp = TRAKT_SESSION.get(
+        f"{TRAKT_URL}/movies/{trakt_id}",
+        headers=HEADERS,
+        params={"type": "movie", "extended": "full"}
+    )
+    if core_resp.status_code == 404:
+        return None
+
+    core_resp.raise_for_status()
+    core_data = core_resp.json()
+    MOVIE_METADATA_CACHE.set(trakt_id, core_data)
+    return core_data
+
+
+def fetch_movie_people(trakt_id: int) -> dict:
+    """
+    Fetch the raw cast & crew payload for `trakt_id` (cached).
+    """
+    people_data = MOVIE_PEOPLE_CACHE.get(trakt_id)
+    if people_data is not None:
+        return people_data
+
+    people_resp = TRAKT_SESSION.get(f"{TRAKT_URL}/movies/{trakt_id}/people", headers=HEADERS)
+    people_resp.raise_for_status()
+    people_data = people_resp.json()
+    MOVIE_PEOPLE_CACHE.set(trakt_id, people_data)
+    return people_data
+
+
+def fetch_movie_related(trakt_id: int) -> list:
+    """
+    Fetch the raw list of movies related to `trakt_id`.
+    """
+    related_resp = TRAKT_SESSION.get(f"{TRAKT_URL}/movies/{trakt_id}/related", headers=HEADERS)
+    related_resp.raise_for_status()
+    return related_resp.json()
+
+
+def title_index_key(title: str, year: Optional[int] = None) -> Tuple[str, Optional[int]]:
+    """Normalize a title search into its TITLE_INDEX_CACHE key."""
+    return (" ".join(title.lower().split()), year)
+
+
 def query_trakt_movie(
     trakt_id: int = None,
     title: str = None,
@@ -57,24 +137,17 @@ def query_trakt_movie(
         include_specific_fields = set()
 
     # Step 1: Fetch core movie data
-    core_resp = requests.get(
-        f"{TRAKT_URL}/movies/{trakt_id}",
-        headers=HEADERS,
-        params={"type": "movie", "extended": "full"}
-    )
-    if core_resp.status_code == 404:
+    core_data = fetch_movie_core(trakt_id)
+    if core_data is None:
         return {"status": "no_match", "movie": None, "potential_matches": MovieList(), "match_score": 0.0}
 
-    core_resp.raise_for_status()
-    core_data = core_resp.json()
-
     # Step 2: Fetch related info in parallel
     tasks = {
-        "people": (f"{TRAKT_URL}/movies/{trakt_id}/people", {}),
+        "people": (fetch_movie_people, trakt_id),
     }
     
     if "related" in include_specific_fields:
-        tasks["related"] = (f"{TRAKT_URL}/movies/{trakt_id}/related", {}),
+        tasks["related"] = (fetch_movie_related, trakt_id)
     
     # if "comments" in include_specific_fields:
     #     tasks["comments"] = (
@@ -85,14 +158,11 @@ def query_trakt_movie(
     results = {}
     with ThreadPoolExecutor(max_workers=3) as executor:
         futures = {
-            executor.submit(requests.get, url, headers=HEADERS, **params): name
-            for name, (url, params) in tasks.items()
+            executor.submit(bind_span(fetch_func), movie_id): name
+            for name, (fetch_func, movie_id) in tasks.items()
         }
         for future in as_completed(futures):
-            key = futures[future]
-            response = future.result()
-            response.raise_for_status()
-            results[key] = response.json()
+            results[futures[future]] = future.result()
             
     # # Trim down number of comments
     # if "comments" in results:
@@ -122,6 +192,39 @@ def query_trakt_movie(
         "match_score": 1.0
     }
 
+def query_trakt_movies(
+    queries: List[Dict[str, object]],
+    max_workers: int = BATCH_DETAILS_MAX_WORKERS,
+) -> List[dict]:
+    """
+    Run `query_trakt_movie` for several movies concurrently.
+
+    Args:
+        queries: One {"title", "year", "trakt_id"} dict per movie (missing keys allowed).
+        max_workers: Most lookups in flight at once.
+
+    Returns:
+        List[dict]: One `query_trakt_movie` result per query, in the order given. A lookup
+            that raised is reported as "no_match" instead of failing the batch.
+    """
+    if not queries:
+        return []
+
+    def lookup(query: Dict[str, object]) -> dict:
+        try:
+            return query_trakt_movie(
+                trakt_id=query.get("trakt_id"),
+                title=query.get("title"),
+                year=query.get("year"),
+            )
+        except Exception:
+            logger.exception("Error looking up %s", query)
+            return {"status": "no_match", "movie": None, "potential_matches": MovieList(), "match_score": 0.0}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as executor:
+        return list(executor.map(bind_span(lookup), queries))
+
+
 def search_trakt_movie(
     title: str,
     year: int = None,
@@ -147,13 +250,17 @@ def search_trakt_movie(
     # if networks:
     #     params["countries"] = ",".join(networks)
         
-    search_resp = requests.get(
-        f"{TRAKT_URL}/search/movie",
-        headers=HEADERS,
-        params=params,
-    )
-    search_resp.raise_for_status()
-    results = search_resp.json()
+    cache_key = title_index_key(title, year)
+    results = TITLE_INDEX_CACHE.get(cache_key)
+    if results is None:
+        search_resp = TRAKT_SESSION.get(
+            f"{TRAKT_URL}/search/movie",
+            headers=HEADERS,
+            params=params,
+        )
+        search_resp.raise_for_status()
+        results = search_resp.json()
+        TITLE_INDEX_CACHE.set(cache_key, results)
     
     print("search results is", results, "\n------")
 
@@ -227,51 +334,60 @@ def search_trakt_movie(
     }
 
 
-def query_top_trakt_movies(
-    num: int = 3,
-    list_type: Literal[
-        "trending",
-        "popular",
-        "anticipated",
-        "watched",
-        "boxoffice",
-    ] = "trending",
-) -> MovieList:
-    """
-    Fetch a list of top movies from Trakt API and map them to MovieList.
+# Trakt endpoints for each "top" movie list
+TOP_LIST_ENDPOINTS = {
+    "trending": "movies/trending",
+    "popular": "movies/popular",
+    "anticipated": "movies/anticipated",
+    "watched": "movies/watched/weekly",
+    "boxoffice": "movies/boxoffice",
+}
+TOP_LIST_MAX_MOVIES = 10
+# `num` values mapped ahead of time whenever a top list is (re)loaded
+TOP_LIST_PREMAPPED_NUMS = (3, 5, 10)
 
-    Args:
-        num: Number of movies to fetch (max 10).
-        list_type: Type of movie list to fetch (trending, popular, etc.).
 
-    Returns:
-        MovieList: A Pydantic MovieList model containing a list of Movies.
+def _fetch_top_list_entries(list_type: str) -> List[Tuple[dict, dict]]:
     """
-    num = min(num, 10)
-
-    endpoint_map = {
-        "trending": "movies/trending",
-        "popular": "movies/popular",
-        "anticipated": "movies/anticipated",
-        "watched": "movies/watched/weekly",
-        "boxoffice": "movies/boxoffice",
-    }
+    Fetch the raw Trakt data for one top list: the first `TOP_LIST_MAX_MOVIES` movies
+    plus the people (credits) payload for each of them.
 
-    endpoint = endpoint_map[list_type]
-    response = requests.get(f"{TRAKT_URL}/{endpoint}?extended=full", headers=HEADERS)
+    Returns:
+        List[Tuple[dict, dict]]: (movie_data, credits) pairs in list order.
+    """
+    endpoint = TOP_LIST_ENDPOINTS[list_type]
+    response = TRAKT_SESSION.get(f"{TRAKT_URL}/{endpoint}?extended=full", headers=HEADERS)
     response.raise_for_status()
 
+    movie_datas = [entry.get("movie", entry) for entry in response.json()[:TOP_LIST_MAX_MOVIES]]
+
+    # List entries carry the same `extended=full` payload as /movies/{id}
+    for movie_data in movie_datas:
+        MOVIE_METADATA_CACHE.set(movie_data["ids"]["trakt"], movie_data)
+
+    # Fetch cast & director info for every movie in parallel
+    credits_by_id = {}
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = {
+            executor.submit(bind_span(fetch_movie_people), movie_data["ids"]["trakt"]): movie_data["ids"]["trakt"]
+            for movie_data in movie_datas
+        }
+        for future in as_completed(futures):
+            credits_by_id[futures[future]] = future.result()
+
+    return [(movie_data, credits_by_id[movie_data["ids"]["trakt"]]) for movie_data in movie_datas]
+
+
+def _map_top_list_entries(entries: List[Tuple[dict, dict]], num: int) -> MovieList:
+    """
+    Map the first `num` raw top-list entries to a MovieList.
+    """
     movies: List[Movie] = []
 
     # Reduced info if fetching many movies (e.g. >=8)
     reduced = num >= 8
 
-    for entry in response.json()[:num]:
-        movie_data = entry.get("movie", entry)
-        
-        print("-----------movie_data is---------------")
-        print(movie_data)
-
+    for movie_data, credits in entries[:num]:
         # Map only core fields + trakt_rating
         mapped = map_trakt_to_movie(
             core_data=movie_data,
@@ -298,18 +414,6 @@ def query_top_trakt_movies(
                 "trakt_votes",
             }
         )
-        
-        print("--------------------mapped is-------------------")
-        print(mapped)
-        print("\n\n\n\n")
-        
-
-        # Fetch cast & director info separately for each movie
-        credits_resp = requests.get(
-            f"{TRAKT_URL}/movies/{movie_data['ids']['trakt']}/people", headers=HEADERS
-        )
-        credits_resp.raise_for_status()
-        credits = credits_resp.json()
 
         # Use a helper for top cast (3 or 5 depending on reduced)
         top_cast_count = 3 if reduced else 5
@@ -332,6 +436,87 @@ def query_top_trakt_movies(
     return MovieList(movies=movies)
 
 
+def _load_top_list(list_type: str) -> dict:
+    """
+    Loader for TOP_LIST_CACHE. Fetches a top list once and keeps the raw entries plus
+    ready-made MovieList variants for the common `num` values.
+    """
+    entries = _fetch_top_list_entries(list_type)
+    return {
+        "entries": entries,
+        "variants": {num: _map_top_list_entries(entries, num) for num in TOP_LIST_PREMAPPED_NUMS},
+    }
+
+
+# Top lists change slowly, so serve them from memory and refresh in the background
+TOP_LIST_CACHE = StaleWhileRevalidateCache(
+    loader=_load_top_list,
+    soft_ttl_seconds=TOP_LIST_SOFT_TTL_SECONDS,
+)
+register_cache("top_lists", TOP_LIST_CACHE.stats)
+
+
+def query_top_trakt_movies(
+    num: int = 3,
+    list_type: Literal[
+        "trending",
+        "popular",
+        "anticipated",
+        "watched",
+        "boxoffice",
+    ] = "trending",
+) -> MovieList:
+    """
+    Fetch a list of top movies from Trakt API and map them to MovieList.
+
+    Lists are served from TOP_LIST_CACHE: the first call per `list_type` hits Trakt,
+    later calls return the cached copy instantly and trigger a background refresh once
+    it is older than TOP_LIST_SOFT_TTL_SECONDS.
+
+    Args:
+        num: Number of movies to fetch (max 10).
+        list_type: Type of movie list to fetch (trending, popular, etc.).
+
+    Returns:
+        MovieList: A Pydantic MovieList model containing a list of Movies.
+    """
+    num = min(num, TOP_LIST_MAX_MOVIES)
+
+    if list_type not in TOP_LIST_ENDPOINTS:
+        raise KeyError(list_type)
+
+    cached = TOP_LIST_CACHE.get(list_type)
+    movie_list = cached["variants"].get(num) or _map_top_list_entries(cached["entries"], num)
+
+    # Hand out a copy so callers can never mutate the cached lists
+    return movie_list.model_copy(deep=True)
+
+
+def start_top_list_refresher(
+    interval_seconds: float = TOP_LIST_REFRESH_INTERVAL_SECONDS,
+) -> Optional[threading.Event]:
+    """
+    Start a daemon thread that keeps every list in TOP_LIST_ENDPOINTS warm by
+    refreshing each one every `interval_seconds`.
+
+    Returns:
+        Optional[threading.Event]: Set it to stop the refresher. None if `interval_seconds`
+            is 0 (refresher disabled).
+    """
+    if not interval_seconds:
+        return None
+
+    stop_event = threading.Event()
+
+    def refresh_loop():
+        while not stop_event.is_set():
+            TOP_LIST_CACHE.prime(TOP_LIST_ENDPOINTS)
+            stop_event.wait(interval_seconds)
+
+    threading.Thread(target=refresh_loop, name="top-list-refresher", daemon=True).start()
+    return stop_event
+
+
 def query_related_movies(
     num: int = 3,
     limit: int = 10,
@@ -384,7 +569,7 @@ def query_related_movies(
             }
 
     # --- Fetch related movies from Trakt API ---
-    related_resp = requests.get(
+    related_resp = TRAKT_SESSION.get(
         f"{TRAKT_URL}/movies/{trakt_id}/related",
         headers=HEADERS,
         params={"limit": num},
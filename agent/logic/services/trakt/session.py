@@ -0,0 +1,78 @@
+# session.py
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from agent.config import TRAKT_URL
+from agent.utils import tracing
+from agent.utils.metrics import TRAKT_REQUEST_DURATION
+
+# Max keep-alive connections held open to api.trakt.tv
+TRAKT_POOL_SIZE = 10
+
+# Path segments that identify one record (numeric ids, slugs with a year, ...)
+_ID_SEGMENT = re.compile(r"^(\d+|[a-z0-9]+(-[a-z0-9]+)*-\d{4}|tt\d+)$")
+
+
+def trakt_endpoint(url: str) -> str:
+    """
+    The endpoint template of a Trakt URL, without host, query string or ids, e.g.
+    ".../movies/1234/people?x=1" -> "/movies/{id}/people". Used to group requests.
+    """
+    segments = [s for s in urlsplit(url).path.split("/") if s]
+    return "/" + "/".join("{id}" if _ID_SEGMENT.match(s) else s for s in segments)
+
+
+class TraktSession(requests.Session):
+    """
+    requests.Session shared by every Trakt call so TLS connections are pooled and
+    reused instead of re-negotiated per request.
+    """
+
+    def __init__(self, pool_size: int = TRAKT_POOL_SIZE):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        """
+        Send the request, timed into TRAKT_REQUEST_DURATION by endpoint template, and in a
+        span of the current turn's trace when it is recorded.
+        """
+        method = method.upper()
+        endpoint = trakt_endpoint(url)
+        started_at = time.perf_counter()
+        status = "error"
+        try:
+            with tracing.span(f"{method} {endpoint}", **{"http.method": method, "http.route": endpoint}) as span:
+                response = super().request(method, url, *args, **kwargs)
+                span.set_attribute("http.status_code", response.status_code)
+            status = str(response.status_code)
+            return response
+        finally:
+            TRAKT_REQUEST_DURATION.observe(
+                time.perf_counter() - started_at, method=method, endpoint=endpoint, status=status
+            )
+
+
+TRAKT_SESSION = TraktSession()
+
+
+def warm_trakt_connections(num_connections: int = 3) -> int:
+    """
+    Open `num_connections` pooled connections to Trakt ahead of the first real request.
+
+    Returns:
+        int: Number of connections that were opened successfully.
+    """
+    def open_connection(_):
+        TRAKT_SESSION.head(TRAKT_URL, timeout=10)
+
+    with ThreadPoolExecutor(max_workers=num_connections) as executor:
+        list(executor.map(open_connection, range(num_connections)))
+    return num_connections
@@ -0,0 +1,174 @@
+# snapshot.py
+"""
+Export / import the Trakt metadata caches as one versioned snapshot file.
+
+A snapshot lets a fresh replica start with every movie, people payload and title search
+that another node already resolved, instead of rebuilding them from Trakt.
+
+Usage:
+    python -m agent.logic.services.trakt.snapshot export cache_snapshot.json --top-lists --title "Inception"
+    python -m agent.logic.services.trakt.snapshot load cache_snapshot.json
+"""
+import argparse
+import json
+import mmap
+import os
+import time
+import warnings
+from typing import Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # Optional: faster, zero-copy parsing of memory-mapped snapshots
+    orjson = None
+
+from agent.logic.services.trakt.get_movies import (
+    MOVIE_METADATA_CACHE,
+    MOVIE_PEOPLE_CACHE,
+    TITLE_INDEX_CACHE,
+    TOP_LIST_CACHE,
+    TOP_LIST_ENDPOINTS,
+    search_trakt_movie,
+)
+
+SNAPSHOT_FORMAT = "movie-agent-cache-snapshot"
+SNAPSHOT_VERSION = 1
+# Snapshots older than this are ignored on load
+SNAPSHOT_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+SNAPSHOT_CACHES = {
+    "metadata": MOVIE_METADATA_CACHE,
+    "people": MOVIE_PEOPLE_CACHE,
+    "title_index": TITLE_INDEX_CACHE,
+}
+
+
+def export_cache_snapshot(path: str) -> Dict[str, int]:
+    """
+    Write the current contents of every cache in SNAPSHOT_CACHES to `path`.
+
+    The file is written to a temporary path first and moved into place, so a reader
+    never sees a half-written snapshot.
+
+    Returns:
+        Dict[str, int]: Number of entries exported per cache.
+    """
+    caches = {
+        # JSON has no tuples, so composite keys (title index) are stored as lists
+        name: [[list(key) if isinstance(key, tuple) else key, value] for key, value in cache.items()]
+        for name, cache in SNAPSHOT_CACHES.items()
+    }
+    payload = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.time(),
+        "caches": caches,
+    }
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        if orjson is not None:
+            f.write(orjson.dumps(payload))
+        else:
+            f.write(json.dumps(payload).encode("utf-8"))
+    os.replace(tmp_path, path)
+
+    return {name: len(entries) for name, entries in caches.items()}
+
+
+def _read_snapshot(path: str) -> dict:
+    """
+    Parse a snapshot file, memory-mapping it where possible so large snapshots are
+    decoded straight from the page cache instead of being copied into a buffer first.
+    """
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files (and some filesystems) cannot be memory-mapped
+            return json.loads(f.read() or b"{}")
+        with mapped:
+            if orjson is not None:
+                with memoryview(mapped) as view:
+                    return orjson.loads(view)
+            return json.loads(mapped[:])
+
+
+def load_cache_snapshot(
+    path: str,
+    max_age_seconds: Optional[float] = SNAPSHOT_MAX_AGE_SECONDS,
+) -> Dict[str, int]:
+    """
+    Load a snapshot written by `export_cache_snapshot` into the live caches.
+
+    Snapshots that cannot be read or parsed, have an unknown format/version, or are
+    older than `max_age_seconds` are skipped with a warning rather than raising, so a
+    bad file never blocks startup.
+
+    Returns:
+        Dict[str, int]: Number of entries loaded per cache (empty if skipped).
+    """
+    try:
+        payload = _read_snapshot(path)
+    except (OSError, ValueError) as e:
+        # orjson.JSONDecodeError and json.JSONDecodeError are both ValueErrors
+        warnings.warn(f"Ignoring cache snapshot `{path}`: could not read it ({e})", category=UserWarning)
+        return {}
+    if not isinstance(payload, dict):
+        payload = {}
+
+    if payload.get("format") != SNAPSHOT_FORMAT or payload.get("version") != SNAPSHOT_VERSION:
+        warnings.warn(
+            f"Ignoring cache snapshot `{path}`: expected {SNAPSHOT_FORMAT} v{SNAPSHOT_VERSION}, "
+            f"got {payload.get('format')} v{payload.get('version')}",
+            category=UserWarning,
+        )
+        return {}
+
+    age = time.time() - payload.get("created_at", 0)
+    if max_age_seconds is not None and age > max_age_seconds:
+        warnings.warn(
+            f"Ignoring cache snapshot `{path}`: it is {int(age)}s old (max {int(max_age_seconds)}s)",
+            category=UserWarning,
+        )
+        return {}
+
+    loaded = {}
+    for name, cache in SNAPSHOT_CACHES.items():
+        entries: List[list] = payload["caches"].get(name, [])
+        for key, value in entries:
+            cache.set(tuple(key) if isinstance(key, list) else key, value)
+        loaded[name] = len(entries)
+    return loaded
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export or load the Trakt cache snapshot.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Warm the caches and write a snapshot.")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--load-existing", help="Snapshot to start from before warming.")
+    export_parser.add_argument("--top-lists", action="store_true", help="Prefetch every top list.")
+    export_parser.add_argument("--title", action="append", default=[], help="Title to resolve (repeatable).")
+
+    load_parser = subparsers.add_parser("load", help="Load a snapshot and report what it holds.")
+    load_parser.add_argument("path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        if args.load_existing:
+            load_cache_snapshot(args.load_existing, max_age_seconds=None)
+        if args.top_lists:
+            for list_type in TOP_LIST_ENDPOINTS:
+                TOP_LIST_CACHE.get(list_type)
+        for title in args.title:
+            search_trakt_movie(title=title)
+        print(f"Exported {export_cache_snapshot(args.path)} to {args.path}")
+    else:
+        print(f"Loaded {load_cache_snapshot(args.path, max_age_seconds=None)} from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import httpx
 import webbrowser
-import requests
 from typing import Optional, Set, List, Tuple, Dict,Literal
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -9,10 +8,14 @@ from agent.config import (
     TRAKT_URL,
     TRAKT_CLIENT_ID,
     TRAKT_ACCESS_TOKEN,
-    TRAKT_CLIENT_SECRET
+    TRAKT_CLIENT_SECRET,
+    USER_LIST_CACHE_TTL_SECONDS,
 )
 from agent.logic.services.trakt.filtering import *
 from agent.logic.services.trakt.get_movies import query_trakt_movie
+from agent.logic.services.trakt.session import TRAKT_SESSION
+from agent.utils.cache import TTLCache
+from agent.utils.metrics import register_cache
 
 # Settings for Trakt API calls
 TRAKT_URL = "https://api.trakt.tv"
@@ -23,6 +26,11 @@ HEADERS = {
     "trakt-api-version": "2"
 }
 
+# A title search must match at least this well before a list is written to; weaker
+# hits are reported back for the user to confirm instead of being added or removed
+WRITE_MATCH_MIN_SCORE = 0.8
+
+
 def update_trakt_list(
     movies: List[Dict] = None,  # [{"title": "...", "trakt_id": ..., "rating": ..., "comment": ...}]
     title: str = None,
@@ -65,6 +73,15 @@ def update_trakt_list(
                 per_movie_messages.append(f"Could not find '{title or 'Unknown title'}' on Trakt.")
                 continue
 
+            if queried_movie['status'] == "match" and queried_movie.get('match_score', 0) < WRITE_MATCH_MIN_SCORE:
+                best = queried_movie['movie']
+                failed_titles.append(title)
+                per_movie_messages.append(
+                    f"Not sure '{title}' means '{best.title}' ({best.year}), so nothing was changed. "
+                    f"Ask the user to confirm the movie."
+                )
+                continue
+
             if queried_movie['status'] == "match":
                 trakt_id = queried_movie['movie'].trakt_id
                 movie["title"] = queried_movie['movie'].title
@@ -89,7 +106,7 @@ def update_trakt_list(
             action_success=False,
             successfully_updated_titles=[],
             non_updated_error_titles=failed_titles,
-            message=f"No valid movies could be found with the provided title."
+            message=" ".join(per_movie_messages) or "No valid movies could be found with the provided title."
         )
 
     # --- POST to Trakt API
@@ -98,10 +115,13 @@ def update_trakt_list(
         if mode == "add"
         else f"{TRAKT_URL}/sync/{target_list}/remove"
     )
-    post_resp = requests.post(endpoint, headers=HEADERS, json={"movies": trakt_movies_payload})
+    post_resp = TRAKT_SESSION.post(endpoint, headers=HEADERS, json={"movies": trakt_movies_payload})
     post_resp.raise_for_status()
     resp_json = post_resp.json()
 
+    # The list changed, so any mirrored copy of it is out of date
+    invalidate_user_list_cache(target_list)
+
     action_key = "added" if mode == "add" else "deleted"
     # --- Check only movies, in priority order ---
     action_key = "added" if mode == "add" else "deleted"
@@ -144,6 +164,74 @@ def update_trakt_list(
     )
     
 
+# Trakt endpoints for each user list
+USER_LIST_ENDPOINTS = {
+    "watchlist": "sync/watchlist/movies",
+    "collection": "sync/collection/movies",
+    "ratings": "sync/ratings/movies",
+    "history": "sync/history/movies",
+    "comments": "users/me/comments/movies"
+}
+
+# Raw user list pages keyed by (list_type, limit, page). Cleared for a list whenever
+# update_trakt_list writes to it so reads never show a stale watchlist for long.
+USER_LIST_CACHE = TTLCache(max_entries=64, ttl_seconds=USER_LIST_CACHE_TTL_SECONDS)
+register_cache("user_lists", USER_LIST_CACHE.stats)
+
+
+def fetch_user_list_page(
+    list_type: Literal["watchlist", "collection", "ratings", "history", "comments"] = "watchlist",
+    limit: int = 10,
+    page: int = 1,
+) -> list:
+    """
+    Fetch one raw page of a user's Trakt list (`extended=full`), served from
+    USER_LIST_CACHE when a fresh copy is held.
+
+    Returns:
+        list: Raw Trakt list entries.
+    """
+    cache_key = (list_type, limit, page)
+    data = USER_LIST_CACHE.get(cache_key)
+    if data is not None:
+        return data
+
+    endpoint = USER_LIST_ENDPOINTS[list_type]
+    response = TRAKT_SESSION.get(
+        f"{BASE}/{endpoint}?extended=full&limit={limit}&page={page}", 
+        headers=HEADERS
+    )
+    response.raise_for_status()
+    data = response.json()
+
+    USER_LIST_CACHE.set(cache_key, data)
+    return data
+
+
+def invalidate_user_list_cache(list_type: str) -> None:
+    """Drop every cached page of `list_type` from USER_LIST_CACHE."""
+    for cache_key, _ in USER_LIST_CACHE.items():
+        if cache_key[0] == list_type:
+            USER_LIST_CACHE.pop(cache_key)
+
+
+def mirror_user_list(
+    list_type: Literal["watchlist", "collection", "ratings", "history", "comments"] = "watchlist",
+    limit: int = 10,
+    pages: int = 1,
+) -> int:
+    """
+    Pull the first `pages` pages of the configured account's list into USER_LIST_CACHE.
+
+    Returns:
+        int: Number of movies mirrored.
+    """
+    return sum(
+        len(fetch_user_list_page(list_type=list_type, limit=limit, page=page))
+        for page in range(1, pages + 1)
+    )
+
+
 def query_user_trakt_list(
     list_type: Literal["watchlist", "collection", "ratings", "history", "comments"] = "watchlist",
     limit: int = 10,
@@ -187,22 +275,7 @@ def query_user_trakt_list(
     """
     limit = min(limit, 100)  # API limit safeguard
 
-    # --- Determine endpoint
-    endpoint_map = {
-        "watchlist": "sync/watchlist/movies",
-        "collection": "sync/collection/movies",
-        "ratings": "sync/ratings/movies",
-        "history": "sync/history/movies",
-        "comments": "users/me/comments/movies"
-    }
-
-    endpoint = endpoint_map[list_type]    
-    response = requests.get(
-        f"{BASE}/{endpoint}?extended=full&limit={limit}&page={page}", 
-        headers=HEADERS
-    )
-    response.raise_for_status()
-    data = response.json()
+    data = fetch_user_list_page(list_type=list_type, limit=limit, page=page)
     
     # --- Apply filters
     def raw_matches_filters(entry: dict) -> bool:
@@ -314,7 +387,7 @@ def query_user_trakt_list(
         # Add cast if list is short enough
         if len(filtered_data) < 5:
             # Fetch cast & director info separately for each movie
-            credits_resp = requests.get(
+            credits_resp = TRAKT_SESSION.get(
                 f"{BASE}/movies/{movie_data['ids']['trakt']}/people", headers=HEADERS
             )
             credits_resp.raise_for_status()
@@ -0,0 +1,124 @@
+# tool_selector.py
+"""
+Per-turn tool selection. Every tool schema bound to the model is paid for in input
+tokens on every call, so each turn offers the agent only the tools the user message
+(and the previous reply) make relevant, e.g. no watchlist tools on a browsing turn.
+When a message is doubtful the agent gets every tool: an extra schema costs less than a
+turn whose tools cannot do what the user asked.
+"""
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from agent.utils.session_store import CONVERSATION_STORE, ConversationStore
+
+# Offered on every turn: answers most questions about a specific movie
+ALWAYS_OFFERED = ("get_movie_details",)
+
+# Tool name -> pattern in the user message that makes it relevant
+TOOL_PATTERNS: Dict[str, re.Pattern] = {
+    # Recommendations without a movie to start from are answered from the top lists
+    "get_trending": re.compile(
+        r"\b(trending|popular|top \d*|hot|right now|this week|new releases?|latest"
+        r"|recommend\w*|suggest\w*|what (?:should|to) (?:i )?watch|good (?:movie|film)s?)\b",
+        re.IGNORECASE,
+    ),
+    "get_similar_movies": re.compile(
+        r"\b(similar|like|related|recommend\w*|suggest\w*|more movies|something else)\b", re.IGNORECASE
+    ),
+    "get_multiple_movie_details": re.compile(
+        r"\b(compare|comparison|vs|versus|between|both|each of)\b|,|\band\b", re.IGNORECASE
+    ),
+    "get_user_list": re.compile(r"\b(watch ?list|my list|saved|to watch)\b", re.IGNORECASE),
+    "update_watchlist": re.compile(
+        r"\b(add|remove|delete|save|put|drop|take .+ off|get rid of|cross .+ off|bookmark|unsave)\b",
+        re.IGNORECASE,
+    ),
+}
+
+WATCHLIST_MENTION = TOOL_PATTERNS["get_user_list"]
+# Wording that moves a movie onto or off the watchlist ("... off my watchlist")
+WATCHLIST_CHANGE = re.compile(
+    r"\b(?:to|onto|into|from|off|off of|out of) (?:my|the) (?:watch ?list|list)\b", re.IGNORECASE
+)
+# Wording that only reads the watchlist
+WATCHLIST_READ = re.compile(
+    r"\b(show|list|see|view|display|open|check|read|what(?:'s| is| are)|how many|anything|more|page|next)\b",
+    re.IGNORECASE,
+)
+
+# Offered when nothing specific matched: every tool that does not change user data
+BROWSING_TOOLS = (
+    "get_trending",
+    "get_movie_details",
+    "get_multiple_movie_details",
+    "get_similar_movies",
+    "get_user_list",
+)
+
+# A short agreement to the previous reply's offer ("Want me to add it to your watchlist?")
+AFFIRMATIVE = re.compile(
+    r"^\s*(yes|yeah|yep|sure|ok|okay|please|do it|go ahead|sounds good)\b", re.IGNORECASE
+)
+WATCHLIST_OFFER = re.compile(r"watch ?list", re.IGNORECASE)
+
+
+class ToolSelector:
+    """
+    Chooses the tool names offered to the agent for one turn.
+
+    - Tools whose TOOL_PATTERNS match the message are offered, plus ALWAYS_OFFERED.
+    - A watchlist mention with add / remove wording also offers update_watchlist.
+    - A watchlist mention that reads as neither a read nor a change is doubtful, and
+      every tool is offered.
+    - If no pattern matches, all BROWSING_TOOLS are offered (never write tools).
+    - A short "yes" to a reply that offered a watchlist change also offers the
+      watchlist tools.
+
+    Attributes:
+        tool_names (Sequence[str]): Every tool the agent has; selections keep this order.
+        store (ConversationStore): Where the previous reply is read from.
+    """
+
+    def __init__(self, tool_names: Sequence[str], store: ConversationStore = CONVERSATION_STORE):
+        self.tool_names = list(tool_names)
+        self.store = store
+        self.turns = 0
+        self.offered_by_tool: Dict[str, int] = {name: 0 for name in self.tool_names}
+        self._lock = threading.Lock()
+
+    def _previous_reply(self, session_id: Optional[str]) -> str:
+        if not session_id:
+            return ""
+        for message in reversed(self.store.history(session_id, last=3)):
+            if message.type == "ai":
+                return message.content if isinstance(message.content, str) else ""
+        return ""
+
+    def select(self, message: str, session_id: Optional[str] = None) -> List[str]:
+        """Return the names of the tools to offer for `message`, in agent tool order."""
+        selected = {name for name, pattern in TOOL_PATTERNS.items() if pattern.search(message)}
+        if AFFIRMATIVE.match(message) and WATCHLIST_OFFER.search(self._previous_reply(session_id)):
+            selected |= {"get_user_list", "update_watchlist"}
+
+        if WATCHLIST_MENTION.search(message):
+            if WATCHLIST_CHANGE.search(message):
+                selected.add("update_watchlist")
+            elif "update_watchlist" not in selected and not WATCHLIST_READ.search(message):
+                selected = set(self.tool_names)
+
+        if not selected:
+            selected = set(BROWSING_TOOLS)
+        selected |= set(ALWAYS_OFFERED)
+
+        names = [name for name in self.tool_names if name in selected]
+        with self._lock:
+            self.turns += 1
+            for name in names:
+                self.offered_by_tool[name] += 1
+        return names
+
+    def stats(self) -> Dict[str, object]:
+        """Return how often each tool was offered, out of all selected turns."""
+        with self._lock:
+            return {"turns": self.turns, "offered_by_tool": dict(self.offered_by_tool)}
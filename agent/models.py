@@ -1,5 +1,5 @@
 # models.py
-from typing import List, Type, Optional
+from typing import List, Literal, Type, Optional
 from pydantic import BaseModel, Field, model_validator
 
 from agent.utils.model_utils import *
@@ -69,6 +69,10 @@ class Movie(BaseModel):
     poster: Optional[str] = Field(default=None, example="")
     trailer: Optional[str] = Field(default=None, example="")
 
+    # Batch lookups: how the requested title resolved, and the options when it was ambiguous
+    match_status: Optional[Literal["match", "multiple_candidates", "no_match"]] = Field(default=None, example="match")
+    candidates: Optional[List[str]] = Field(default=None, example=["Heat (1995) [trakt_id 1234]"])
+
     @classmethod
     def example(cls, include_optional: Optional[List[str]] = None) -> dict:
         always_include = {"title"}
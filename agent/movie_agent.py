@@ -1,24 +1,39 @@
 # movie_agent.py
 from typing import List, Dict, Optional
+from concurrent.futures import Future
 import json
+import threading
 
-from langchain_core.tools import tool  # or BaseTool depending your version
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import create_agent
+from langchain_core.tools import StructuredTool, tool  # or BaseTool depending your version
 
+from agent.config import BATCH_DETAILS_MAX_MOVIES, CONTEXT_TOKEN_BUDGET, LLM_RESPONSE_MODEL
 from agent.llm.llm_client import LLMClient
 from agent.llm.llm_agent import LLMAgent
+from agent.llm.summarizer import SUMMARY_SECTION, ConversationSummarizer
+from agent.logic.intent_router import IntentRouter
+from agent.logic.tool_selector import ToolSelector
+from agent.utils.background import run_blocking, submit_background
+from agent.utils.compact_encoder import encode_tool_output
+from agent.utils.tool_memo import forget, memoized_call
+from agent.logic.entity_memory import (
+    is_unresolved_reference,
+    remember_movies,
+    resolve_movie_reference,
+    unresolved_reference_result,
+)
+from agent.logic.render import render_locally
 
 from agent.logic.actions.get_actions import (
     GetTrending,
     GetMovieDetails,
+    GetMovieDetailsBatch,
     GetRelatedMovies,
     GetUserList
 )
 from agent.logic.actions.post_actions import (
     AddOrRemoveFromWatchList
 )
+from agent.models import Movie
 
 SYSTEM_PROMPT = """
 You are a movie recommendation routing assistant.
@@ -28,10 +43,6 @@ If the user asks something unrelated, respond in natural language.
 Use the action argument descriptions to select valid arguments.
 """
 
-# --- Initialize LLM (Claude/Anthropic) ---
-llm_client = LLMClient(provider="anthropic")
-llm_client.initialize_client()
-
 # --- Define tool using @tool decorator ---
 
 # --- Default argument descriptions ---
@@ -62,14 +73,15 @@ def get_trending(num: int = 5) -> dict:
         }
     """
     # Call the existing final_func
-    trending_result = GetTrending.get_trending(num=num)
+    trending_result = memoized_call("get_trending", GetTrending.get_trending, num=num)
+    remember_movies(trending_result["movie_list"])
     
-    return {
+    return render_locally({
         "action_name" : "GetTrending",
-        "movie_list" : trending_result["movie_list"].model_dump_json(exclude_unset=True),
+        "movie_list" : encode_tool_output(trending_result["movie_list"], "GetTrending"),
         "action_prompt": trending_result['action_prompt'], 
         "status": "success"
-    }
+    }, trending_result["movie_list"])
 
 
 # --- Tool: GetDetails ---
@@ -77,7 +89,8 @@ def get_trending(num: int = 5) -> dict:
 def get_movie_details(
     title: Optional[str] = None,
     year: Optional[int] = None,
-    trakt_id: Optional[int] = None
+    trakt_id: Optional[int] = None,
+    reference: Optional[str] = None,
 ) -> dict:
     """
     Get info on a specific movie.
@@ -86,26 +99,93 @@ def get_movie_details(
         title: best guess movie title (**never** include year). Optional.
         year: release year. Optional.
         trakt_id: trakt.tv movie ID. Optional. Use only if known.
+        reference: the user's words for a movie already discussed ("it"). Optional.
     Notes:
         At least one of 'title' or 'trakt_id' should be provided. Provide only
-        `trakt_id` IF you see one in previous messages that matches the user's
-        request.
+        `trakt_id` IF you see one in previous messages or the known movies table
+        that matches the user's request. If the user refers to a movie already
+        discussed ("it", "that one") instead of naming it, pass their words as
+        `reference` and leave `title` empty.
     
     Returns:
         dict: movie details
     """
-    movie_details = GetMovieDetails.get_movie_details(
+    # Reuse a trakt_id resolved earlier in this session instead of searching again
+    remembered = resolve_movie_reference(title=title, year=year, trakt_id=trakt_id, reference=reference)
+    if remembered:
+        title, year, trakt_id = remembered["title"], remembered["year"], remembered["trakt_id"]
+    elif is_unresolved_reference(reference, title, trakt_id):
+        return unresolved_reference_result("GetMovieDetails", reference)
+
+    movie_details = memoized_call(
+        "get_movie_details",
+        GetMovieDetails.get_movie_details,
         title=title,
         year=year,
         trakt_id=trakt_id
     )
+    remember_movies(
+        movie_details["model_instance"],
+        focus=isinstance(movie_details["model_instance"], Movie),
+    )
     
-    return {
-        "action_name" : "GetTrending",
-        "model_instance" : movie_details["model_instance"].model_dump_json(exclude_unset=True),
+    # Only a confident match is rendered locally; candidates and misses need the LLM's wording
+    return render_locally({
+        "action_name" : "GetMovieDetails",
+        "model_instance" : encode_tool_output(movie_details["model_instance"], "GetMovieDetails"),
         "action_prompt": movie_details['action_prompt'], 
         "status": movie_details['status']
-    }
+    }, movie_details["model_instance"] if movie_details.get("confident_match") else None)
+
+
+
+# --- Tool: GetDetailsBatch ---
+@tool
+def get_multiple_movie_details(
+    titles: Optional[List[str]] = None,
+    trakt_ids: Optional[List[int]] = None,
+) -> dict:
+    """
+    Get info on several specific movies in one call, e.g. to compare them.
+
+    Args:
+        titles: best guess movie titles (**never** include years). Optional.
+        trakt_ids: trakt.tv movie IDs. Optional. Use only if known.
+    Notes:
+        Use this instead of calling get_movie_details once per movie whenever the
+        user names more than one movie. Each movie in the result has a match_status.
+
+    Returns:
+        dict: {
+            "status": "success",
+            "action_name": "GetMovieDetailsBatch",
+            "model_instance": JSON of the movies, in the order requested,
+            "action_prompt": prompt for LLM to format the output
+        }
+    """
+    requested = [{"title": t} for t in (titles or []) if t] + [{"trakt_id": i} for i in (trakt_ids or []) if i]
+    requested = requested[:BATCH_DETAILS_MAX_MOVIES]
+
+    # Reuse trakt_ids resolved earlier in this session instead of searching again
+    for movie in requested:
+        if movie.get("title"):
+            remembered = resolve_movie_reference(title=movie["title"])
+            if remembered:
+                movie.update(remembered)
+
+    batch_result = memoized_call(
+        "get_multiple_movie_details",
+        GetMovieDetailsBatch.get_movie_details_batch,
+        movies=requested,
+    )
+    remember_movies(batch_result["model_instance"])
+
+    return render_locally({
+        "status": batch_result["status"],
+        "action_name": "GetMovieDetailsBatch",
+        "model_instance": encode_tool_output(batch_result["model_instance"], "GetMovieDetailsBatch"),
+        "action_prompt": batch_result["action_prompt"],
+    }, batch_result["model_instance"])
 
     
 # --- Tool: GetSimilar ---
@@ -114,6 +194,7 @@ def get_similar_movies(
     title: Optional[str] = None,
     year: Optional[int] = None,
     num: Optional[int] = 3,
+    reference: Optional[str] = None,
 ) -> dict:
     """
     Get related movies to the provided search movie.
@@ -122,10 +203,13 @@ def get_similar_movies(
         title: The title of the movie to find related movies for. Optional.
         year: Release year of the movie. Optional.
         num: Number of related movies to return. Optional.
+        reference: the user's words for a movie already discussed ("it"), instead
+            of a title. Optional.
 
     Notes:
         At least one of 'title' or 'trakt_id' should be provided in the original system.
-        Since trakt_id is not included here, rely on title/year if available.
+        Since trakt_id is not included here, rely on title/year if available. Movies
+        already discussed are matched to their trakt_id automatically.
 
     Returns:
         dict: {
@@ -135,22 +219,30 @@ def get_similar_movies(
             "action_prompt": prompt for LLM to format the output
         }
     """
+    remembered = resolve_movie_reference(title=title, year=year, reference=reference)
+    if not remembered and is_unresolved_reference(reference, title):
+        return unresolved_reference_result("GetSimilar", reference)
+
     # Call the original final_func
-    action_result = GetRelatedMovies.get_related_list(
+    action_result = memoized_call(
+        "get_similar_movies",
+        GetRelatedMovies.get_related_list,
         title=title,
         year=year,
         num=num,
+        trakt_id=remembered["trakt_id"] if remembered else None,
     )
+    remember_movies(action_result.get("model_instance"))
 
     final_prompt = {
         "status": "success",
         "action_name": "GetSimilar",
-        "model_instance": action_result["model_instance"].model_dump_json(exclude_unset=True),
+        "model_instance": encode_tool_output(action_result["model_instance"], "GetSimilar"),
         "action_prompt": action_result.get("action_prompt", ""),
     }
 
     # Wrap in the generic tool-compatible response
-    return final_prompt
+    return render_locally(final_prompt, action_result["model_instance"])
 
 
 # --- Tool: GetUserList ---
@@ -177,18 +269,21 @@ def get_user_list(
         }
     """
     # Call the original final_func
-    action_result = GetUserList.get_user_list(
+    action_result = memoized_call(
+        "get_user_list",
+        GetUserList.get_user_list,
         list_type="watchlist",
         page=page,
     )
+    remember_movies(action_result["model_instance"])
 
     # Wrap in generic tool-compatible response
-    return {
+    return render_locally({
         "status": "success",
         "action_name": "GetUserList",
-        "model_instance": action_result["model_instance"].model_dump_json(exclude_unset=True),
+        "model_instance": encode_tool_output(action_result["model_instance"], "GetUserList"),
         "action_prompt": action_result.get("action_prompt", ""),
-    }
+    }, action_result["model_instance"])
 
 
 # --- Tool: AddOrRemoveFromWatchList ---
@@ -197,6 +292,7 @@ def update_watchlist(
     mode: Optional[str] = "add",
     title: Optional[str] = None,
     trakt_id: Optional[int] = None,
+    reference: Optional[str] = None,
 ) -> dict:
     """
     Update a user's watchlist for a single movie.
@@ -205,11 +301,14 @@ def update_watchlist(
         title: Optional title of the movie to add or remove.
         mode: Operation mode, either 'add' or 'remove' (optional, default='add').
         trakt_id: Optional Trakt.tv movie ID to uniquely identify the movie.
+        reference: Optional words the user used for a movie already discussed ("it").
 
     Notes:
         At least one of 'title' or 'trakt_id' should be provided. Provide only
-        `trakt_id` IF you see one in previous messages that matches the user's
-        request.
+        `trakt_id` IF you see one in previous messages or the known movies table
+        that matches the user's request. If the user refers to a movie already
+        discussed ("it", "that one") instead of naming it, pass their words as
+        `reference` and leave `title` empty.
 
     Returns:
         dict: {
@@ -219,37 +318,137 @@ def update_watchlist(
             "action_prompt": prompt for LLM to format the output
         }
     """
+    remembered = resolve_movie_reference(title=title, trakt_id=trakt_id, reference=reference)
+    if remembered:
+        title, trakt_id = remembered["title"], remembered["trakt_id"]
+    elif is_unresolved_reference(reference, title, trakt_id):
+        return unresolved_reference_result("AddOrRemoveFromWatchList", reference)
+
     # Call the original final_func
+    # Writes are never memoized, and make the memoized watchlist stale
     action_result = AddOrRemoveFromWatchList.add_or_remove_from_watchlist(
         title=title,
         mode=mode,
         trakt_id=trakt_id
     )
+    forget("get_user_list")
 
-    return {
+    # Only a completed write is rendered locally; an unconfirmed title needs the LLM's wording
+    updated = getattr(action_result["model_instance"], "action_success", False)
+    return render_locally({
         "status": "success",
         "action_name": "AddOrRemoveFromWatchList",
-        "model_instance": action_result["model_instance"].model_dump_json(exclude_unset=True),
+        "model_instance": encode_tool_output(action_result["model_instance"], "AddOrRemoveFromWatchList"),
         "action_prompt": action_result.get("action_prompt", ""),
-    }
+    }, action_result["model_instance"] if updated else None)
     
 
+def with_async(sync_tool: StructuredTool) -> StructuredTool:
+    """
+    Give a sync tool a coroutine so async agent runs (`ainvoke` / `astream`) await it
+    instead of blocking the event loop. The Trakt layer is built on `requests`, so the
+    call itself runs on the bounded BLOCKING_IO_EXECUTOR.
+    """
+    async def run_in_io_pool(**kwargs):
+        return await run_blocking(sync_tool.func, **kwargs)
+
+    sync_tool.coroutine = run_in_io_pool
+    return sync_tool
+
+
 tools = [
-    get_trending,
-    get_movie_details,
-    get_similar_movies,
-    get_user_list,
-    update_watchlist,
+    with_async(get_trending),
+    with_async(get_movie_details),
+    with_async(get_multiple_movie_details),
+    with_async(get_similar_movies),
+    with_async(get_user_list),
+    with_async(update_watchlist),
 ]
 
+# Picks the subset of `tools` offered to the agent on each turn
+tool_selector = ToolSelector(tool_names=[t.name for t in tools])
+
 system_prompt = (
     "You are an agent. You can respond normally or call tools.\n"
     "If using a tool, respond exactly in JSON: {\"tool\": <tool_name>, \"args\": <args_dict>}.\n"
 )
 
-# --- Create the agent ---
-movie_agent_runnable = LLMAgent(
-    llm_client=llm_client,
-    system_prompt=system_prompt,
-    tools=tools
+# --- Lazily built LLM client + agent ---
+# Building the client and compiling the agent graph is slow (langchain / langchain_anthropic
+# imports + graph compilation), so it happens on first use or in the background via
+# `start_movie_agent_build()` instead of at import time.
+_llm_client: Optional[LLMClient] = None
+_response_client: Optional[LLMClient] = None
+_movie_agent: Optional[LLMAgent] = None
+_build_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Return the shared, initialized LLM client (Claude/Anthropic), creating it on first use."""
+    global _llm_client
+    if _llm_client is None:
+        with _build_lock:
+            if _llm_client is None:
+                client = LLMClient(provider="anthropic")
+                client.initialize_client()
+                _llm_client = client
+    return _llm_client
+
+
+def get_response_client() -> Optional[LLMClient]:
+    """
+    Return the client of the larger model that writes replies from tool results
+    (LLM_RESPONSE_MODEL, as "provider:model"), or None to use the main client for everything.
+    """
+    global _response_client
+    if _response_client is None and LLM_RESPONSE_MODEL:
+        with _build_lock:
+            if _response_client is None:
+                provider, _, model = LLM_RESPONSE_MODEL.partition(":")
+                client = LLMClient(provider=provider.strip(), model=model.strip() or None)
+                client.initialize_client()
+                _response_client = client
+    return _response_client
+
+
+def get_movie_agent() -> LLMAgent:
+    """Return the shared movie agent, creating it on first use."""
+    global _movie_agent
+    if _movie_agent is None:
+        llm_client = get_llm_client()
+        response_client = get_response_client()
+        with _build_lock:
+            if _movie_agent is None:
+                _movie_agent = LLMAgent(
+                    llm_client=llm_client,
+                    system_prompt=system_prompt,
+                    tools=tools,
+                    context_token_budget=CONTEXT_TOKEN_BUDGET,
+                    cached_sections=(SUMMARY_SECTION,),
+                    response_client=response_client,
+                )
+    return _movie_agent
+
+
+# Folds older turns of each chat session into a rolling summary, off the request path
+conversation_summarizer = ConversationSummarizer(get_llm_client=get_llm_client)
+
+# Sends simple commands ("what's trending", "show my watchlist") straight to their tool
+intent_router = IntentRouter(
+    tools={t.name: t for t in (get_trending, get_user_list, update_watchlist)},
+    get_llm_client=get_llm_client,
 )
+
+
+def start_movie_agent_build() -> Future:
+    """Build the movie agent on the shared background executor so the UI can start serving first."""
+    return submit_background(get_movie_agent)
+
+
+def __getattr__(name: str):
+    # Keep `from agent.movie_agent import movie_agent_runnable / llm_client` working
+    if name == "movie_agent_runnable":
+        return get_movie_agent()
+    if name == "llm_client":
+        return get_llm_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
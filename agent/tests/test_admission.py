@@ -0,0 +1,150 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.errors import LLMOverloadedError
+from agent.llm.admission import LLMAdmissionController
+from agent.llm.llm_agent import LLMAgent
+from agent.llm.llm_client import LLMClient
+from agent.tests.test_variables import StubChatModel
+
+
+def hold_slot(controller, session_id, release, started=None, tokens=0):
+    """Thread target: take a slot, report it, and keep it until `release` is set."""
+    with controller.admit(session_id, tokens=tokens):
+        if started is not None:
+            started.append(session_id)
+        release.wait(5)
+
+
+class TestAdmission:
+    def test_caps_calls_in_flight(self):
+        controller = LLMAdmissionController(max_in_flight=2, tokens_per_minute=0, max_queue_wait_seconds=5)
+        release, started = threading.Event(), []
+        threads = [
+            threading.Thread(target=hold_slot, args=(controller, f"s{i}", release, started))
+            for i in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+
+        stats = controller.stats()
+        assert len(started) == 2
+        assert stats["in_flight"] == 2
+        assert stats["queue_depth"] == 1
+
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        stats = controller.stats()
+        assert len(started) == 3
+        assert stats["in_flight"] == 0
+        assert stats["admitted"] == 3
+        assert stats["max_wait_seconds"] > 0
+
+    def test_sessions_are_served_round_robin(self):
+        controller = LLMAdmissionController(max_in_flight=1, tokens_per_minute=0, max_queue_wait_seconds=10)
+        blocker, done, order = threading.Event(), threading.Event(), []
+        done.set()
+        holder = threading.Thread(target=hold_slot, args=(controller, "busy", blocker))
+        holder.start()
+        time.sleep(0.05)
+
+        # A burst from one session is queued before a single call from another
+        threads = []
+        for session_id in ["a", "a", "a", "b"]:
+            thread = threading.Thread(target=hold_slot, args=(controller, session_id, done, order))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.05)
+        assert controller.stats()["queued_sessions"] == 2
+
+        blocker.set()
+        for thread in [holder, *threads]:
+            thread.join(5)
+        assert order == ["a", "b", "a", "a"]
+
+    def test_rejects_when_estimated_wait_exceeds_deadline(self):
+        controller = LLMAdmissionController(max_in_flight=1, tokens_per_minute=0, max_queue_wait_seconds=1)
+        controller._service_seconds = 5.0
+        release = threading.Event()
+        holder = threading.Thread(target=hold_slot, args=(controller, "a", release))
+        holder.start()
+        time.sleep(0.05)
+
+        started_at = time.perf_counter()
+        with pytest.raises(LLMOverloadedError) as excinfo:
+            with controller.admit("b"):
+                pass
+        # Turned away straight away, not after waiting out the deadline
+        assert time.perf_counter() - started_at < 0.5
+        assert excinfo.value.estimated_wait_seconds == pytest.approx(5.0)
+        assert "try again" in excinfo.value.user_message
+
+        release.set()
+        holder.join(5)
+        assert controller.stats()["rejected"] == 1
+
+    def test_token_budget_delays_calls(self):
+        controller = LLMAdmissionController(max_in_flight=0, tokens_per_minute=600, max_queue_wait_seconds=5)
+        with controller.admit("a", tokens=600):
+            pass
+
+        # The bucket is empty: 30 tokens refill at 10 tokens per second
+        started_at = time.perf_counter()
+        with controller.admit("a", tokens=30):
+            pass
+        assert time.perf_counter() - started_at >= 2.5
+        assert controller.stats()["admitted"] == 2
+
+    def test_async_waiters_are_admitted_and_time_out(self):
+        controller = LLMAdmissionController(max_in_flight=1, tokens_per_minute=0, max_queue_wait_seconds=0.3)
+        controller._service_seconds = 0.01
+
+        async def scenario():
+            async with controller.aadmit("a"):
+                with pytest.raises(LLMOverloadedError):
+                    async with controller.aadmit("b"):
+                        pass
+            async with controller.aadmit("b"):
+                return controller.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats["in_flight"] == 1
+        assert stats["timed_out"] == 1
+        assert stats["queue_depth"] == 0
+
+
+class TestAdmissionInClient:
+    def test_agent_model_calls_go_through_admission(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        controller = LLMAdmissionController(max_in_flight=1, tokens_per_minute=0, max_queue_wait_seconds=5)
+        llm_client = LLMClient(provider="anthropic", response_cache=None, admission=controller)
+        llm_client.client = StubChatModel(responses=[AIMessage(content="Hello!")])
+        agent = LLMAgent(llm_client=llm_client, system_prompt="You are a movie agent.", tools=[])
+
+        agent.invoke([HumanMessage(content="Hi")], session_id="s1")
+
+        stats = controller.stats()
+        assert stats["admitted"] == 1
+        assert stats["in_flight"] == 0
+
+    def test_overloaded_error_is_not_wrapped(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        controller = LLMAdmissionController(max_in_flight=1, tokens_per_minute=0, max_queue_wait_seconds=1)
+        controller._service_seconds = 5.0
+        llm_client = LLMClient(provider="anthropic", response_cache=None, admission=controller)
+        llm_client.client = StubChatModel(responses=[AIMessage(content="Hello!")])
+
+        with controller.admit("other"):
+            with pytest.raises(LLMOverloadedError):
+                llm_client.query(system_prompt=None, user_prompt="Hi")
@@ -0,0 +1,91 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import time
+
+import pytest
+
+import agent.logic.services.trakt.get_movies as get_movies
+from agent.logic.actions.get_actions import GetMovieDetailsBatch
+from agent.logic.render import render_movie_list
+from agent.models import Movie, MovieList
+
+FAKE_RESULTS = {
+    "Heat": {"status": "match", "movie": Movie(title="Heat", year=1995, trakt_id=1), "match_score": 0.9},
+    "Thief": {
+        "status": "multiple_candidates",
+        "movie": None,
+        "potential_matches": MovieList(movies=[
+            Movie(title="Thief", year=1981, trakt_id=2),
+            Movie(title="The Thief", year=1952, trakt_id=3),
+        ]),
+    },
+    "Nope": {"status": "no_match", "movie": None, "potential_matches": MovieList()},
+    "Haet": {"status": "match", "movie": Movie(title="Heathers", year=1989, trakt_id=5), "match_score": 0.4},
+}
+
+
+@pytest.fixture
+def fake_trakt(monkeypatch):
+    def query_trakt_movie(trakt_id=None, title=None, year=None):
+        time.sleep(0.3 if title == "Heat" else 0.1)
+        if title == "Broken":
+            raise RuntimeError("Trakt is down")
+        if trakt_id:
+            return {
+                "status": "match",
+                "movie": Movie(title="Collateral", year=2004, trakt_id=trakt_id),
+                "match_score": 1.0,
+            }
+        return FAKE_RESULTS[title]
+
+    monkeypatch.setattr(get_movies, "query_trakt_movie", query_trakt_movie)
+
+
+class TestGetMovieDetailsBatch:
+    def test_lookups_run_concurrently_and_keep_request_order(self, fake_trakt):
+        started = time.perf_counter()
+        result = GetMovieDetailsBatch.get_movie_details_batch(
+            [{"title": "Heat"}, {"trakt_id": 4}, {"title": "Thief"}, {"title": "Nope"}, {"title": "Broken"}]
+        )
+        assert time.perf_counter() - started < 0.5
+
+        movies = result["model_instance"].movies
+        assert [(m.title, m.match_status) for m in movies] == [
+            ("Heat", "match"),
+            ("Collateral", "match"),
+            ("Thief", "multiple_candidates"),
+            ("Nope", "no_match"),
+            ("Broken", "no_match"),
+        ]
+        assert movies[2].candidates == ["Thief (1981) [trakt_id 2]", "The Thief (1952) [trakt_id 3]"]
+        assert "match_status" in result["action_prompt"]
+
+    def test_low_score_matches_are_not_reported_as_matches(self, fake_trakt):
+        result = GetMovieDetailsBatch.get_movie_details_batch([{"title": "Heat"}, {"title": "Haet"}])
+        movies = result["model_instance"].movies
+        assert [(m.title, m.match_status) for m in movies] == [
+            ("Heat", "match"),
+            ("Haet", "multiple_candidates"),
+        ]
+        assert movies[1].candidates == ["Heathers (1989) [trakt_id 5]"]
+
+    def test_empty_request_is_an_error(self, fake_trakt):
+        assert GetMovieDetailsBatch.get_movie_details_batch([{"title": ""}])["status"] == "error"
+
+    def test_unresolved_entries_render_locally(self, fake_trakt):
+        result = GetMovieDetailsBatch.get_movie_details_batch([{"title": "Thief"}, {"title": "Nope"}])
+        assert render_movie_list(result["model_instance"]) == (
+            "1. **Thief** — which one did you mean?\n"
+            "   - Thief (1981) [trakt_id 2]\n"
+            "   - The Thief (1952) [trakt_id 3]\n\n"
+            "2. **Nope** — no movie with this title was found on Trakt."
+        )
+
+    def test_failed_lookups_are_logged(self, fake_trakt, caplog):
+        with caplog.at_level("WARNING", logger=get_movies.__name__):
+            result = GetMovieDetailsBatch.get_movie_details_batch([{"title": "Broken"}])
+        assert result["model_instance"].movies[0].match_status == "no_match"
+        assert "Error looking up" in caplog.text and "Trakt is down" in caplog.text
@@ -0,0 +1,73 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import json
+import pytest
+
+from agent.logic.services.trakt import get_movies, snapshot
+
+INCEPTION_TRAKT_ID = 16662
+INCEPTION_CORE = {"title": "Inception", "year": 2010, "ids": {"trakt": INCEPTION_TRAKT_ID}}
+INCEPTION_PEOPLE = {"cast": [{"person": {"name": "Leonardo DiCaprio"}}]}
+INCEPTION_SEARCH = [{"movie": INCEPTION_CORE}]
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    for cache in snapshot.SNAPSHOT_CACHES.values():
+        cache.clear()
+    yield
+    for cache in snapshot.SNAPSHOT_CACHES.values():
+        cache.clear()
+
+
+class TestCacheSnapshot:
+    def test_round_trip_restores_every_cache(self, tmp_path):
+        get_movies.MOVIE_METADATA_CACHE.set(INCEPTION_TRAKT_ID, INCEPTION_CORE)
+        get_movies.MOVIE_PEOPLE_CACHE.set(INCEPTION_TRAKT_ID, INCEPTION_PEOPLE)
+        get_movies.TITLE_INDEX_CACHE.set(get_movies.title_index_key("Inception"), INCEPTION_SEARCH)
+
+        path = str(tmp_path / "snapshot.json")
+        exported = snapshot.export_cache_snapshot(path)
+        assert exported == {"metadata": 1, "people": 1, "title_index": 1}
+
+        for cache in snapshot.SNAPSHOT_CACHES.values():
+            cache.clear()
+
+        loaded = snapshot.load_cache_snapshot(path)
+        assert loaded == exported
+        assert get_movies.fetch_movie_core(INCEPTION_TRAKT_ID) == INCEPTION_CORE
+        assert get_movies.fetch_movie_people(INCEPTION_TRAKT_ID) == INCEPTION_PEOPLE
+        assert get_movies.TITLE_INDEX_CACHE.get(("inception", None)) == INCEPTION_SEARCH
+
+    def test_unknown_version_is_skipped(self, tmp_path):
+        path = tmp_path / "snapshot.json"
+        path.write_text(json.dumps({"format": snapshot.SNAPSHOT_FORMAT, "version": 999, "caches": {}}))
+        with pytest.warns(UserWarning):
+            assert snapshot.load_cache_snapshot(str(path)) == {}
+
+    def test_stale_snapshot_is_skipped(self, tmp_path):
+        path = tmp_path / "snapshot.json"
+        path.write_text(json.dumps({
+            "format": snapshot.SNAPSHOT_FORMAT,
+            "version": snapshot.SNAPSHOT_VERSION,
+            "created_at": 0,
+            "caches": {"metadata": [[INCEPTION_TRAKT_ID, INCEPTION_CORE]]},
+        }))
+        with pytest.warns(UserWarning):
+            assert snapshot.load_cache_snapshot(str(path)) == {}
+        assert len(get_movies.MOVIE_METADATA_CACHE) == 0
+
+    @pytest.mark.parametrize("content", [b'{"format": "movie-agent-cache-snapshot", "caches": {"meta', b"\xff\xfe", b"[]"])
+    def test_corrupt_snapshot_is_skipped(self, tmp_path, content):
+        path = tmp_path / "snapshot.json"
+        path.write_bytes(content)
+        with pytest.warns(UserWarning):
+            assert snapshot.load_cache_snapshot(str(path)) == {}
+        assert len(get_movies.MOVIE_METADATA_CACHE) == 0
+
+    def test_unreadable_snapshot_is_skipped(self, tmp_path):
+        with pytest.warns(UserWarning):
+            assert snapshot.load_cache_snapshot(str(tmp_path)) == {}
@@ -0,0 +1,59 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import json
+
+from agent.models import Movie, MovieList, TraktListActionResult
+from agent.utils.compact_encoder import encode_model_instance, encode_tool_output, tool_output_stats
+
+
+def trakt_style_movie(title, year, **fields):
+    """A Movie with every optional field set explicitly, like map_trakt_to_movie does."""
+    defaults = {name: None for name in Movie.model_fields if name != "title"}
+    defaults.update(genres=[], cast=[], comments=[])
+    return Movie(**{**defaults, "title": title, "year": year, **fields})
+
+
+class TestEncodeModelInstance:
+    def test_movie_list_is_header_plus_rows_without_empty_fields(self):
+        movies = MovieList(movies=[
+            trakt_style_movie("Inception", 2010, runtime=148),
+            trakt_style_movie("Heat", 1995, genres=["crime"]),
+        ])
+        encoded = json.loads(encode_model_instance(movies))
+
+        assert encoded == {"movies": {
+            "columns": ["title", "runtime", "genres", "year"],
+            "rows": [["Inception", 148, None, 2010], ["Heat", None, ["crime"], 1995]],
+        }}
+
+    def test_long_descriptions_truncated_at_a_word(self):
+        movie = trakt_style_movie("Heat", 1995, description="A tense heist. " * 50)
+        encoded = json.loads(encode_model_instance(movie, description_chars=40))
+
+        assert encoded["description"] == "A tense heist. A tense heist. A tense…"
+        assert "runtime" not in encoded
+
+    def test_other_models_drop_empty_values(self):
+        result = TraktListActionResult(
+            action_name="add_to_list", target_list="watchlist", action_success=True,
+            successfully_updated_titles=["Heat"], non_updated_error_titles=[], message="Done",
+        )
+        assert json.loads(encode_model_instance(result)) == {
+            "action_name": "add_to_list", "target_list": "watchlist", "action_success": True,
+            "successfully_updated_titles": ["Heat"], "message": "Done",
+        }
+
+
+class TestEncodeToolOutput:
+    def test_reports_estimated_tokens_saved(self):
+        before = tool_output_stats()
+        movies = MovieList(movies=[trakt_style_movie(f"Movie {i}", 2000 + i) for i in range(10)])
+        encode_tool_output(movies, "GetTrending")
+        after = tool_output_stats()
+
+        assert after["outputs"] == before["outputs"] + 1
+        added, added_verbose = after["tokens"] - before["tokens"], after["verbose_tokens"] - before["verbose_tokens"]
+        assert 0 < added < added_verbose / 3
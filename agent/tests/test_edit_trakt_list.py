@@ -9,7 +9,8 @@ from typing import List, Dict
 # Ensure project root is in sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
-from agent.models import TraktListActionResult
+from agent.models import Movie, MovieList, TraktListActionResult
+from agent.logic.services.trakt import trakt_lists
 from agent.logic.services.trakt.get_movies import query_trakt_movie
 from agent.logic.services.trakt.trakt_lists import update_trakt_list
 
@@ -114,3 +115,26 @@ class TestUpdateTraktList:
     #     )
     #     assert result.action_success is True
     #     assert any("Successfully added" in msg for msg in result.message.splitlines())
+
+
+class TestWriteMatchGate:
+    def test_weak_title_match_is_not_written(self, monkeypatch):
+        def weak_match(title=None, **kwargs):
+            return {
+                "status": "match",
+                "movie": Movie(title="Heathers", year=1989, trakt_id=1),
+                "potential_matches": MovieList(),
+                "match_score": 0.5,
+            }
+
+        def fail_post(*args, **kwargs):
+            raise AssertionError("list was written")
+
+        monkeypatch.setattr(trakt_lists, "query_trakt_movie", weak_match)
+        monkeypatch.setattr(trakt_lists.TRAKT_SESSION, "post", fail_post)
+
+        result = update_trakt_list(title="Heat and Thief", mode="add")
+
+        assert result.action_success is False
+        assert result.non_updated_error_titles == ["Heat and Thief"]
+        assert "Heathers" in result.message
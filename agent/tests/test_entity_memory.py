@@ -0,0 +1,139 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pytest
+
+from agent.logic.entity_memory import (
+    ENTITY_SECTION,
+    entity_table_section,
+    remember_movies,
+    resolve_movie_reference,
+)
+from agent.models import Movie, MovieList
+from agent.utils.session_store import CONVERSATION_STORE, CURRENT_SESSION_ID
+
+INCEPTION = Movie(title="Inception", year=2010, trakt_id=16662)
+HEAT = Movie(title="Heat", year=1995, trakt_id=1071)
+
+
+@pytest.fixture(autouse=True)
+def session():
+    CONVERSATION_STORE.clear()
+    token = CURRENT_SESSION_ID.set("session-a")
+    yield "session-a"
+    CURRENT_SESSION_ID.reset(token)
+    CONVERSATION_STORE.clear()
+
+
+class TestEntityMemory:
+    def test_title_and_pronoun_resolve_to_remembered_movies(self):
+        remember_movies(MovieList(movies=[HEAT]))
+        remember_movies(INCEPTION, focus=True)
+
+        assert resolve_movie_reference(title="heat")["trakt_id"] == 1071
+        assert resolve_movie_reference(title="Inception", year=2010)["trakt_id"] == 16662
+        assert resolve_movie_reference(title="Inception", year=1999) is None
+        assert resolve_movie_reference(title="it")["trakt_id"] == 16662
+        assert resolve_movie_reference(title=None)["trakt_id"] == 16662
+        # An explicit trakt_id never needs resolving
+        assert resolve_movie_reference(title="Heat", trakt_id=5) is None
+
+    def test_ambiguous_titles_are_not_resolved(self):
+        # e.g. the candidates of an ambiguous "Heat" search
+        remember_movies(MovieList(movies=[HEAT, Movie(title="Heat", year=1986, trakt_id=2)]))
+
+        assert resolve_movie_reference(title="Heat") is None
+        assert resolve_movie_reference(title="Heat", year=1995)["trakt_id"] == 1071
+        assert resolve_movie_reference(title="Heat", year=1986)["trakt_id"] == 2
+
+    def test_list_results_do_not_change_focus(self):
+        remember_movies(HEAT, focus=True)
+        remember_movies(MovieList(movies=[INCEPTION]))
+        assert resolve_movie_reference(title="that one")["trakt_id"] == 1071
+
+    def test_memory_is_per_session(self):
+        remember_movies(INCEPTION, focus=True)
+        assert resolve_movie_reference(title="it", session_id="session-b") is None
+
+    def test_entity_table_section(self):
+        remember_movies(MovieList(movies=[HEAT, INCEPTION]))
+        assert entity_table_section("session-a") == {
+            ENTITY_SECTION: "Heat (1995): 1071\nInception (2010): 16662"
+        }
+
+
+class TestToolsUseEntityMemory:
+    def test_update_watchlist_reuses_trakt_id_for_pronoun(self, monkeypatch):
+        from agent import movie_agent
+        from agent.models import TraktListActionResult
+
+        calls = []
+
+        def fake_update(title=None, mode="add", trakt_id=None):
+            calls.append({"title": title, "trakt_id": trakt_id})
+            return {"model_instance": TraktListActionResult(
+                action_name="add_to_list",
+                target_list="watchlist",
+                action_success=True,
+                successfully_updated_titles=[title],
+                non_updated_error_titles=[],
+                message="ok",
+            )}
+
+        monkeypatch.setattr(
+            movie_agent.AddOrRemoveFromWatchList, "add_or_remove_from_watchlist", fake_update
+        )
+        remember_movies(INCEPTION, focus=True)
+        movie_agent.update_watchlist.invoke({"title": "it"})
+
+        assert calls == [{"title": "Inception", "trakt_id": 16662}]
+
+    def test_unresolved_reference_is_never_searched_or_written(self, monkeypatch):
+        from agent import movie_agent
+
+        def fail(**kwargs):
+            raise AssertionError(f"called with {kwargs}")
+
+        monkeypatch.setattr(movie_agent.AddOrRemoveFromWatchList, "add_or_remove_from_watchlist", fail)
+        monkeypatch.setattr(movie_agent.GetMovieDetails, "get_movie_details", fail)
+        monkeypatch.setattr(movie_agent.GetRelatedMovies, "get_related_list", fail)
+
+        results = [
+            movie_agent.update_watchlist.invoke({"reference": "it"}),
+            movie_agent.get_movie_details.invoke({"reference": "that movie", "title": "that movie"}),
+            movie_agent.get_similar_movies.invoke({"reference": "it"}),
+        ]
+
+        for result in results:
+            assert result["status"] == "error"
+            assert "ask the user which movie" in result["action_prompt"]
+
+    def test_the_film_it_is_searched_as_a_title(self, monkeypatch):
+        from agent import movie_agent
+
+        calls = []
+
+        def fake_details(title=None, year=None, trakt_id=None):
+            calls.append({"title": title, "year": year, "trakt_id": trakt_id})
+            return {
+                "status": "success",
+                "model_instance": Movie(title="It", year=2017, trakt_id=262366),
+                "action_prompt": "",
+                "confident_match": True,
+            }
+
+        monkeypatch.setattr(movie_agent.GetMovieDetails, "get_movie_details", fake_details)
+
+        # No movie in focus: "It" is the film's title, not a pronoun
+        movie_agent.get_movie_details.invoke({"title": "It", "year": 2017})
+        assert calls == [{"title": "It", "year": 2017, "trakt_id": None}]
+
+        # With another movie in focus, a year still marks "It" as a title
+        remember_movies(HEAT, focus=True)
+        assert resolve_movie_reference(title="It", year=2017)["trakt_id"] == 262366
+        assert resolve_movie_reference(title="It")["trakt_id"] == 1071
+        CONVERSATION_STORE.clear()
+        remember_movies(HEAT, focus=True)
+        assert resolve_movie_reference(title="It", year=2017) is None
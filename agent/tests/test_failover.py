@@ -0,0 +1,183 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.tools import tool
+
+from agent.llm.failover import BackendHealth, FailoverChatModel
+from agent.llm.llm_agent import LLMAgent
+from agent.llm.llm_client import LLMClient
+from agent.tests.test_variables import StubChatModel
+
+
+class FailingChatModel(StubChatModel):
+    """Raises on every call, like a provider returning 5xx / overloaded errors."""
+    responses: list = []
+
+    def _next_response(self, messages, **kwargs):
+        self.calls.append({"messages": list(messages), "kwargs": kwargs})
+        raise RuntimeError("overloaded_error")
+
+
+class SlowChatModel(StubChatModel):
+    """Answers after `delay` seconds."""
+    delay: float = 1.0
+
+    def _next_response(self, messages, **kwargs):
+        time.sleep(self.delay)
+        return super()._next_response(messages, **kwargs)
+
+
+class BrokenStreamChatModel(StubChatModel):
+    """Streams one word, then fails."""
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append({"messages": list(messages), "kwargs": kwargs})
+        yield ChatGenerationChunk(message=AIMessageChunk(content="Half"))
+        raise RuntimeError("connection reset")
+
+
+@tool
+def lookup_movie(title: str) -> dict:
+    """Look up a movie by title."""
+    return {"title": title, "trakt_id": 1}
+
+
+def make_pool(*backends, timeout_seconds=None, **health_kwargs):
+    names = [f"backend-{i}" for i in range(len(backends))]
+    return FailoverChatModel(
+        backends=list(backends),
+        names=names,
+        timeout_seconds=timeout_seconds,
+        health=BackendHealth(names, **health_kwargs),
+    )
+
+
+class TestFailover:
+    def test_fails_over_on_error(self):
+        failing = FailingChatModel()
+        healthy = StubChatModel(responses=[AIMessage(content="From the backup")])
+        pool = make_pool(failing, healthy)
+
+        assert pool.invoke([HumanMessage(content="Hi")]).content == "From the backup"
+        stats = pool.stats()
+        assert stats["backend-0"]["errors"] == 1
+        assert stats["backend-0"]["failovers"] == 1
+        assert stats["backend-1"]["calls"] == 1
+
+    def test_unhealthy_backend_is_skipped_until_cooldown(self):
+        failing = FailingChatModel()
+        healthy = StubChatModel(responses=[AIMessage(content="one"), AIMessage(content="two")])
+        pool = make_pool(failing, healthy, cooldown_seconds=60)
+
+        pool.invoke([HumanMessage(content="Hi")])
+        pool.invoke([HumanMessage(content="Hi again")])
+
+        assert len(failing.calls) == 1
+        assert pool.stats()["backend-0"]["healthy"] is False
+
+    def test_last_backend_error_is_raised(self):
+        pool = make_pool(FailingChatModel(), FailingChatModel())
+        with pytest.raises(RuntimeError, match="overloaded_error"):
+            pool.invoke([HumanMessage(content="Hi")])
+
+    def test_fails_over_on_deadline(self):
+        slow = SlowChatModel(responses=[AIMessage(content="Too late")], delay=1.0)
+        fast = StubChatModel(responses=[AIMessage(content="On time")])
+        pool = make_pool(slow, fast, timeout_seconds=0.2)
+
+        started_at = time.perf_counter()
+        assert pool.invoke([HumanMessage(content="Hi")]).content == "On time"
+        assert time.perf_counter() - started_at < 0.9
+        assert pool.stats()["backend-0"]["timeouts"] == 1
+
+    def test_async_stream_fails_over_on_deadline(self):
+        slow = SlowChatModel(responses=[AIMessage(content="Too late")], delay=1.0)
+        fast = StubChatModel(responses=[AIMessage(content="On time today")])
+        pool = make_pool(slow, fast, timeout_seconds=0.2)
+
+        async def collect():
+            return "".join([chunk.content async for chunk in pool.astream([HumanMessage(content="Hi")])])
+
+        assert asyncio.run(collect()) == "On time today"
+        assert pool.stats()["backend-0"]["timeouts"] == 1
+
+    def test_stream_error_after_first_chunk_is_not_retried(self):
+        backup = StubChatModel(responses=[AIMessage(content="Whole answer")])
+        pool = make_pool(BrokenStreamChatModel(responses=[]), backup)
+
+        with pytest.raises(RuntimeError, match="connection reset"):
+            list(pool.stream([HumanMessage(content="Hi")]))
+        assert backup.calls == []
+
+    def test_routes_to_faster_backend(self):
+        health = BackendHealth(["slow", "fast"])
+        health.record_success("slow", 4.0)
+        health.record_success("fast", 1.0)
+        assert health.order(["slow", "fast"]) == [1, 0]
+
+        # Within the tolerance the configured order is kept
+        for _ in range(6):
+            health.record_success("slow", 0.5)
+        assert health.order(["slow", "fast"]) == [0, 1]
+
+    def test_single_provider_pool_keeps_provider_type(self):
+        pool = make_pool(StubChatModel(responses=[]), StubChatModel(responses=[]))
+        assert pool._llm_type == "stub-chat-model"
+
+
+class TestFailoverInAgent:
+    def test_agent_tool_calls_fail_over(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        healthy = StubChatModel(responses=[
+            AIMessage(content="", tool_calls=[{"name": "lookup_movie", "args": {"title": "Heat"}, "id": "call_1"}]),
+            AIMessage(content="Heat is a 1995 crime film."),
+        ])
+        llm_client = LLMClient(provider="anthropic", response_cache=None, admission=None)
+        llm_client.client = make_pool(FailingChatModel(), healthy, cooldown_seconds=60)
+        agent = LLMAgent(llm_client=llm_client, system_prompt="You are a movie agent.", tools=[lookup_movie])
+
+        events = list(agent.stream([HumanMessage(content="Tell me about Heat")]))
+
+        tokens = "".join(e["text"] for e in events if e["type"] == "token")
+        assert events[-1]["content"] == "Heat is a 1995 crime film."
+        # Backends stream through the pool without emitting every token twice
+        assert tokens == "Heat is a 1995 crime film."
+        assert [tool.name for tool in healthy.bound_tools] == ["lookup_movie"]
+        assert llm_client.backend_stats()["backend-1"]["calls"] == 2
+
+    def test_client_builds_pool_from_fallback_backends(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        llm_client = LLMClient(
+            provider="anthropic",
+            fallback_backends=["anthropic:claude-sonnet-4-5", "anthropic"],
+        )
+        # The bare provider resolves to the primary model and is not added twice
+        assert llm_client.fallback_backends == [("anthropic", "claude-sonnet-4-5", "test-key")]
+
+        llm_client.initialize_client()
+        assert isinstance(llm_client.client, FailoverChatModel)
+        assert llm_client.client.names == ["anthropic:claude-haiku-4-5", "anthropic:claude-sonnet-4-5"]
+
+    def test_missing_provider_package_fails_when_config_is_read(self, monkeypatch):
+        from agent.errors import LLMConfigError
+        from agent.llm import llm_client as llm_client_module
+
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        real_find_spec = llm_client_module.importlib.util.find_spec
+        monkeypatch.setattr(
+            llm_client_module.importlib.util, "find_spec",
+            lambda name: None if name == "langchain_openai" else real_find_spec(name),
+        )
+
+        with pytest.raises(LLMConfigError, match="langchain-openai"):
+            LLMClient(provider="anthropic", fallback_backends=["openai:gpt-4o-mini"])
+
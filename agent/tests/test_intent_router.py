@@ -0,0 +1,101 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from agent.llm.llm_client import LLMClient
+from agent.logic.intent_router import IntentRouter, match_intent
+from agent.tests.test_variables import StubChatModel
+from agent.utils.session_store import CURRENT_SESSION_ID
+
+
+class TestMatchIntent:
+    @pytest.mark.parametrize("message, expected", [
+        ("What's trending?", {"intent": "get_trending", "args": {}}),
+        ("show me the top 10 trending movies", {"intent": "get_trending", "args": {"num": 10}}),
+        ("please show me three trending films", {"intent": "get_trending", "args": {"num": 3}}),
+        ("Show my watchlist", {"intent": "get_user_list", "args": {}}),
+        ("what's on my watch list?", {"intent": "get_user_list", "args": {}}),
+        ("Add Dune: Part Two to my watchlist",
+         {"intent": "update_watchlist", "args": {"mode": "add", "title": "Dune: Part Two"}}),
+        ("can you remove \"Heat\" (1995) from my watchlist please",
+         {"intent": "update_watchlist", "args": {"mode": "remove", "title": "Heat"}}),
+        ("Take The Last Samurai off my watchlist",
+         {"intent": "update_watchlist", "args": {"mode": "remove", "title": "The Last Samurai"}}),
+    ])
+    def test_matches_simple_commands(self, message, expected):
+        assert match_intent(message) == expected
+
+    @pytest.mark.parametrize("message", [
+        "What's trending in horror?",
+        "Tell me about Inception",
+        "Show my watchlist and recommend something similar",
+        "add it to my list",
+        "movies like Heat",
+        # "popular" is a different Trakt list than trending
+        "show me the most popular movies",
+        # Watchlist writes only route one concrete title
+        "add it to my watchlist",
+        "add the second one to my watchlist",
+        "add the last movie to my watchlist",
+        "remove all of them from my watchlist",
+        "put both on my watchlist",
+        "add those movies to my watchlist",
+        "add Heat and Thief to my watchlist",
+        "add Heat, Thief to my watchlist",
+    ])
+    def test_anything_else_falls_through(self, message):
+        assert match_intent(message) is None
+
+
+@pytest.fixture
+def make_router(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+    def _make_router(responses):
+        seen = {}
+
+        @tool
+        def get_trending(num: int = 5) -> dict:
+            """Fake trending tool."""
+            seen["num"], seen["session_id"] = num, CURRENT_SESSION_ID.get()
+            return {"status": "success", "model_instance": '{"movies": []}', "action_prompt": "List them."}
+
+        llm_client = LLMClient(provider="anthropic", response_cache=None)
+        llm_client.client = StubChatModel(responses=list(responses))
+        router = IntentRouter(tools={"get_trending": get_trending}, get_llm_client=lambda: llm_client)
+        return router, llm_client.client, seen
+
+    return _make_router
+
+
+class TestIntentRouter:
+    def test_runs_tool_and_formats_in_one_call(self, make_router):
+        router, stub, seen = make_router([AIMessage(content="Here are the trending movies.")])
+        intent = router.route("top 3 trending movies")
+
+        async def collect():
+            return [e async for e in router.astream(intent, "top 3 trending movies", session_id="s1")]
+
+        events = asyncio.run(collect())
+
+        assert seen == {"num": 3, "session_id": "s1"}
+        assert [e["type"] for e in events][:2] == ["tool_start", "tool_end"]
+        assert events[-1]["content"] == "Here are the trending movies."
+        assert events[-1]["routed_intent"] == "get_trending"
+        assert len(stub.calls) == 1
+        assert stub.calls[0]["messages"][0].content == "List them."
+
+    def test_unknown_tools_fall_through_and_are_counted(self, make_router):
+        router, _, _ = make_router([])
+        assert router.route("show my watchlist") is None
+        assert router.route("what's trending") is not None
+
+        stats = router.stats()
+        assert stats["routed"] == 1 and stats["fallthrough"] == 1
+        assert stats["hit_rate"] == 0.5
@@ -0,0 +1,508 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import asyncio
+import time
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+
+from agent.llm.llm_agent import LLMAgent
+from agent.llm.llm_client import LLMClient
+from agent.tests.test_variables import StubChatModel
+
+
+@tool
+def lookup_movie(title: str) -> dict:
+    """Look up a movie by title."""
+    return {"title": title, "trakt_id": 1}
+
+
+def tool_call_message(name: str, args: dict, call_id: str = "call_1") -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+
+@pytest.fixture
+def make_agent(monkeypatch):
+    """Build an LLMAgent around a StubChatModel scripted with `responses`."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+    def _make_agent(responses, tools=(lookup_movie,), **agent_kwargs):
+        llm_client = LLMClient(provider="anthropic")
+        llm_client.client = StubChatModel(responses=list(responses))
+        agent = LLMAgent(
+            llm_client=llm_client,
+            system_prompt="You are a movie agent.",
+            tools=list(tools),
+            **agent_kwargs
+        )
+        return agent, llm_client.client
+
+    return _make_agent
+
+
+class TestInvoke:
+    def test_invoke_runs_tools_and_returns_final_answer(self, make_agent):
+        agent, stub = make_agent([
+            tool_call_message("lookup_movie", {"title": "Heat"}),
+            AIMessage(content="Heat (1995) is a classic."),
+        ])
+        result = agent.invoke([HumanMessage(content="Tell me about Heat")])
+        assert isinstance(result, AIMessage)
+        assert result.content == "Heat (1995) is a classic."
+        assert len(stub.calls) == 2
+
+
+class TestStream:
+    def test_stream_yields_tool_progress_tokens_and_final(self, make_agent):
+        agent, _ = make_agent([
+            tool_call_message("lookup_movie", {"title": "Heat"}),
+            AIMessage(content="Heat is great"),
+        ])
+        events = list(agent.stream([HumanMessage(content="Tell me about Heat")]))
+        types = [e["type"] for e in events]
+
+        assert types.index("tool_start") < types.index("tool_end") < types.index("token")
+        assert types[-1] == "final"
+        assert events[types.index("tool_start")]["tool"] == "lookup_movie"
+        assert events[types.index("tool_start")]["args"] == {"title": "Heat"}
+        assert "".join(e["text"] for e in events if e["type"] == "token") == "Heat is great"
+
+        final = events[-1]
+        assert final["content"] == "Heat is great"
+        assert final["timings"]["time_to_first_token"] is not None
+        assert final["timings"]["total_time"] >= final["timings"]["time_to_first_token"]
+
+    def test_astream_matches_stream(self, make_agent):
+        agent, _ = make_agent([AIMessage(content="Hello there")])
+
+        async def collect():
+            return [e async for e in agent.astream([HumanMessage(content="hi")])]
+
+        events = asyncio.run(collect())
+        assert events[-1]["type"] == "final"
+        assert events[-1]["content"] == "Hello there"
+
+
+class TestAsync:
+    def test_ainvoke_runs_async_tools(self, make_agent):
+        from agent.movie_agent import with_async
+
+        calls = []
+
+        @tool
+        def lookup_year(title: str) -> dict:
+            """Look up a movie's release year."""
+            calls.append(title)
+            return {"title": title, "year": 1995}
+
+        agent, stub = make_agent(
+            [
+                tool_call_message("lookup_year", {"title": "Heat"}),
+                AIMessage(content="Heat came out in 1995."),
+            ],
+            tools=(with_async(lookup_year),),
+        )
+        result = asyncio.run(agent.ainvoke([HumanMessage(content="When was Heat released?")]))
+
+        assert result.content == "Heat came out in 1995."
+        assert calls == ["Heat"]
+        assert len(stub.calls) == 2
+
+
+class TestContextBudget:
+    def test_old_history_left_out_to_fit_budget(self, make_agent):
+        agent, stub = make_agent([AIMessage(content="Sure.")], context_token_budget=None)
+        agent.context_token_budget = agent.prompt_overhead_tokens + 30
+        history = [
+            HumanMessage(content="Tell me about Heat " + "x" * 1000),
+            AIMessage(content="Heat is a 1995 crime film."),
+            HumanMessage(content="Add it"),
+        ]
+        agent.invoke(history)
+
+        sent = [m.content for m in stub.calls[0]["messages"] if m.type != "system"]
+        # The long opener doesn't fit, and the reply to it can't open the prompt on its own
+        assert sent == ["Add it"]
+
+
+class TestContextSections:
+    def test_sections_are_appended_to_system_prompt(self, make_agent):
+        agent, stub = make_agent([AIMessage(content="Added.")])
+        agent.invoke(
+            [HumanMessage(content="Add it to my watchlist")],
+            context_sections={"Conversation summary": "Movies discussed: Heat (1995) [trakt_id 1]"},
+        )
+
+        system = stub.calls[0]["messages"][0]
+        assert system.type == "system"
+        assert system.content.startswith("You are a movie agent.")
+        assert "## Conversation summary\nMovies discussed: Heat (1995) [trakt_id 1]" in system.content
+        assert [m.type for m in stub.calls[0]["messages"]].count("system") == 1
+
+    def test_session_id_bound_while_tools_run(self, make_agent):
+        from agent.movie_agent import with_async
+        from agent.utils.session_store import CURRENT_SESSION_ID
+
+        seen = []
+
+        @tool
+        def whoami() -> str:
+            """Report the current session."""
+            seen.append(CURRENT_SESSION_ID.get())
+            return "ok"
+
+        responses = [tool_call_message("whoami", {}), AIMessage(content="Done.")]
+        agent, _ = make_agent(list(responses), tools=(with_async(whoami),))
+        agent.invoke([HumanMessage(content="who am i")], session_id="sync-session")
+
+        agent, _ = make_agent(list(responses), tools=(with_async(whoami),))
+        asyncio.run(agent.ainvoke([HumanMessage(content="who am i")], session_id="async-session"))
+
+        assert seen == ["sync-session", "async-session"]
+        assert CURRENT_SESSION_ID.get() is None
+
+
+class TestPromptCaching:
+    def test_stable_prefix_marked_and_cache_usage_surfaced(self, make_agent):
+        usage = {
+            "input_tokens": 1500,
+            "output_tokens": 20,
+            "total_tokens": 1520,
+            "input_token_details": {"cache_read": 1200, "cache_creation": 0},
+        }
+        agent, stub = make_agent(
+            [
+                tool_call_message("lookup_movie", {"title": "Heat"}),
+                AIMessage(content="Heat (1995).", usage_metadata=usage),
+            ],
+            prompt_caching=True,
+            cached_sections=("Conversation summary",),
+        )
+        stub.require_cache_markers = True
+
+        events = list(agent.stream(
+            [HumanMessage(content="Tell me about Heat")],
+            context_sections={
+                "Known movies": "Heat (1995): 1",
+                "Conversation summary": "User likes crime films",
+            },
+        ))
+
+        system_blocks = stub.calls[0]["messages"][0].content
+        assert [b.get("cache_control") is not None for b in system_blocks] == [True, True, False]
+        # Cached summary comes before the per-turn sections
+        assert "Conversation summary" in system_blocks[1]["text"]
+        assert "Known movies" in system_blocks[2]["text"]
+        assert stub.bound_tools[-1]["name"] == "lookup_movie"
+
+        final_usage = events[-1]["usage"]
+        assert final_usage["cache_read_tokens"] == 1200
+        assert final_usage["cache_creation_tokens"] == 0
+
+    def test_stub_rejects_calls_without_markers(self, make_agent):
+        agent, stub = make_agent([AIMessage(content="Hi")], prompt_caching=False)
+        stub.require_cache_markers = True
+        with pytest.raises(ValueError):
+            agent.invoke([HumanMessage(content="hi")])
+
+
+@tool
+def trending_rendered() -> dict:
+    """Trending movies, rendered locally."""
+    return {"status": "success", "action_prompt": "Introduce it.", "rendered_markdown": "1. **Heat** (1995)"}
+
+
+class TestLocalRendering:
+    def test_rendered_result_hidden_from_model_and_shown_below_reply(self, make_agent):
+        agent, stub = make_agent([
+            tool_call_message("trending_rendered", {}),
+            AIMessage(content="Here's what's trending:"),
+        ], tools=(trending_rendered,))
+        events = list(agent.stream([HumanMessage(content="What's trending?")]))
+
+        assert events[-1]["content"] == "Here's what's trending:\n\n1. **Heat** (1995)"
+        tool_message = stub.calls[1]["messages"][-1]
+        assert "rendered_markdown" not in tool_message.content
+        assert "Introduce it." in tool_message.content
+
+
+@tool
+def list_trending() -> dict:
+    """List trending movies."""
+    return {"movies": []}
+
+
+class TestToolSelection:
+    def test_only_selected_tools_offered_and_counted(self, make_agent):
+        agent, stub = make_agent([AIMessage(content="Hi!")], tools=(lookup_movie, list_trending))
+        events = list(agent.stream([HumanMessage(content="hello")], tool_names=["list_trending"]))
+
+        assert [t.name for t in stub.bound_tools] == ["list_trending"]
+        assert events[-1]["tool_schema_tokens"] == agent.tool_schema_tokens["list_trending"]
+        assert 0 < agent.schema_tokens(["list_trending"]) < agent.schema_tokens()
+
+    def test_unselected_tool_still_runs_if_called(self, make_agent):
+        agent, _ = make_agent([
+            tool_call_message("lookup_movie", {"title": "Heat"}),
+            AIMessage(content="Heat (1995)."),
+        ], tools=(lookup_movie, list_trending))
+        result = agent.invoke([HumanMessage(content="Heat?")], tool_names=["list_trending"])
+        assert result.content == "Heat (1995)."
+
+
+@tool
+def slow_details(title: str) -> dict:
+    """Slow movie lookup."""
+    time.sleep(0.3)
+    return {"title": title}
+
+
+@tool
+def broken_lookup(title: str) -> dict:
+    """Lookup that fails."""
+    raise RuntimeError("Trakt is down")
+
+
+def parallel_calls_message() -> AIMessage:
+    return AIMessage(content="", tool_calls=[
+        {"name": "slow_details", "args": {"title": "Heat"}, "id": "call_1"},
+        {"name": "broken_lookup", "args": {"title": "Dune"}, "id": "call_2"},
+        {"name": "slow_details", "args": {"title": "Alien"}, "id": "call_3"},
+    ])
+
+
+class TestParallelTools:
+    def test_calls_run_concurrently_in_order_with_errors_isolated(self, make_agent):
+        agent, stub = make_agent(
+            [parallel_calls_message(), AIMessage(content="Two of three found.")],
+            tools=(slow_details, broken_lookup),
+        )
+        started = time.perf_counter()
+        events = list(agent.stream([HumanMessage(content="Heat, Dune and Alien?")]))
+        elapsed = time.perf_counter() - started
+
+        assert elapsed < 0.55
+        assert events[-1]["content"] == "Two of three found."
+        tool_messages = stub.calls[1]["messages"][-3:]
+        assert [m.tool_call_id for m in tool_messages] == ["call_1", "call_2", "call_3"]
+        assert [m.status for m in tool_messages] == ["success", "error", "success"]
+        assert "Trakt is down" in tool_messages[1].content
+
+        ends = [e for e in events if e["type"] == "tool_end"]
+        assert all(e["duration"] is not None for e in ends)
+        stats = agent.tool_stats()
+        assert stats["slow_details"]["calls"] == 2 and stats["slow_details"]["max_seconds"] >= 0.3
+        assert stats["broken_lookup"]["errors"] == 1
+
+    def test_async_calls_run_concurrently(self, make_agent):
+        from agent.movie_agent import with_async
+
+        agent, _ = make_agent(
+            [parallel_calls_message(), AIMessage(content="Done.")],
+            tools=(with_async(slow_details), with_async(broken_lookup)),
+        )
+        started = time.perf_counter()
+        result = asyncio.run(agent.ainvoke([HumanMessage(content="Heat, Dune and Alien?")]))
+
+        assert result.content == "Done."
+        assert time.perf_counter() - started < 0.55
+
+    def test_max_concurrency_limits_parallel_calls(self, make_agent):
+        agent, _ = make_agent(
+            [parallel_calls_message(), AIMessage(content="Done.")],
+            tools=(slow_details, broken_lookup),
+            max_tool_concurrency=1,
+        )
+        started = time.perf_counter()
+        agent.invoke([HumanMessage(content="Heat, Dune and Alien?")])
+        assert time.perf_counter() - started >= 0.6
+
+
+@pytest.fixture
+def make_tiered_agent(monkeypatch):
+    """Build an LLMAgent with a routing stub and a separate response stub."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+    def _make(routing_responses, response_responses, tools=(lookup_movie,)):
+        llm_client = LLMClient(provider="anthropic", response_cache=None)
+        llm_client.client = StubChatModel(responses=list(routing_responses))
+        response_client = LLMClient(provider="anthropic", response_cache=None)
+        response_client.client = StubChatModel(responses=list(response_responses))
+        agent = LLMAgent(
+            llm_client=llm_client,
+            system_prompt="You are a movie agent.",
+            tools=list(tools),
+            response_client=response_client,
+        )
+        return agent, llm_client.client, response_client.client
+
+    return _make
+
+
+class TestModelTiers:
+    def test_tool_decision_on_routing_model_reply_on_response_model(self, make_tiered_agent):
+        agent, routing, response = make_tiered_agent(
+            [tool_call_message("lookup_movie", {"title": "Heat"})],
+            [AIMessage(content="Heat (1995) is a crime epic.", usage_metadata={
+                "input_tokens": 200, "output_tokens": 12, "total_tokens": 212,
+            })],
+        )
+        result = agent.invoke([HumanMessage(content="Tell me about Heat")])
+
+        assert result.content == "Heat (1995) is a crime epic."
+        assert len(routing.calls) == 1 and len(response.calls) == 1
+        # The response model gets the tool result to write from
+        assert response.calls[0]["messages"][-1].type == "tool"
+        stats = agent.tier_stats()
+        assert stats["tiers"]["routing"]["calls"] == 1
+        assert stats["tiers"]["response"]["output_tokens"] == 12
+        assert stats["escalations"] == {}
+
+    def test_direct_answer_stays_on_routing_model(self, make_tiered_agent):
+        agent, routing, response = make_tiered_agent([AIMessage(content="Hi! Ask me about movies.")], [])
+        result = agent.invoke([HumanMessage(content="Hello")])
+
+        assert result.content == "Hi! Ask me about movies."
+        assert response.calls == []
+
+    def test_locally_rendered_results_stay_on_routing_model(self, make_tiered_agent):
+        agent, routing, response = make_tiered_agent(
+            [tool_call_message("trending_rendered", {}), AIMessage(content="Here's what's hot:")],
+            [],
+            tools=(trending_rendered,),
+        )
+        result = agent.invoke([HumanMessage(content="What's trending?")])
+
+        assert result.content.startswith("Here's what's hot:")
+        assert len(routing.calls) == 2 and response.calls == []
+
+    @pytest.mark.parametrize("unusable, reason", [
+        (tool_call_message("search_everything", {"q": "Heat"}), "unknown_tool"),
+        (AIMessage(content=""), "empty"),
+        (AIMessage(content="", invalid_tool_calls=[
+            {"name": "lookup_movie", "args": "{\"title\": ", "id": "call_1", "error": "bad json", "type": "invalid_tool_call"},
+        ]), "malformed_tool_call"),
+    ])
+    def test_unusable_routing_answer_escalates(self, make_tiered_agent, unusable, reason):
+        agent, routing, response = make_tiered_agent(
+            [unusable],
+            [tool_call_message("lookup_movie", {"title": "Heat"}), AIMessage(content="Heat it is.")],
+        )
+        result = agent.invoke([HumanMessage(content="Tell me about Heat")])
+
+        assert result.content == "Heat it is."
+        assert len(routing.calls) == 1 and len(response.calls) == 2
+        assert agent.tier_stats()["escalations"] == {reason: 1}
+
+    def test_streamed_turn_uses_both_tiers(self, make_tiered_agent):
+        agent, routing, response = make_tiered_agent(
+            [tool_call_message("lookup_movie", {"title": "Heat"})],
+            [AIMessage(content="Heat is great.")],
+        )
+        events = list(agent.stream([HumanMessage(content="Tell me about Heat")]))
+
+        assert "".join(e["text"] for e in events if e["type"] == "token") == "Heat is great."
+        assert events[-1]["content"] == "Heat is great."
+        assert agent.tier_stats()["tiers"]["response"]["calls"] == 1
+
+
+def looping_calls(count: int) -> list:
+    """A model that keeps searching: `count` single lookup_movie calls."""
+    return [tool_call_message("lookup_movie", {"title": f"Heat {i}"}, f"call_{i}") for i in range(count)]
+
+
+class TestTurnBudgets:
+    def test_step_limit_forces_final_answer(self, make_agent):
+        agent, stub = make_agent(
+            [*looping_calls(2), AIMessage(content="Heat (1995) is the one you mean.")],
+            max_steps=3, max_tool_calls=0, max_turn_tokens=0,
+        )
+        result = agent.invoke([HumanMessage(content="Tell me about Heat")])
+
+        assert result.content == "Heat (1995) is the one you mean."
+        assert len(stub.calls) == 3
+        # Only the last call has tools disabled and is told to wrap up
+        assert "tool_choice" not in stub.calls[1]["kwargs"]
+        assert stub.calls[2]["kwargs"]["tool_choice"] == "none"
+        assert "Do not call any more tools" in stub.calls[2]["messages"][0].content
+        assert agent.budget_stats()["trips"] == {"steps": 1, "tool_calls": 0, "tokens": 0}
+
+    def test_tool_calls_over_allowance_are_dropped(self, make_agent):
+        three_calls = AIMessage(content="", tool_calls=[
+            {"name": "lookup_movie", "args": {"title": title}, "id": f"call_{title}"}
+            for title in ["Heat", "Dune", "Alien"]
+        ])
+        agent, stub = make_agent(
+            [three_calls, AIMessage(content="Heat and Dune are both great.")],
+            max_steps=0, max_tool_calls=2, max_turn_tokens=0,
+        )
+        result = agent.invoke([HumanMessage(content="Heat, Dune and Alien?")])
+
+        assert result.content == "Heat and Dune are both great."
+        tool_results = [m for m in stub.calls[1]["messages"] if m.type == "tool"]
+        assert [m.tool_call_id for m in tool_results] == ["call_Heat", "call_Dune"]
+        assert stub.calls[1]["kwargs"]["tool_choice"] == "none"
+        # One turn over one limit is one trip, however many calls were dropped
+        assert agent.budget_stats()["trips"] == {"steps": 0, "tool_calls": 1, "tokens": 0}
+
+    def test_token_limit_and_ignored_wrap_up(self, make_agent):
+        expensive = tool_call_message("lookup_movie", {"title": "Heat"})
+        expensive.usage_metadata = {"input_tokens": 900, "output_tokens": 200, "total_tokens": 1100}
+        # The model ignores the wrap-up and asks for another tool: the turn still ends
+        agent, stub = make_agent(
+            [expensive, *looping_calls(1)],
+            max_steps=0, max_tool_calls=0, max_turn_tokens=1000,
+        )
+        result = agent.invoke([HumanMessage(content="Tell me about Heat")])
+
+        assert len(stub.calls) == 2
+        assert result.content.startswith("Sorry, I couldn't finish")
+        assert agent.budget_stats()["trips"]["tokens"] == 1
+
+    def test_final_call_disables_tools_in_each_backends_form(self, monkeypatch):
+        from agent.llm.failover import FailoverChatModel
+
+        class AnthropicStub(StubChatModel):
+            @property
+            def _llm_type(self) -> str:
+                return "anthropic-chat"
+
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        anthropic = AnthropicStub(responses=[*looping_calls(1), AIMessage(content="Heat (1995).")])
+        other = StubChatModel(responses=[])
+        llm_client = LLMClient(provider="anthropic", response_cache=None, admission=None)
+        llm_client.client = FailoverChatModel.from_backends({"anthropic": anthropic, "other": other})
+        agent = LLMAgent(
+            llm_client=llm_client,
+            system_prompt="You are a movie agent.",
+            tools=[lookup_movie],
+            max_steps=0, max_tool_calls=1, max_turn_tokens=0,
+        )
+        assert llm_client.client._llm_type == "failover-chat"
+
+        result = agent.invoke([HumanMessage(content="Tell me about Heat")])
+
+        assert result.content == "Heat (1995)."
+        assert anthropic.calls[1]["kwargs"]["tool_choice"] == {"type": "none"}
+        # The other provider would get the string form
+        bound = llm_client.client.bind_tools([lookup_movie], tool_choice="none")
+        assert [b.kwargs["tool_choice"] for b in bound.backends] == [{"type": "none"}, "none"]
+
+    def test_budget_resets_each_turn(self, make_agent):
+        agent, stub = make_agent(
+            [*looping_calls(1), AIMessage(content="Heat."), *looping_calls(1), AIMessage(content="Dune.")],
+            max_steps=0, max_tool_calls=1, max_turn_tokens=0,
+        )
+        first = agent.invoke([HumanMessage(content="Heat?")])
+        history = [HumanMessage(content="Heat?"), *looping_calls(1), first, HumanMessage(content="Dune?")]
+        second = agent.invoke(history)
+
+        assert second.content == "Dune."
+        assert "tool_choice" not in stub.calls[2]["kwargs"]
+
+    def test_recursion_limit_backstop(self, make_agent):
+        agent, _ = make_agent([], max_steps=4)
+        assert agent.run_config["recursion_limit"] == 13
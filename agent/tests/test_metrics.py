@@ -0,0 +1,105 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.llm.llm_agent import LLMAgent
+from agent.llm.llm_client import LLMClient
+from agent.logic.services.trakt.get_movies import MOVIE_METADATA_CACHE
+from agent.tests.test_tracing import lookup_movie
+from agent.tests.test_variables import StubChatModel
+from agent.utils.metrics import (
+    METRICS,
+    TOOL_DURATION,
+    TRAKT_REQUEST_DURATION,
+    TURN_TOKENS,
+    MetricsRegistry,
+)
+
+
+def count(histogram, **labels) -> int:
+    series = histogram.value(**labels)
+    return series["count"] if series else 0
+
+
+class TestRegistry:
+    def test_renders_prometheus_text(self):
+        registry = MetricsRegistry()
+        lookups = registry.counter("lookups_total", "Lookups.", ["cache"])
+        sessions = registry.gauge("sessions", "Sessions.")
+        latency = registry.histogram("latency_seconds", "Latency.", ["tool"], buckets=(0.1, 1.0))
+
+        lookups.inc(cache='say "hi"')
+        sessions.set_function(lambda: 3)
+        for seconds in (0.05, 0.5, 2.0):
+            latency.observe(seconds, tool="get_trending")
+
+        assert registry.render().splitlines() == [
+            "# HELP lookups_total Lookups.",
+            "# TYPE lookups_total counter",
+            'lookups_total{cache="say \\"hi\\""} 1',
+            "# HELP sessions Sessions.",
+            "# TYPE sessions gauge",
+            "sessions 3",
+            "# HELP latency_seconds Latency.",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{tool="get_trending",le="0.1"} 1',
+            'latency_seconds_bucket{tool="get_trending",le="1"} 2',
+            'latency_seconds_bucket{tool="get_trending",le="+Inf"} 3',
+            'latency_seconds_sum{tool="get_trending"} 2.55',
+            'latency_seconds_count{tool="get_trending"} 3',
+        ]
+
+    def test_rejects_wrong_labels_and_kinds(self):
+        registry = MetricsRegistry()
+        lookups = registry.counter("lookups_total", "Lookups.", ["cache"])
+        with pytest.raises(ValueError):
+            lookups.inc(tool="x")
+        assert registry.counter("lookups_total", "Lookups.", ["cache"]) is lookups
+        with pytest.raises(ValueError):
+            registry.gauge("lookups_total", "Lookups.")
+
+    def test_failing_source_is_skipped(self):
+        registry = MetricsRegistry()
+        registry.gauge("queue_depth", "Depth.").set_function(lambda: 1 / 0)
+        assert registry.render().splitlines()[-1] == "# TYPE queue_depth gauge"
+
+
+class TestInstrumentation:
+    def test_agent_turn_records_tools_trakt_and_tokens(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        llm_client = LLMClient(provider="anthropic", response_cache=None, admission=None)
+        llm_client.client = StubChatModel(responses=[
+            AIMessage(content="", tool_calls=[{"name": "lookup_movie", "args": {"title": "Heat"}, "id": "call_1"}],
+                      usage_metadata={"input_tokens": 300, "output_tokens": 20, "total_tokens": 320}),
+            AIMessage(content="Heat is a 1995 crime film.",
+                      usage_metadata={"input_tokens": 400, "output_tokens": 30, "total_tokens": 430}),
+        ])
+        agent = LLMAgent(llm_client=llm_client, system_prompt="You are a movie agent.", tools=[lookup_movie])
+        tools_before = count(TOOL_DURATION, tool="lookup_movie", status="success")
+        trakt_before = count(TRAKT_REQUEST_DURATION, method="GET", endpoint="/movies/{id}/people", status="200")
+        tokens_before = TURN_TOKENS.value(route="agent", direction="input") or {"sum": 0}
+
+        result = agent.invoke([HumanMessage(content="Tell me about Heat")])
+
+        assert count(TOOL_DURATION, tool="lookup_movie", status="success") == tools_before + 1
+        assert count(TRAKT_REQUEST_DURATION, method="GET", endpoint="/movies/{id}/people", status="200") == trakt_before + 1
+        # Tokens of every model call in the turn, not only the final one
+        assert TURN_TOKENS.value(route="agent", direction="input")["sum"] == tokens_before["sum"] + 700
+        # The final call's usage is returned rather than dropped
+        assert result.response_metadata["usage"]["output_tokens"] == 30
+
+    def test_cache_lookups_and_gauges_are_read_on_render(self):
+        MOVIE_METADATA_CACHE.get(-1)
+        rendered = METRICS.render()
+
+        misses = next(
+            line for line in rendered.splitlines()
+            if line.startswith('movie_agent_cache_lookups_total{cache="movie_metadata",result="miss"}')
+        )
+        assert int(misses.split()[-1]) >= 1
+        assert "movie_agent_active_sessions " in rendered
+        assert 'movie_agent_queue_depth{queue="blocking_io"} 0' in rendered
@@ -0,0 +1,82 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from agent.logic.render import (
+    WRAPPER_PROMPT,
+    render_list_action_result,
+    render_locally,
+    render_movie_details,
+    render_movie_list,
+)
+from agent.models import Movie, MovieList, TraktListActionResult
+
+INCEPTION = Movie(
+    title="Inception",
+    year=2010,
+    runtime=148,
+    trakt_rating=8.8,
+    release_date="2010-07-16",
+    director="Christopher Nolan",
+    cast=["Leonardo DiCaprio", "Joseph Gordon-Levitt", "Elliot Page", "Tom Hardy"],
+    genres=["science-fiction", "action"],
+    description="A thief steals secrets from dreams. " * 20,
+    trailer="https://youtube.com/watch?v=YoHD9XEInc0",
+    comments=["Loved it!"],
+)
+
+
+class TestRenderMovieList:
+    def test_numbered_capsules_with_trailer_last(self):
+        text = render_movie_list(MovieList(movies=[INCEPTION, Movie(title="Heat", year=1995)]))
+        first, second = text.split("\n\n")
+
+        assert first.startswith("1. **Inception** (2010)\n   148 min · ★ 8.8/10 · Released 2010-07-16")
+        assert "Directed by Christopher Nolan · Starring Leonardo DiCaprio, Joseph Gordon-Levitt, Elliot Page\n" in first
+        assert "Tom Hardy" not in first
+        assert first.endswith("   https://youtube.com/watch?v=YoHD9XEInc0")
+        assert len(first) < 600  # description abridged
+        assert second == "2. **Heat** (1995)"
+
+    def test_empty_list(self):
+        assert render_movie_list(MovieList()) == "No movies found."
+
+
+class TestRenderOther:
+    def test_movie_details_keeps_description_and_comments(self):
+        text = render_movie_details(INCEPTION)
+        assert INCEPTION.description.strip() in text
+        assert 'People say:\n> "Loved it!"\n\nhttps://youtube.com' in text
+        assert text.endswith("Want me to add it to your Trakt watchlist?")
+
+    def test_list_action_result(self):
+        result = TraktListActionResult(
+            action_name="remove_to_list",
+            target_list="watchlist",
+            action_success=True,
+            successfully_updated_titles=["Heat"],
+            non_updated_error_titles=["Dune"],
+            message="",
+        )
+        assert render_list_action_result(result) == (
+            "Removed from your watchlist: **Heat**\n\nCouldn't update your watchlist: **Dune**"
+        )
+
+
+class TestRenderLocally:
+    def test_selected_action_gets_markdown_and_wrapper_prompt(self):
+        result = render_locally(
+            {"action_name": "GetTrending", "status": "success", "action_prompt": "Format it."},
+            MovieList(movies=[INCEPTION]),
+            actions=["GetTrending"],
+        )
+        assert result["action_prompt"] == WRAPPER_PROMPT
+        assert result["rendered_markdown"].startswith("1. **Inception**")
+
+    def test_other_actions_and_unrenderable_results_untouched(self):
+        tool_result = {"action_name": "GetUserList", "status": "success", "action_prompt": "Format it."}
+        assert render_locally(tool_result, MovieList(), actions=["GetTrending"]) == tool_result
+        assert render_locally({**tool_result, "action_name": "GetTrending"}, None, actions=["GetTrending"]) == {
+            **tool_result, "action_name": "GetTrending"
+        }
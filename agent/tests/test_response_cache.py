@@ -0,0 +1,74 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent.llm.llm_client import LLMClient
+from agent.llm.response_cache import LLMResponseCache
+from agent.tests.test_variables import StubChatModel
+
+USAGE = {"input_tokens": 120, "output_tokens": 8, "total_tokens": 128}
+
+
+def json_response(text: str) -> AIMessage:
+    return AIMessage(content=text, usage_metadata=USAGE)
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+    def _make_client(responses, cache):
+        llm_client = LLMClient(provider="anthropic", response_cache=cache)
+        llm_client.client = StubChatModel(responses=list(responses))
+        return llm_client, llm_client.client
+
+    return _make_client
+
+
+class TestLLMResponseCache:
+    def test_repeated_json_query_served_from_cache(self, make_client):
+        cache = LLMResponseCache()
+        client, stub = make_client([json_response('{"title": "Inception"}')], cache)
+
+        for _ in range(3):
+            assert client.query("system", "fix this title", expect_json=True) == {"title": "Inception"}
+
+        assert len(stub.calls) == 1
+        stats = cache.stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["saved_input_tokens"] == 240
+        assert stats["saved_output_tokens"] == 16
+
+    def test_high_temperature_text_is_not_cached(self, make_client):
+        cache = LLMResponseCache(max_temperature=0.2)
+        client, stub = make_client([json_response("one"), json_response("two")], cache)
+
+        assert client.query("system", "say something", temperature=0.7) == "one"
+        assert client.query("system", "say something", temperature=0.7) == "two"
+        assert cache.stats()["hits"] + cache.stats()["misses"] == 0
+
+    def test_malformed_json_is_not_cached(self, make_client):
+        cache = LLMResponseCache()
+        client, stub = make_client([json_response("not json"), json_response('{"ok": true}')], cache)
+
+        with pytest.warns(UserWarning):
+            client.query("system", "prompt", expect_json=True)
+        assert client.query("system", "prompt", expect_json=True) == {"ok": True}
+        assert len(stub.calls) == 2
+
+    def test_sqlite_tier_survives_a_new_cache(self, tmp_path):
+        path = str(tmp_path / "llm_cache.sqlite3")
+        key = LLMResponseCache.make_key("anthropic", "model", 0.0, "system", "user")
+        LLMResponseCache(sqlite_path=path).set(key, '{"a": 1}', input_tokens=50, output_tokens=5)
+
+        fresh = LLMResponseCache(sqlite_path=path)
+        assert fresh.get(key)["content"] == '{"a": 1}'
+        assert fresh.stats()["sqlite_hits"] == 1
+
+        expired = LLMResponseCache(sqlite_path=path, ttl_seconds=-1)
+        assert expired.get(key) is None
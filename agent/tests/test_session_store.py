@@ -0,0 +1,60 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.utils.session_store import ConversationStore, message_size
+
+
+class TestConversationStore:
+    def test_sessions_are_isolated_and_ring_buffered(self):
+        store = ConversationStore(max_messages=3)
+        for i in range(5):
+            store.append("a", HumanMessage(content=f"a{i}"))
+        store.append("b", AIMessage(content="b0"))
+
+        assert [m.content for m in store.history("a")] == ["a2", "a3", "a4"]
+        assert [m.content for m in store.history("a", last=2)] == ["a3", "a4"]
+        assert [m.content for m in store.history("b")] == ["b0"]
+        assert store.stats()["bytes"] == sum(
+            message_size(m) for m in store.history("a") + store.history("b")
+        )
+
+    def test_idle_sessions_expire(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("agent.utils.session_store.time.monotonic", lambda: now[0])
+        store = ConversationStore(idle_ttl_seconds=60)
+        store.append("old", HumanMessage(content="hi"))
+        now[0] += 61
+        store.append("new", HumanMessage(content="hello"))
+
+        stats = store.stats()
+        assert stats["sessions"] == 1
+        assert stats["evicted_idle"] == 1
+        assert store.history("old") == []
+
+    def test_least_recently_used_session_evicted_over_caps(self):
+        store = ConversationStore(max_sessions=2)
+        store.append("a", HumanMessage(content="a"))
+        store.append("b", HumanMessage(content="b"))
+        store.history("a")  # "a" is now more recent than "b"
+        store.append("c", HumanMessage(content="c"))
+
+        assert store.history("b") == []
+        assert store.stats()["evicted_lru"] == 1
+
+        store = ConversationStore(max_bytes=10)
+        store.append("a", HumanMessage(content="x" * 6))
+        store.append("b", HumanMessage(content="y" * 6))
+        assert store.history("a") == []
+        assert store.stats()["bytes"] == 6
+
+    def test_oversized_session_trims_its_oldest_messages(self):
+        store = ConversationStore(max_bytes=10)
+        for content in ("aaaa", "bbbb", "cccc"):
+            store.append("a", HumanMessage(content=content))
+
+        assert [m.content for m in store.history("a")] == ["bbbb", "cccc"]
+        assert store.stats()["trimmed_messages"] == 1
@@ -0,0 +1,81 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import json
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.llm.llm_client import LLMClient
+from agent.llm.summarizer import SUMMARY_SECTION, ConversationSummarizer, render_summary
+from agent.tests.test_variables import StubChatModel
+from agent.utils.session_store import ConversationStore
+
+SUMMARY_JSON = {
+    "movies": [{"title": "Inception", "year": 2010, "trakt_id": 16662}],
+    "preferences": ["likes sci-fi"],
+    "notes": "",
+}
+
+
+@pytest.fixture
+def make_summarizer(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+    def _make_summarizer(responses, **kwargs):
+        llm_client = LLMClient(provider="anthropic", response_cache=None)
+        llm_client.client = StubChatModel(responses=list(responses))
+        store = ConversationStore()
+        summarizer = ConversationSummarizer(lambda: llm_client, store=store, **kwargs)
+        return summarizer, store, llm_client.client
+
+    return _make_summarizer
+
+
+def add_turns(store, session_id, count):
+    for i in range(count):
+        store.append(session_id, HumanMessage(content=f"question {i}"))
+        store.append(session_id, AIMessage(content=f"answer {i}"))
+
+
+class TestConversationSummarizer:
+    def test_folds_older_turns_and_keeps_recent_verbatim(self, make_summarizer):
+        summarizer, store, stub = make_summarizer(
+            [AIMessage(content=json.dumps(SUMMARY_JSON))], keep_recent=2, min_new_messages=2
+        )
+        add_turns(store, "s", 3)
+
+        assert summarizer.update("s") is True
+        assert "question 0" in stub.calls[0]["messages"][-1].content
+        assert "question 2" not in stub.calls[0]["messages"][-1].content
+
+        assert [m.content for m in store.history("s", include_summarized=False)] == [
+            "question 2", "answer 2"
+        ]
+        assert summarizer.context_sections("s") == {
+            SUMMARY_SECTION: "Movies discussed: Inception (2010) [trakt_id 16662]\n"
+                             "User preferences: likes sci-fi"
+        }
+
+    def test_no_update_until_enough_older_messages(self, make_summarizer):
+        summarizer, store, stub = make_summarizer([], keep_recent=6, min_new_messages=4)
+        add_turns(store, "s", 4)  # 8 messages: only 2 older than the recent window
+
+        assert summarizer.update("s") is False
+        assert stub.calls == []
+        assert summarizer.context_sections("s") == {}
+
+    def test_schedule_runs_in_background(self, make_summarizer):
+        summarizer, store, _ = make_summarizer(
+            [AIMessage(content=json.dumps(SUMMARY_JSON))], keep_recent=0, min_new_messages=1
+        )
+        add_turns(store, "s", 1)
+
+        assert summarizer.schedule("s").result(timeout=5) is True
+        assert "Inception" in store.summary("s")
+
+
+class TestRenderSummary:
+    def test_skips_missing_fields(self):
+        assert render_summary({"movies": [{"title": "Heat"}], "preferences": []}) == "Movies discussed: Heat"
@@ -0,0 +1,52 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.llm import tokens
+from agent.llm.tokens import MESSAGE_OVERHEAD_TOKENS, estimate_tokens, select_history
+
+
+class TestEstimateTokens:
+    def test_estimate_scales_with_length(self):
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("a" * 35, chars_per_token=3.5) == 10
+        assert estimate_tokens("a" * 36, chars_per_token=3.5) == 11
+
+
+class TestSelectHistory:
+    def test_packs_most_recent_messages_into_budget(self):
+        messages = [
+            HumanMessage(content="x" * 700),   # ~200 tokens
+            AIMessage(content="y" * 700),
+            HumanMessage(content="short"),
+            AIMessage(content="reply"),
+            HumanMessage(content="latest"),
+        ]
+        selected = select_history(messages, budget_tokens=50)
+        assert [m.content for m in selected] == ["short", "reply", "latest"]
+
+    def test_latest_message_kept_even_over_budget(self):
+        selected = select_history([HumanMessage(content="z" * 7000)], budget_tokens=10)
+        assert len(selected) == 1
+
+    def test_selection_never_starts_with_assistant_message(self):
+        messages = [
+            HumanMessage(content="x" * 700),
+            AIMessage(content="ok"),
+            HumanMessage(content="next"),
+        ]
+        budget = 2 * MESSAGE_OVERHEAD_TOKENS + 2
+        assert [m.content for m in select_history(messages, budget)] == ["next"]
+
+
+class TestCalibration:
+    def test_records_actual_per_estimated(self, monkeypatch):
+        monkeypatch.setattr(tokens, "_calibration", {"turns": 0, "estimated_tokens": 0, "actual_tokens": 0})
+        tokens.record_usage(100, 120)
+        tokens.record_usage(100, None)
+        stats = tokens.calibration_stats()
+        assert stats["turns"] == 1
+        assert stats["actual_per_estimated"] == 1.2
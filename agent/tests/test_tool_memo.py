@@ -0,0 +1,112 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+
+import agent.utils.tool_memo as tool_memo
+from agent.llm.llm_agent import LLMAgent
+from agent.llm.llm_client import LLMClient
+from agent.tests.test_variables import StubChatModel
+from agent.utils.tool_memo import CURRENT_TOOL_MEMO, ToolMemo, forget, memo_for_turn, memoized_call
+
+
+class CountingAction:
+    def __init__(self, delay=0.0, status="success"):
+        self.calls = []
+        self.delay = delay
+        self.status = status
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+        time.sleep(self.delay)
+        return {"status": self.status, "args": kwargs}
+
+
+class TestToolMemo:
+    def test_repeated_normalized_arguments_hit(self):
+        memo, action = ToolMemo(), CountingAction()
+        first = memo.call("details", action, title="The Dark Knight", year=None)
+        again = memo.call("details", action, title="  the dark   KNIGHT ")
+
+        assert again is first
+        assert len(action.calls) == 1
+        memo.call("details", action, title="The Dark Knight", year=2008)
+        assert len(action.calls) == 2
+
+    def test_errors_are_not_stored(self):
+        memo, action = ToolMemo(), CountingAction(status="error")
+        memo.call("details", action, title="Heat")
+        memo.call("details", action, title="Heat")
+        assert len(action.calls) == 2
+
+    def test_concurrent_identical_calls_share_one_run(self):
+        memo, action = ToolMemo(), CountingAction(delay=0.2)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(lambda _: memo.call("details", action, title="Heat"), range(3)))
+
+        assert len(action.calls) == 1
+        assert all(r is results[0] for r in results)
+
+    def test_memoized_call_uses_bound_memo_and_forget(self):
+        action = CountingAction()
+        memoized_call("list", action, page=1)
+        memoized_call("list", action, page=1)
+        assert len(action.calls) == 2  # no memo bound
+
+        token = CURRENT_TOOL_MEMO.set(ToolMemo())
+        try:
+            memoized_call("list", action, page=1)
+            memoized_call("list", action, page=1)
+            assert len(action.calls) == 3
+            forget("list")
+            memoized_call("list", action, page=1)
+            assert len(action.calls) == 4
+        finally:
+            CURRENT_TOOL_MEMO.reset(token)
+
+    def test_scopes(self, monkeypatch):
+        assert memo_for_turn("s") is not memo_for_turn("s")
+        monkeypatch.setattr(tool_memo, "TOOL_MEMO_SCOPE", "session")
+        assert memo_for_turn("s") is memo_for_turn("s")
+        monkeypatch.setattr(tool_memo, "TOOL_MEMO_ENABLED", False)
+        assert memo_for_turn("s") is None
+
+
+SEARCHES = CountingAction()
+
+
+@tool
+def movie_details(title: str) -> dict:
+    """Look up a movie."""
+    return memoized_call("movie_details", SEARCHES, title=title)
+
+
+class TestAgentTurnMemo:
+    def test_same_call_twice_in_a_turn_searches_once(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        llm_client = LLMClient(provider="anthropic", response_cache=None)
+        llm_client.client = StubChatModel(responses=[
+            AIMessage(content="", tool_calls=[{"name": "movie_details", "args": {"title": "Heat"}, "id": "1"}]),
+            AIMessage(content="", tool_calls=[{"name": "movie_details", "args": {"title": "heat"}, "id": "2"}]),
+            AIMessage(content="Heat (1995)."),
+            AIMessage(content="", tool_calls=[{"name": "movie_details", "args": {"title": "Heat"}, "id": "3"}]),
+            AIMessage(content="Still Heat."),
+        ])
+        agent = LLMAgent(llm_client=llm_client, system_prompt="s", tools=[movie_details])
+        SEARCHES.calls.clear()
+
+        agent.invoke([HumanMessage(content="Heat?")])
+        assert len(SEARCHES.calls) == 1
+
+        # A new turn starts with an empty memo
+        agent.invoke([HumanMessage(content="Heat again?")])
+        assert len(SEARCHES.calls) == 2
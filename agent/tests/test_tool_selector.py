@@ -0,0 +1,65 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.logic.tool_selector import BROWSING_TOOLS, ToolSelector
+from agent.utils.session_store import ConversationStore
+
+TOOL_NAMES = [
+    "get_trending",
+    "get_movie_details",
+    "get_multiple_movie_details",
+    "get_similar_movies",
+    "get_user_list",
+    "update_watchlist",
+]
+
+
+@pytest.fixture
+def selector():
+    return ToolSelector(TOOL_NAMES, store=ConversationStore())
+
+
+class TestToolSelector:
+    @pytest.mark.parametrize("message, expected", [
+        ("What's trending this week?", ["get_trending", "get_movie_details"]),
+        ("Recommend something similar to Heat", ["get_trending", "get_movie_details", "get_similar_movies"]),
+        ("Recommend me a good movie", ["get_trending", "get_movie_details", "get_similar_movies"]),
+        ("Add Dune to my watchlist", ["get_movie_details", "get_user_list", "update_watchlist"]),
+        ("Compare Heat, Collateral and Thief", ["get_movie_details", "get_multiple_movie_details"]),
+    ])
+    def test_matching_tools_plus_details(self, selector, message, expected):
+        assert selector.select(message) == expected
+
+    @pytest.mark.parametrize("message", [
+        "Take The Dark Knight off my watchlist",
+        "Get rid of Heat, it's on my watchlist",
+        "Please move Blade Runner 2049 onto my watch list",
+        "Cross The Godfather Part II off my list",
+        "Drop Collateral from my watchlist",
+    ])
+    def test_watchlist_changes_offer_update_watchlist(self, selector, message):
+        assert "update_watchlist" in selector.select(message)
+
+    def test_watchlist_reads_do_not_offer_update_watchlist(self, selector):
+        assert selector.select("What's on my watchlist?") == ["get_movie_details", "get_user_list"]
+
+    def test_doubtful_watchlist_turns_offer_every_tool(self, selector):
+        assert selector.select("I want Heat on my watchlist") == TOOL_NAMES
+
+    def test_browsing_turns_never_offer_write_tools(self, selector):
+        names = selector.select("Tell me about Heat")
+        assert set(names) == set(BROWSING_TOOLS)
+        assert "update_watchlist" not in names
+
+    def test_yes_to_a_watchlist_offer_enables_watchlist_tools(self, selector):
+        selector.store.append("s", HumanMessage(content="Tell me about Heat"))
+        selector.store.append("s", AIMessage(content="... Want me to add it to your Trakt watchlist?"))
+        selector.store.append("s", HumanMessage(content="yes please"))
+
+        assert "update_watchlist" in selector.select("yes please", session_id="s")
+        assert selector.stats()["offered_by_tool"]["update_watchlist"] == 1
@@ -0,0 +1,134 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import time
+import threading
+import pytest
+
+from agent.utils.cache import TTLCache, StaleWhileRevalidateCache
+from agent.logic.services.trakt import get_movies
+from agent.models import MovieList
+
+
+def make_entry(trakt_id: int, title: str):
+    movie_data = {
+        "title": title,
+        "year": 2010,
+        "overview": f"{title} overview",
+        "runtime": 120,
+        "ids": {"trakt": trakt_id},
+    }
+    credits = {
+        "cast": [{"person": {"name": f"Actor {i}"}} for i in range(6)],
+        "crew": {"directing": [{"job": "Director", "person": {"name": "Jane Director"}}]},
+    }
+    return movie_data, credits
+
+
+class TestTTLCache:
+    def test_expired_entries_are_misses(self):
+        cache = TTLCache(max_entries=10, ttl_seconds=0.01)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+
+class TestStaleWhileRevalidateCache:
+    def test_serves_stale_copy_while_refreshing(self):
+        calls = []
+        release_refresh = threading.Event()
+
+        def loader(key):
+            calls.append(key)
+            if len(calls) > 1:
+                release_refresh.wait(timeout=5)
+            return len(calls)
+
+        cache = StaleWhileRevalidateCache(loader=loader, soft_ttl_seconds=0)
+        assert cache.get("trending") == 1
+        # Stale: returns the old value immediately and refreshes in the background
+        assert cache.get("trending") == 1
+        in_flight = cache.refresh("trending")
+        assert cache.get("trending") == 1
+
+        release_refresh.set()
+        in_flight.result(timeout=5)
+        assert len(calls) == 2
+        assert cache.get("trending") == 2
+
+    def test_failed_refresh_keeps_stale_copy(self):
+        state = {"fail": False}
+
+        def loader(key):
+            if state["fail"]:
+                raise RuntimeError("Trakt is down")
+            return "fresh"
+
+        cache = StaleWhileRevalidateCache(loader=loader, soft_ttl_seconds=0)
+        assert cache.get("popular") == "fresh"
+
+        state["fail"] = True
+        with pytest.warns(UserWarning):
+            cache.refresh("popular").result(timeout=5)
+        assert cache.get("popular") == "fresh"
+        assert cache.refresh_failures == 1
+
+
+class TestQueryTopTraktMoviesCache:
+    def setup_method(self):
+        get_movies.TOP_LIST_CACHE.clear()
+
+    def teardown_method(self):
+        get_movies.TOP_LIST_CACHE.clear()
+
+    def test_top_list_is_fetched_once_and_premapped(self, monkeypatch):
+        fetch_calls = []
+
+        def fake_fetch(list_type):
+            fetch_calls.append(list_type)
+            return [make_entry(i, f"Movie {i}") for i in range(10)]
+
+        monkeypatch.setattr(get_movies, "_fetch_top_list_entries", fake_fetch)
+
+        five = get_movies.query_top_trakt_movies(num=5)
+        ten = get_movies.query_top_trakt_movies(num=10)
+        seven = get_movies.query_top_trakt_movies(num=7)
+
+        assert fetch_calls == ["trending"]
+        assert isinstance(five, MovieList)
+        assert len(five.movies) == 5
+        assert len(ten.movies) == 10
+        assert len(seven.movies) == 7
+        # Short lists keep the director, long lists use the reduced layout
+        assert five.movies[0].director == "Jane Director"
+        assert len(five.movies[0].cast) == 5
+        assert len(ten.movies[0].cast) == 3
+
+    def test_returned_lists_do_not_share_cached_state(self, monkeypatch):
+        monkeypatch.setattr(
+            get_movies, "_fetch_top_list_entries",
+            lambda list_type: [make_entry(1, "Inception")]
+        )
+        first = get_movies.query_top_trakt_movies(num=3)
+        first.movies[0].title = "Mutated"
+        second = get_movies.query_top_trakt_movies(num=3)
+        assert second.movies[0].title == "Inception"
+
+    def test_invalid_list_type_raises(self):
+        with pytest.raises(KeyError):
+            get_movies.query_top_trakt_movies(list_type="notreal")
@@ -0,0 +1,185 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from requests.adapters import BaseAdapter
+
+from agent.llm.llm_agent import LLMAgent
+from agent.llm.llm_client import LLMClient
+from agent.logic.intent_router import IntentRouter
+from agent.logic.services.trakt.filtering import map_trakt_to_movie
+from agent.logic.services.trakt.session import TraktSession, trakt_endpoint
+from agent.tests.test_variables import StubChatModel
+from agent.utils import tracing
+
+
+class CannedTraktAdapter(BaseAdapter):
+    """Transport answering every request with a fixed Trakt movie payload."""
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"title": "Heat", "year": 1995, "ids": {"trakt": 1}}).encode()
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+trakt_session = TraktSession()
+trakt_session.mount("https://", CannedTraktAdapter())
+
+
+@tool
+def lookup_movie(title: str) -> dict:
+    """Look up a movie by title."""
+    core = trakt_session.get("https://api.trakt.tv/search/movie", params={"query": title}).json()
+    trakt_session.get(f"https://api.trakt.tv/movies/{core['ids']['trakt']}/people")
+    return {"status": "success", "movie": map_trakt_to_movie(core_data=core)}
+
+
+@pytest.fixture
+def tracer(monkeypatch, tmp_path):
+    tracer = tracing.Tracer(
+        sample_rate=1.0,
+        slow_turn_seconds=None,
+        jsonl_path=str(tmp_path / "spans.jsonl"),
+        otlp_path=str(tmp_path / "spans.otlp.json"),
+        otlp_endpoint="",
+        export_in_background=False,
+    )
+    monkeypatch.setattr(tracing, "TRACER", tracer)
+    return tracer
+
+
+def by_name(spans):
+    return {span["name"]: span for span in spans}
+
+
+class TestTracing:
+    def test_agent_turn_spans_nest(self, tracer, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        llm_client = LLMClient(provider="anthropic", response_cache=None, admission=None)
+        llm_client.client = StubChatModel(responses=[
+            AIMessage(content="", tool_calls=[{"name": "lookup_movie", "args": {"title": "Heat"}, "id": "call_1"}]),
+            AIMessage(content="Heat is a 1995 crime film.", usage_metadata={
+                "input_tokens": 120, "output_tokens": 9, "total_tokens": 129,
+            }),
+        ])
+        agent = LLMAgent(llm_client=llm_client, system_prompt="You are a movie agent.", tools=[lookup_movie])
+
+        turn = tracing.start_turn("process_message", session_id="s1")
+        events = list(agent.stream([HumanMessage(content="Tell me about Heat")], parent_span=turn))
+        turn.end()
+
+        assert events[-1]["content"] == "Heat is a 1995 crime film."
+        [spans] = tracer.recent_traces()
+        named = by_name(spans)
+        assert {span["turn_id"] for span in spans} == {turn.turn_id}
+        assert named["LLMAgent.stream"]["parent_id"] == named["process_message"]["span_id"]
+        assert named["tool.lookup_movie"]["parent_id"] == named["LLMAgent.stream"]["span_id"]
+        for name in ["GET /search/movie", "GET /movies/{id}/people", "map_trakt_to_movie"]:
+            assert named[name]["parent_id"] == named["tool.lookup_movie"]["span_id"]
+        assert named["GET /search/movie"]["attributes"]["http.status_code"] == 200
+        assert [s["name"] for s in spans].count("llm.call") == 2
+        assert named["LLMAgent.stream"]["attributes"]["llm.output_tokens"] == 9
+
+    def test_router_llm_span_is_recorded_when_the_stream_fails(self, tracer, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+
+        class FailingStream(StubChatModel):
+            async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+                raise RuntimeError("overloaded_error")
+                yield
+
+        @tool
+        def get_trending(num: int = 5) -> dict:
+            """Fake trending tool."""
+            return {"status": "success", "action_prompt": "List them."}
+
+        llm_client = LLMClient(provider="anthropic", response_cache=None, admission=None)
+        llm_client.client = FailingStream(responses=[])
+        router = IntentRouter(tools={"get_trending": get_trending}, get_llm_client=lambda: llm_client)
+
+        async def run(turn):
+            intent = router.route("what's trending")
+            return [e async for e in router.astream(intent, "what's trending", parent_span=turn)]
+
+        turn = tracing.start_turn("process_message")
+        with pytest.raises(RuntimeError):
+            asyncio.run(run(turn))
+        turn.end()
+
+        named = by_name(tracer.recent_traces()[0])
+        assert named["llm.call"]["status"] == "error"
+        assert named["llm.call"]["parent_id"] == named["IntentRouter.astream"]["span_id"]
+
+    def test_exports_jsonl_and_otlp(self, tracer):
+        turn = tracing.start_turn("process_message")
+        with tracing.span("tool.get_trending", turn):
+            with pytest.raises(ValueError):
+                with tracing.span("GET /movies/trending"):
+                    raise ValueError("boom")
+        turn.end()
+
+        with open(tracer.jsonl_path) as f:
+            records = [json.loads(line) for line in f]
+        assert [r["name"] for r in records] == ["GET /movies/trending", "tool.get_trending", "process_message"]
+        assert records[0]["status"] == "error" and records[0]["error"] == "ValueError: boom"
+
+        with open(tracer.otlp_path) as f:
+            [request] = [json.loads(line) for line in f]
+        otlp_spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert {s["traceId"] for s in otlp_spans} == {turn.turn_id}
+        assert len(turn.turn_id) == 32 and all(len(s["spanId"]) == 16 for s in otlp_spans)
+        assert otlp_spans[0]["status"]["code"] == 2
+        assert otlp_spans[1]["parentSpanId"] == otlp_spans[2]["spanId"]
+
+    def test_unsampled_turn_records_nothing(self, tracer):
+        tracer.sample_rate = 0.0
+        turn = tracing.start_turn("process_message")
+        with tracing.span("tool.get_trending", turn) as span:
+            assert span is tracing.NON_RECORDING_SPAN
+        turn.end()
+        assert tracer.recent_traces() == []
+        assert not os.path.exists(tracer.jsonl_path)
+
+    def test_slow_turns_are_kept_without_sampling(self, tracer):
+        tracer.sample_rate = 0.0
+        tracer.slow_turn_seconds = 0.05
+        fast = tracing.start_turn("process_message")
+        fast.end()
+        slow = tracing.start_turn("process_message")
+        slow.start_ns -= 100_000_000  # started 0.1s ago
+        slow.end()
+
+        assert [spans[0]["turn_id"] for spans in tracer.recent_traces()] == [slow.turn_id]
+        assert tracer.stats()["recorded"] == 2
+
+    def test_bind_span_carries_trace_into_thread_pool(self, tracer):
+        turn = tracing.start_turn("process_message")
+        with tracing.span("tool.get_multiple_movie_details", turn) as tool_span:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(tracing.bind_span(lambda core: map_trakt_to_movie(core_data=core)),
+                                  [{"title": "Heat"}, {"title": "Dune"}]))
+        turn.end()
+
+        mapped = [s for s in tracer.recent_traces()[0] if s["name"] == "map_trakt_to_movie"]
+        assert len(mapped) == 2
+        assert {s["parent_id"] for s in mapped} == {tool_span.span_id}
+
+    def test_trakt_endpoint_groups_ids(self):
+        assert trakt_endpoint("https://api.trakt.tv/movies/1234/people?x=1") == "/movies/{id}/people"
+        assert trakt_endpoint("https://api.trakt.tv/movies/heat-1995") == "/movies/{id}"
+        assert trakt_endpoint("https://api.trakt.tv/search/movie?query=heat") == "/search/movie"
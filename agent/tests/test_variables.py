@@ -1,7 +1,11 @@
-from typing import Literal
-from langchain_core.messages import AIMessage
+from typing import Any, List, Literal
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
 import json
 import random
+import re
 import uuid
 
 
@@ -80,4 +84,66 @@ def create_mock_llm_response(
             "output_tokens": output_tokens,
             "total_tokens": total_tokens
         }
-    )
\ No newline at end of file
+    )
+
+class StubChatModel(BaseChatModel):
+    """
+    Scripted chat model for agent tests. Returns `responses` in order (AIMessages, which
+    may carry tool_calls) and records every call so tests can inspect what was sent.
+    Streams text word by word and tool calls as tool_call_chunks, like a real provider.
+
+    With `require_cache_markers=True` every call is checked for Anthropic prompt-cache
+    breakpoints (system prompt block and last tool schema) and rejected without them.
+    """
+    responses: List[AIMessage]
+    calls: List[dict] = Field(default_factory=list)
+    bound_tools: List[Any] = Field(default_factory=list)
+    require_cache_markers: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        self.bound_tools = list(tools)
+        return self.bind(**{k: v for k, v in kwargs.items() if v is not None})
+
+    def _check_cache_markers(self, messages) -> None:
+        system = messages[0] if messages else None
+        if system is None or system.type != "system" or not isinstance(system.content, list):
+            raise ValueError("Expected the system prompt as a list of content blocks")
+        if system.content[0].get("cache_control") != {"type": "ephemeral"}:
+            raise ValueError("System prompt block is missing cache_control")
+        if self.bound_tools and (
+            not isinstance(self.bound_tools[-1], dict)
+            or self.bound_tools[-1].get("cache_control") != {"type": "ephemeral"}
+        ):
+            raise ValueError("Last tool schema is missing cache_control")
+
+    def _next_response(self, messages, **kwargs) -> AIMessage:
+        if self.require_cache_markers:
+            self._check_cache_markers(messages)
+        self.calls.append({"messages": list(messages), "kwargs": kwargs})
+        return self.responses.pop(0)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next_response(messages, **kwargs))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        response = self._next_response(messages, **kwargs)
+        if isinstance(response.content, str) and response.content:
+            for token in re.split(r"(\s)", response.content):
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, id=response.id))
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+        if response.tool_calls or response.usage_metadata:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                id=response.id,
+                usage_metadata=response.usage_metadata,
+                tool_call_chunks=[
+                    {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                    for i, tc in enumerate(response.tool_calls)
+                ],
+            ))
@@ -0,0 +1,40 @@
+# background.py
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from agent.config import BLOCKING_IO_WORKERS
+from agent.utils.metrics import QUEUE_DEPTH
+
+# Shared pool for work that must never sit on a user's request path
+# (cache refreshes, warm-up, etc.).
+BACKGROUND_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="movie-agent-bg")
+
+
+def submit_background(fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """Run `fn(*args, **kwargs)` on the shared background executor."""
+    return BACKGROUND_EXECUTOR.submit(fn, *args, **kwargs)
+
+
+# Pool the async chat path uses for blocking Trakt/requests work, so it never starves
+# asyncio's default executor (which LangChain also uses) or the background pool above.
+BLOCKING_IO_EXECUTOR = ThreadPoolExecutor(
+    max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="movie-agent-io"
+)
+
+# Calls submitted but not yet picked up by a worker
+QUEUE_DEPTH.set_function(BACKGROUND_EXECUTOR._work_queue.qsize, queue="background")
+QUEUE_DEPTH.set_function(BLOCKING_IO_EXECUTOR._work_queue.qsize, queue="blocking_io")
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Await `fn(*args, **kwargs)` on BLOCKING_IO_EXECUTOR without blocking the event loop.
+    The caller's context variables are carried over to the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await loop.run_in_executor(BLOCKING_IO_EXECUTOR, call)
@@ -0,0 +1,187 @@
+# cache.py
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from agent.utils.background import submit_background
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU cache where every entry also expires after `ttl_seconds`.
+
+    Attributes:
+        max_entries (int): Maximum number of entries kept before the least recently
+            used entry is evicted.
+        ttl_seconds (Optional[float]): Seconds an entry stays valid. `None` disables expiry.
+        hits (int): Number of successful lookups.
+        misses (int): Number of lookups that found nothing (or an expired entry).
+
+    Example:
+        >>> cache = TTLCache(max_entries=2, ttl_seconds=60)
+        >>> cache.set("inception", {"trakt_id": 16662})
+        >>> cache.get("inception")
+        {'trakt_id': 16662}
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            stored_at, value = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def items(self) -> Iterable[Tuple[Hashable, Any]]:
+        """Return a snapshot of all unexpired (key, value) pairs, oldest first."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value)
+                for key, (stored_at, value) in self._entries.items()
+                if self.ttl_seconds is None or now - stored_at <= self.ttl_seconds
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache that always answers from memory once a key has been loaded.
+
+    Behaviour per key:
+        - First request loads synchronously through `loader(key)`.
+        - Requests older than `soft_ttl_seconds` return the cached copy immediately and
+          schedule a refresh on the shared background executor (one in flight per key).
+        - If a refresh fails the stale copy keeps being served and the error is surfaced
+          as a warning. Only when no copy exists at all does the error reach the caller.
+
+    Attributes:
+        loader (Callable[[Hashable], Any]): Function producing a fresh value for a key.
+        soft_ttl_seconds (float): Age after which a background refresh is triggered.
+        refresh_failures (int): Number of background refreshes that raised.
+    """
+
+    def __init__(self, loader: Callable[[Hashable], Any], soft_ttl_seconds: float = 600):
+        self.loader = loader
+        self.soft_ttl_seconds = soft_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return self._load(key)
+
+        stored_at, value = entry
+        self.hits += 1
+        if time.monotonic() - stored_at > self.soft_ttl_seconds:
+            self.refresh(key)
+        return value
+
+    def refresh(self, key: Hashable) -> Future:
+        """Schedule a background reload of `key`, reusing any refresh already running."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = submit_background(self._refresh_quietly, key)
+                self._in_flight[key] = future
+        return future
+
+    def prime(self, keys: Iterable[Hashable]) -> Dict[Hashable, Future]:
+        """Start background loads for every key in `keys` without blocking."""
+        return {key: self.refresh(key) for key in keys}
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since `key` was last loaded, or None if it was never loaded."""
+        entry = self._entries.get(key)
+        return None if entry is None else time.monotonic() - entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self, key: Hashable) -> Any:
+        value = self.loader(key)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+        return value
+
+    def _refresh_quietly(self, key: Hashable) -> None:
+        try:
+            self._load(key)
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_failures += 1
+            warnings.warn(
+                f"Background refresh of `{key}` failed, serving stale copy. Exception: `{e}`",
+                category=UserWarning,
+            )
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
@@ -0,0 +1,120 @@
+# compact_encoder.py
+"""
+Token-efficient serialization of action results for tool outputs.
+
+`model_dump_json(exclude_unset=True)` keeps every field `map_trakt_to_movie` sets to
+None / [] and repeats each key for every movie. The compact form drops empty values,
+sends movie lists as one header row of column names plus one row of values per movie,
+and abridges long descriptions.
+"""
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from agent.config import TOOL_OUTPUT_COMPACT, TOOL_OUTPUT_DESCRIPTION_CHARS
+from agent.llm.tokens import estimate_tokens
+from agent.models import Movie, MovieList
+
+logger = logging.getLogger(__name__)
+
+_stats = {"outputs": 0, "tokens": 0, "verbose_tokens": 0}
+_stats_lock = threading.Lock()
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _truncate(text: str, max_chars: Optional[int]) -> str:
+    """Cut `text` to at most `max_chars` at a word boundary, marking the cut with "…"."""
+    if not max_chars or len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0].rstrip(",;:.") + "…"
+
+
+def compact_dict(
+    model_instance: BaseModel,
+    description_chars: Optional[int] = TOOL_OUTPUT_DESCRIPTION_CHARS,
+) -> Dict[str, Any]:
+    """Dump a model without null / empty values and with an abridged "description"."""
+    data = {k: v for k, v in model_instance.model_dump(mode="json").items() if not _is_empty(v)}
+    if isinstance(data.get("description"), str):
+        data["description"] = _truncate(" ".join(data["description"].split()), description_chars)
+    return data
+
+
+def movie_table(
+    movies: List[Movie],
+    description_chars: Optional[int] = TOOL_OUTPUT_DESCRIPTION_CHARS,
+) -> Dict[str, Any]:
+    """
+    Encode movies as {"columns": [...], "rows": [[...], ...]}.
+
+    Columns are the Movie fields set on at least one movie, in model order; a movie
+    missing a column has null in that cell.
+    """
+    dumped = [compact_dict(movie, description_chars) for movie in movies]
+    present = set().union(*dumped) if dumped else set()
+    columns = [name for name in Movie.model_fields if name in present]
+    return {
+        "columns": columns,
+        "rows": [[movie.get(column) for column in columns] for movie in dumped],
+    }
+
+
+def encode_model_instance(
+    model_instance: Any,
+    description_chars: Optional[int] = TOOL_OUTPUT_DESCRIPTION_CHARS,
+) -> str:
+    """
+    Serialize an action result (Movie, MovieList, list of Movies or any other model) in
+    the compact form, as minified JSON.
+    """
+    if isinstance(model_instance, MovieList):
+        payload: Any = {"movies": movie_table(model_instance.movies, description_chars)}
+    elif isinstance(model_instance, list) and all(isinstance(m, Movie) for m in model_instance):
+        payload = {"movies": movie_table(model_instance, description_chars)}
+    elif isinstance(model_instance, BaseModel):
+        payload = compact_dict(model_instance, description_chars)
+    else:
+        payload = model_instance
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_tool_output(model_instance: Any, action_name: str = "") -> str:
+    """
+    Serialize an action result for a tool output and record its estimated token count.
+
+    With TOOL_OUTPUT_COMPACT off this is the previous `model_dump_json(exclude_unset=True)`.
+    """
+    verbose = (
+        model_instance.model_dump_json(exclude_unset=True)
+        if isinstance(model_instance, BaseModel) else json.dumps(model_instance, default=str)
+    )
+    text = encode_model_instance(model_instance) if TOOL_OUTPUT_COMPACT else verbose
+
+    tokens, verbose_tokens = estimate_tokens(text), estimate_tokens(verbose)
+    with _stats_lock:
+        _stats["outputs"] += 1
+        _stats["tokens"] += tokens
+        _stats["verbose_tokens"] += verbose_tokens
+    logger.info(
+        "%s tool output: ~%s tokens (~%s verbose)", action_name or "Tool", tokens, verbose_tokens
+    )
+    return text
+
+
+def tool_output_stats() -> Dict[str, Any]:
+    """
+    Return estimated tokens of all tool outputs so far, the estimate for the verbose
+    encoding of the same outputs, and the share of tokens saved.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["saved_ratio"] = (
+        round(1 - stats["tokens"] / stats["verbose_tokens"], 3) if stats["verbose_tokens"] else 0.0
+    )
+    return stats
@@ -0,0 +1,108 @@
+# import_profile.py
+"""
+Per-module import-time report, used to track startup cost across releases.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter (so nothing is
+already cached in sys.modules), then aggregates the timings by top-level package.
+
+Usage:
+    python -m agent.utils.import_profile agent.interface.chat_tab
+    python -m agent.utils.import_profile app --json import_profile.json
+    python -m agent.utils.import_profile agent.interface.chat_tab --baseline import_profile.json
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_import(module: str) -> Dict[str, object]:
+    """
+    Import `module` in a subprocess with `-X importtime` and parse the result.
+
+    Returns:
+        dict: {
+            "module": module,
+            "total_ms": cumulative import time of `module`,
+            "modules": {module_name: {"self_ms": float, "cumulative_ms": float}},
+            "packages": {top_level_package: self_ms summed over its modules}
+        }
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing `{module}` failed:\n{completed.stderr[-2000:]}")
+
+    modules: Dict[str, Dict[str, float]] = {}
+    packages: Dict[str, float] = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        modules[name] = {
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        }
+        packages[name.split(".")[0]] += int(self_us) / 1000
+
+    return {
+        "module": module,
+        "total_ms": modules.get(module, {}).get("cumulative_ms", 0.0),
+        "modules": modules,
+        "packages": dict(packages),
+    }
+
+
+def format_report(
+    profile: Dict[str, object],
+    top: int = 15,
+    baseline: Optional[Dict[str, object]] = None,
+) -> str:
+    """Render the slowest top-level packages as a plain-text table."""
+    lines = [f"Import profile for `{profile['module']}`: {profile['total_ms']:.1f} ms total"]
+    if baseline:
+        lines[0] += f" (baseline {baseline['total_ms']:.1f} ms)"
+
+    lines.append(f"{'package':<30} {'self ms':>10}" + (f" {'delta ms':>10}" if baseline else ""))
+    ranked = sorted(profile["packages"].items(), key=lambda item: item[1], reverse=True)
+    for package, self_ms in ranked[:top]:
+        line = f"{package:<30} {self_ms:>10.1f}"
+        if baseline:
+            line += f" {self_ms - baseline['packages'].get(package, 0.0):>+10.1f}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Report per-package import time for a module.")
+    parser.add_argument("module", nargs="?", default="agent.interface.chat_tab")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to show.")
+    parser.add_argument("--json", dest="json_path", help="Write the full profile to this file.")
+    parser.add_argument("--baseline", help="Profile JSON from a previous release to compare against.")
+    args = parser.parse_args(argv)
+
+    profile = profile_import(args.module)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(format_report(profile, top=args.top, baseline=baseline))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(profile, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
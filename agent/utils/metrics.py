@@ -0,0 +1,289 @@
+# metrics.py
+"""
+Process-wide metrics, rendered in the Prometheus text exposition format.
+
+Instrumented code records into the metrics defined at the bottom of this module
+(latency histograms per tool and per Trakt endpoint, tokens per turn, ...). Values that
+already live elsewhere, such as cache hit counts, session counts and queue depths, are
+read when the metrics are rendered, through functions registered with `set_function` /
+`register_cache`. app.py serves `METRICS.render()` at METRICS_PATH.
+"""
+import logging
+import math
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds: from a warm cache lookup to a slow LLM-backed tool
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Tokens per chat turn
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names. Each combination of label values is
+    one series; label values are passed as keyword arguments.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, Any] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        """Read the series' value from `fn()` whenever the metrics are rendered."""
+        self._functions[self._key(labels)] = fn
+
+    def value(self, **labels) -> Any:
+        """Current value of one series (None if it has not been recorded)."""
+        key = self._key(labels)
+        if key in self._functions:
+            return self._functions[key]()
+        with self._lock:
+            return self._values.get(key)
+
+    def _samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+        for key, fn in list(self._functions.items()):
+            try:
+                value = fn()
+            except Exception as e:
+                logger.warning("Metric %s%s could not be read: %s", self.name, key, e)
+                continue
+            if value is not None:
+                yield self.name, dict(zip(self.labelnames, key)), value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """A count that only goes up (or is read from a running total with `set_function`)."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative `le` buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (not yet cumulative), then sum and count
+                series = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def value(self, **labels) -> Optional[Dict[str, Any]]:
+        """{"buckets": {le: cumulative count}, "sum", "count"} of one series."""
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                return None
+            cumulative, total = {}, 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                total += count
+                cumulative[bound] = total
+            return {"buckets": cumulative, "sum": series["sum"], "count": series["count"]}
+
+    def _samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            keys = list(self._values)
+        for key in keys:
+            labels = dict(zip(self.labelnames, key))
+            series = self.value(**labels)
+            for bound, count in series["buckets"].items():
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, series["count"]
+            yield f"{self.name}_sum", labels, series["sum"]
+            yield f"{self.name}_count", labels, series["count"]
+
+
+class MetricsRegistry:
+    """The metrics to render, in registration order. Registering a name twice returns
+    the metric registered first."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"{metric.name} is already registered as a {existing.kind}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labelnames))
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, description, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, description, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+# --- Recorded by the code they measure ---
+TOOL_DURATION = METRICS.histogram(
+    "movie_agent_tool_duration_seconds",
+    "Run time of agent tool calls.",
+    ["tool", "status"],
+)
+TRAKT_REQUEST_DURATION = METRICS.histogram(
+    "movie_agent_trakt_request_duration_seconds",
+    "Duration of Trakt API requests, by endpoint template.",
+    ["method", "endpoint", "status"],
+)
+TURN_DURATION = METRICS.histogram(
+    "movie_agent_turn_duration_seconds",
+    "Duration of chat turns, from the user's message to the final reply.",
+    ["route"],
+)
+TURN_TOKENS = METRICS.histogram(
+    "movie_agent_turn_tokens",
+    "LLM tokens used per chat turn, summed over its model calls.",
+    ["route", "direction"],
+    buckets=TOKEN_BUCKETS,
+)
+TURNS_IN_PROGRESS = METRICS.gauge(
+    "movie_agent_turns_in_progress",
+    "Chat turns being processed.",
+)
+
+# --- Read from their owners when rendered ---
+CACHE_LOOKUPS = METRICS.counter(
+    "movie_agent_cache_lookups_total",
+    "Cache lookups, by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+ACTIVE_SESSIONS = METRICS.gauge(
+    "movie_agent_active_sessions",
+    "Chat sessions with history held in memory.",
+)
+QUEUE_DEPTH = METRICS.gauge(
+    "movie_agent_queue_depth",
+    "Work waiting to start, by queue.",
+    ["queue"],
+)
+IN_FLIGHT = METRICS.gauge(
+    "movie_agent_in_flight",
+    "Work running now, by queue.",
+    ["queue"],
+)
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    """Report a cache's running "hits" / "misses" counts (from `stats()`) as CACHE_LOOKUPS."""
+    CACHE_LOOKUPS.set_function(lambda: stats()["hits"], cache=name, result="hit")
+    CACHE_LOOKUPS.set_function(lambda: stats()["misses"], cache=name, result="miss")
+
+
+def record_turn_tokens(route: str, input_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    """Record one turn's LLM input and output tokens in TURN_TOKENS."""
+    if input_tokens is not None:
+        TURN_TOKENS.observe(input_tokens, route=route, direction="input")
+    if output_tokens is not None:
+        TURN_TOKENS.observe(output_tokens, route=route, direction="output")
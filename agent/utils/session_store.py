@@ -0,0 +1,301 @@
+# session_store.py
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from agent.config import (
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_MAX_ENTITIES,
+    SESSION_MAX_MESSAGES,
+    SESSION_MAX_SESSIONS,
+    SESSION_STORE_MAX_BYTES,
+)
+from agent.utils.metrics import ACTIVE_SESSIONS
+
+
+def message_size(message: BaseMessage) -> int:
+    """Approximate bytes held by a message: the UTF-8 size of its content."""
+    return len(str(message.content).encode("utf-8"))
+
+
+class ConversationSession:
+    """
+    History of one chat session, kept in a ring buffer of at most `max_messages`.
+
+    Attributes:
+        messages (deque): Most recent messages, oldest first.
+        bytes (int): Approximate size of `messages` and `summary` (see `message_size`).
+        last_seen (float): `time.monotonic()` of the last read or write.
+        summary (str): Rolling summary of the messages before `summarized_through`.
+        appended (int): Total messages ever appended (the next message's index).
+        summarized_through (int): Index of the first message not folded into `summary`.
+        entities (OrderedDict): Movies resolved by tools this session, keyed by trakt_id,
+            least recently mentioned first.
+        focus_trakt_id (Optional[int]): The last single movie the user looked at, which
+            "it" / "that one" refer to.
+    """
+
+    def __init__(self, max_messages: int):
+        self.messages: deque = deque(maxlen=max_messages)
+        self.bytes = 0
+        self.last_seen = time.monotonic()
+        self.summary = ""
+        self.appended = 0
+        self.summarized_through = 0
+        self.entities: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.focus_trakt_id: Optional[int] = None
+
+    @property
+    def first_index(self) -> int:
+        """Index of the oldest message still in the buffer."""
+        return self.appended - len(self.messages)
+
+    def unsummarized(self) -> List[BaseMessage]:
+        """Messages not yet folded into `summary`, oldest first."""
+        skip = max(0, self.summarized_through - self.first_index)
+        return list(self.messages)[skip:]
+
+    def append(self, message: BaseMessage) -> int:
+        """Add `message`, dropping the oldest one if the buffer is full. Returns messages dropped."""
+        dropped = 0
+        if len(self.messages) == self.messages.maxlen:
+            self.bytes -= message_size(self.messages[0])
+            dropped = 1
+        self.messages.append(message)
+        self.bytes += message_size(message)
+        self.appended += 1
+        return dropped
+
+    def set_summary(self, summary: str, through: int) -> None:
+        self.bytes += len(summary.encode("utf-8")) - len(self.summary.encode("utf-8"))
+        self.summary = summary
+        self.summarized_through = max(self.summarized_through, through)
+
+    def trim_oldest(self) -> None:
+        self.bytes -= message_size(self.messages.popleft())
+
+
+class ConversationStore:
+    """
+    Thread-safe per-session conversation history with bounded memory.
+
+    Each session keeps its own ring buffer of messages. Sessions idle for longer than
+    `idle_ttl_seconds` are dropped, and the least recently used sessions are evicted
+    once there are more than `max_sessions` or the store holds more than `max_bytes`.
+
+    Example:
+        >>> store = ConversationStore(max_messages=20)
+        >>> store.append("session-a", HumanMessage(content="What's trending?"))
+        >>> store.history("session-a")
+        [HumanMessage(content="What's trending?")]
+    """
+
+    def __init__(
+        self,
+        max_messages: int = SESSION_MAX_MESSAGES,
+        idle_ttl_seconds: Optional[float] = SESSION_IDLE_TTL_SECONDS,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        max_bytes: int = SESSION_STORE_MAX_BYTES,
+    ):
+        self.max_messages = max_messages
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self.trimmed_messages = 0
+        # Least recently used session first
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _touch(self, session_id: str) -> ConversationSession:
+        """Return the session (creating it) and mark it most recently used. Caller holds the lock."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = ConversationSession(self.max_messages)
+            self._sessions[session_id] = session
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_seen = time.monotonic()
+        return session
+
+    def _evict_idle(self) -> None:
+        if self.idle_ttl_seconds is None:
+            return
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        # Sessions are ordered by last use, so idle ones are all at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_seen > cutoff:
+                break
+            self._drop(session_id)
+            self.evicted_idle += 1
+
+    def _enforce_caps(self, keep_session_id: str) -> None:
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == keep_session_id:
+                break
+            self._drop(oldest_id)
+            self.evicted_lru += 1
+
+        # A single session larger than the cap loses its oldest messages instead
+        session = self._sessions.get(keep_session_id)
+        while session and self._bytes > self.max_bytes and len(session.messages) > 1:
+            before = session.bytes
+            session.trim_oldest()
+            self._bytes -= before - session.bytes
+            self.trimmed_messages += 1
+
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.bytes
+
+    def append(self, session_id: str, message: BaseMessage) -> None:
+        """Append `message` to the session's history, creating the session if needed."""
+        with self._lock:
+            self._evict_idle()
+            session = self._touch(session_id)
+            before = session.bytes
+            self.trimmed_messages += session.append(message)
+            self._bytes += session.bytes - before
+            self._enforce_caps(keep_session_id=session_id)
+
+    def history(
+        self,
+        session_id: str,
+        last: Optional[int] = None,
+        include_summarized: bool = True,
+    ) -> List[BaseMessage]:
+        """
+        Return the session's messages (only the `last` N if given), oldest first.
+        With `include_summarized=False`, messages already folded into the summary are left out.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            self._touch(session_id)
+            messages = list(session.messages) if include_summarized else session.unsummarized()
+        return messages[-last:] if last else messages
+
+    # --- ROLLING SUMMARY ---
+    def summary(self, session_id: str) -> str:
+        """Return the session's rolling summary ("" if there is none yet)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.summary if session else ""
+
+    def messages_to_summarize(
+        self,
+        session_id: str,
+        keep_recent: int,
+    ) -> Tuple[str, List[BaseMessage], int]:
+        """
+        Return what should be folded into the summary next: every unsummarized message
+        except the `keep_recent` most recent ones.
+
+        Returns:
+            tuple: (current summary, messages to fold in, index to pass to `set_summary`)
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return "", [], 0
+            pending = session.unsummarized()
+            to_fold = pending[:max(0, len(pending) - keep_recent)]
+            return session.summary, to_fold, session.appended - len(pending) + len(to_fold)
+
+    def set_summary(self, session_id: str, summary: str, through: int) -> None:
+        """Store a new summary covering every message before index `through`."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            before = session.bytes
+            session.set_summary(summary, through)
+            self._bytes += session.bytes - before
+
+    # --- ENTITY MEMORY ---
+    def remember_movies(
+        self,
+        session_id: str,
+        movies: Iterable[Dict[str, Any]],
+        focus: bool = False,
+    ) -> None:
+        """
+        Record movies ({"title", "year", "trakt_id"}) a tool resolved for this session.
+        With `focus=True` the last one becomes what "it" / "that one" refer to.
+        """
+        with self._lock:
+            session = self._touch(session_id)
+            for movie in movies:
+                trakt_id = movie.get("trakt_id")
+                if not trakt_id:
+                    continue
+                session.entities[trakt_id] = {
+                    "title": movie.get("title"),
+                    "year": movie.get("year"),
+                    "trakt_id": trakt_id,
+                }
+                session.entities.move_to_end(trakt_id)
+                if focus:
+                    session.focus_trakt_id = trakt_id
+            while len(session.entities) > SESSION_MAX_ENTITIES:
+                session.entities.popitem(last=False)
+
+    def entities(self, session_id: str) -> List[Dict[str, Any]]:
+        """Return the session's remembered movies, most recently mentioned last."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return list(session.entities.values()) if session else []
+
+    def focus_entity(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the movie "it" refers to in this session, if any."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.focus_trakt_id is None:
+                return None
+            return session.entities.get(session.focus_trakt_id)
+
+    def drop(self, session_id: str) -> None:
+        """Forget a session entirely (e.g. when its browser tab closes)."""
+        with self._lock:
+            self._drop(session_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return live sessions, messages and bytes held plus eviction counters."""
+        with self._lock:
+            self._evict_idle()
+            return {
+                "sessions": len(self._sessions),
+                "messages": sum(len(s.messages) for s in self._sessions.values()),
+                "bytes": self._bytes,
+                "evicted_idle": self.evicted_idle,
+                "evicted_lru": self.evicted_lru,
+                "trimmed_messages": self.trimmed_messages,
+            }
+
+
+# Shared store used by the chat tab
+CONVERSATION_STORE = ConversationStore()
+ACTIVE_SESSIONS.set_function(lambda: CONVERSATION_STORE.stats()["sessions"])
+
+# Session of the chat turn being processed, so tools can reach its entity memory
+CURRENT_SESSION_ID: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
@@ -0,0 +1,151 @@
+# tool_memo.py
+"""
+Memoization of read-only action calls made by the agent's tools.
+
+Within one turn the model sometimes asks for the same movie twice, or for the same
+list again after a follow-up tool call. Tools run their read actions through
+`memoized_call`, which returns the stored result for repeated normalized arguments.
+The memo is bound per turn (or, with TOOL_MEMO_SCOPE="session", per chat session for
+TOOL_MEMO_SESSION_TTL_SECONDS) through CURRENT_TOOL_MEMO. Write actions are never run
+through it; they call `forget` for the reads they make stale.
+"""
+import json
+import threading
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from agent.config import (
+    SESSION_MAX_SESSIONS,
+    TOOL_MEMO_ENABLED,
+    TOOL_MEMO_SCOPE,
+    TOOL_MEMO_SESSION_TTL_SECONDS,
+)
+from agent.utils.cache import TTLCache
+from agent.utils.metrics import register_cache
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+class ToolMemo:
+    """
+    Results of memoized calls, keyed by (name, normalized arguments). A call that is
+    still running is stored as a Future, so identical calls made concurrently (e.g. in
+    one model message) wait for the first one instead of repeating it.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def call(self, name: str, fn: Callable[..., Any], **kwargs) -> Any:
+        key = (name, normalize_args(kwargs))
+        with self._lock:
+            future = self._entries.get(key)
+            owner = future is None
+            if owner:
+                future = self._entries[key] = Future()
+
+        with _stats_lock:
+            _stats["misses" if owner else "hits"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = fn(**kwargs)
+        except BaseException as e:
+            self._discard(key)
+            future.set_exception(e)
+            raise
+        if isinstance(result, dict) and result.get("status") == "error":
+            # Failures are worth retrying
+            self._discard(key)
+        future.set_result(result)
+        return result
+
+    def _discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def forget(self, name: str) -> None:
+        """Drop every stored result of `name`."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == name]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Memo of the turn being run; bound by the agent middleware for each tool call
+CURRENT_TOOL_MEMO: ContextVar[Optional[ToolMemo]] = ContextVar("current_tool_memo", default=None)
+
+_session_memos = TTLCache(max_entries=SESSION_MAX_SESSIONS, ttl_seconds=TOOL_MEMO_SESSION_TTL_SECONDS)
+_session_memos_lock = threading.Lock()
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v is not None}
+    return value
+
+
+def normalize_args(kwargs: Dict[str, Any]) -> str:
+    """
+    Canonical form of call arguments: None values dropped, strings lowercased with
+    collapsed whitespace, keys sorted.
+    """
+    normalized = {k: _normalize(v) for k, v in kwargs.items() if v is not None}
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def memo_for_turn(session_id: Optional[str] = None) -> Optional[ToolMemo]:
+    """
+    The memo a new turn should bind: a fresh one, or the session's while it is younger
+    than TOOL_MEMO_SESSION_TTL_SECONDS with TOOL_MEMO_SCOPE="session". None if disabled.
+    """
+    if not TOOL_MEMO_ENABLED:
+        return None
+    if TOOL_MEMO_SCOPE != "session" or not session_id:
+        return ToolMemo()
+    with _session_memos_lock:
+        memo = _session_memos.get(session_id)
+        if memo is None:
+            memo = ToolMemo()
+            _session_memos.set(session_id, memo)
+        return memo
+
+
+def memoized_call(name: str, fn: Callable[..., Any], **kwargs) -> Any:
+    """
+    Call `fn(**kwargs)` through the current turn's memo. Outside a turn (no memo bound)
+    this is a plain call. Only use it for actions that do not change anything.
+    """
+    memo = CURRENT_TOOL_MEMO.get()
+    if memo is None:
+        return fn(**kwargs)
+    return memo.call(name, fn, **kwargs)
+
+
+def forget(name: str) -> None:
+    """Drop the current memo's results for `name` (e.g. the watchlist after editing it)."""
+    memo = CURRENT_TOOL_MEMO.get()
+    if memo is not None:
+        memo.forget(name)
+
+
+def tool_memo_stats() -> Dict[str, Any]:
+    """Return memo hits / misses over all turns and the hit rate."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] / lookups) if lookups else 0.0
+    return stats
+
+
+register_cache("tool_memo", tool_memo_stats)
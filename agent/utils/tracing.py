@@ -0,0 +1,390 @@
+# tracing.py
+"""
+Lightweight per-turn tracing.
+
+Each chat turn is one trace, identified by its turn id, made of nested spans:
+process_message → LLMAgent.astream → each model call and each tool → each Trakt HTTP
+request and `map_trakt_to_movie`. Spans are timed with `time.time_ns()` and carry a few
+attributes (tool name, Trakt endpoint, status code, tokens...).
+
+Whether a turn is recorded is decided once, when it starts (TRACE_SAMPLE_RATE). With
+TRACE_SLOW_TURN_SECONDS set, every turn is recorded and those that were not sampled are
+still kept if they took at least that long. Finished traces are kept in memory
+(`recent_traces`) and written off the request path as JSONL (one span per line) and/or
+as OTLP/JSON (an OpenTelemetry ExportTraceServiceRequest per turn, to a file or a
+collector's /v1/traces endpoint).
+
+Spans nest through CURRENT_SPAN. Code that hands work to its own thread pool wraps the
+function with `bind_span` so the calls made there stay in the turn's trace. Outside a
+recorded turn every helper here is a cheap no-op.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from agent.config import (
+    TRACE_JSONL_PATH,
+    TRACE_OTLP_ENDPOINT,
+    TRACE_OTLP_PATH,
+    TRACE_SAMPLE_RATE,
+    TRACE_SLOW_TURN_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Resource and instrumentation scope names in OTLP output
+SERVICE_NAME = "movie-agent"
+SCOPE_NAME = "agent.utils.tracing"
+# Finished traces kept for `recent_traces`
+RECENT_TRACES = 50
+# Spans recorded per trace at most (a runaway turn should not hold unbounded memory)
+MAX_SPANS_PER_TRACE = 1000
+
+
+class Trace:
+    """Finished spans of one turn. `sampled` is the head sampling decision."""
+
+    def __init__(self, tracer: "Tracer", sampled: bool):
+        self.tracer = tracer
+        self.turn_id = uuid.uuid4().hex
+        self.sampled = sampled
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(record)
+            else:
+                self.dropped += 1
+
+
+class Span:
+    """
+    A timed operation within a turn. Create them with `start_turn` / `start_span` /
+    `span`; call `end()` exactly once (the `span` context manager does).
+    """
+
+    recording = True
+
+    def __init__(self, trace: Trace, name: str, parent: Optional["Span"] = None, **attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes: Dict[str, Any] = {k: v for k, v in attributes.items() if v is not None}
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    @property
+    def turn_id(self) -> str:
+        return self.trace.turn_id
+
+    def child(self, name: str, **attributes) -> "Span":
+        return Span(self.trace, name, parent=self, **attributes)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_error(self, error: BaseException | str) -> None:
+        self.status = "error"
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self.trace.add(self.to_record())
+        if self.parent_id is None:
+            self.trace.tracer.finish(self.trace, self)
+
+    @property
+    def duration_seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_record(self) -> Dict[str, Any]:
+        """The span as one JSONL record."""
+        return {
+            "turn_id": self.turn_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_nano": self.start_ns,
+            "end_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_seconds * 1000, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class _NonRecordingSpan:
+    """Stands in for spans of turns that are not recorded; every method is a no-op."""
+
+    recording = False
+    turn_id = None
+
+    def child(self, name: str, **attributes) -> "_NonRecordingSpan":
+        return self
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+    def record_error(self, error: BaseException | str) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NON_RECORDING_SPAN = _NonRecordingSpan()
+
+# Innermost open span of the running turn; bound by `span` and `bind_span`
+CURRENT_SPAN: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+
+
+# --- Export formats ---
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def to_otlp(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Span records of one turn as an OTLP/JSON ExportTraceServiceRequest, which an
+    OpenTelemetry collector accepts on POST /v1/traces.
+    """
+    otlp_spans = []
+    for record in spans:
+        span = {
+            "traceId": record["turn_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(record["start_unix_nano"]),
+            "endTimeUnixNano": str(record["end_unix_nano"]),
+            "attributes": _otlp_attributes(record["attributes"]),
+            # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+            "status": {"code": 2, "message": record["error"]} if record["status"] == "error" else {"code": 1},
+        }
+        if record["parent_id"]:
+            span["parentSpanId"] = record["parent_id"]
+        otlp_spans.append(span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": otlp_spans}],
+        }]
+    }
+
+
+class Tracer:
+    """
+    Starts traces and exports the finished ones.
+
+    Attributes:
+        sample_rate (float): Share of turns recorded and exported (0 to 1).
+        slow_turn_seconds (Optional[float]): Also record every other turn, and export it
+            if it took at least this long (None: only sampled turns are recorded).
+        jsonl_path (str): File the spans of exported turns are appended to, one per line.
+        otlp_path (str): File each exported turn is appended to as one OTLP/JSON line.
+        otlp_endpoint (str): OTLP/HTTP collector URL (e.g. http://localhost:4318/v1/traces).
+        export_in_background (bool): Write files / post to the collector on the shared
+            background executor rather than on the thread ending the turn.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        slow_turn_seconds: Optional[float] = TRACE_SLOW_TURN_SECONDS,
+        jsonl_path: str = TRACE_JSONL_PATH,
+        otlp_path: str = TRACE_OTLP_PATH,
+        otlp_endpoint: str = TRACE_OTLP_ENDPOINT,
+        export_in_background: bool = True,
+    ):
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.slow_turn_seconds = slow_turn_seconds or None
+        self.jsonl_path = jsonl_path
+        self.otlp_path = otlp_path
+        self.otlp_endpoint = otlp_endpoint
+        self.export_in_background = export_in_background
+
+        self._recent: Deque[List[Dict[str, Any]]] = deque(maxlen=RECENT_TRACES)
+        self._stats = {"turns": 0, "recorded": 0, "exported": 0, "export_errors": 0}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    def start_turn(self, name: str, **attributes) -> Any:
+        """Root span of a new turn, or NON_RECORDING_SPAN if the turn is not recorded."""
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        with self._lock:
+            self._stats["turns"] += 1
+            self._stats["recorded"] += int(sampled or self.slow_turn_seconds is not None)
+        if not sampled and self.slow_turn_seconds is None:
+            return NON_RECORDING_SPAN
+        return Span(Trace(self, sampled), name, **attributes)
+
+    def finish(self, trace: Trace, root: Span) -> None:
+        """Called when a turn's root span ends: keep and export the trace if it qualifies."""
+        slow = self.slow_turn_seconds is not None and root.duration_seconds >= self.slow_turn_seconds
+        if not (trace.sampled or slow):
+            return
+        if slow:
+            logger.info("Slow turn %s took %.2fs", trace.turn_id, root.duration_seconds)
+        with trace._lock:
+            spans = list(trace.spans)
+        with self._lock:
+            self._recent.append(spans)
+            self._stats["exported"] += 1
+
+        if self.jsonl_path or self.otlp_path or self.otlp_endpoint:
+            if self.export_in_background:
+                from agent.utils.background import submit_background
+
+                submit_background(self.export, spans)
+            else:
+                self.export(spans)
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        """Write one turn's spans to every configured destination."""
+        try:
+            with self._file_lock:
+                if self.jsonl_path:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.writelines(json.dumps(record, default=str) + "\n" for record in spans)
+                if self.otlp_path:
+                    with open(self.otlp_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(to_otlp(spans), default=str) + "\n")
+            if self.otlp_endpoint:
+                import requests
+
+                response = requests.post(self.otlp_endpoint, json=to_otlp(spans), timeout=5)
+                response.raise_for_status()
+        except Exception as e:
+            with self._lock:
+                self._stats["export_errors"] += 1
+            logger.warning("Trace export failed: %s", e)
+
+    def recent_traces(self, limit: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Span records of the last exported turns, oldest first."""
+        with self._lock:
+            traces = list(self._recent)
+        return traces[-limit:] if limit else traces
+
+    def stats(self) -> Dict[str, int]:
+        """Turns started, recorded and exported, and failed exports."""
+        with self._lock:
+            return dict(self._stats)
+
+
+TRACER = Tracer()
+
+
+# --- Span helpers ---
+def start_turn(name: str, **attributes) -> Any:
+    """Root span of a new turn on the shared TRACER (not bound to CURRENT_SPAN)."""
+    return TRACER.start_turn(name, **attributes)
+
+
+def start_span(name: str, parent: Optional[Any] = None, **attributes) -> Any:
+    """
+    Child of `parent` (default: CURRENT_SPAN), not bound to CURRENT_SPAN. Use it where
+    the span outlives one synchronous block, e.g. across the yields of a generator.
+    """
+    parent = parent if parent is not None else CURRENT_SPAN.get()
+    if parent is None:
+        return NON_RECORDING_SPAN
+    return parent.child(name, **attributes)
+
+
+@contextmanager
+def span(name: str, parent: Optional[Any] = None, **attributes) -> Iterator[Any]:
+    """
+    Time the block as a child of `parent` (default: CURRENT_SPAN), bound as CURRENT_SPAN
+    inside it. An exception marks the span as failed and is re-raised.
+    """
+    current = start_span(name, parent, **attributes)
+    if not current.recording:
+        yield current
+        return
+    token = CURRENT_SPAN.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.record_error(e)
+        raise
+    finally:
+        CURRENT_SPAN.reset(token)
+        current.end()
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator: run the function in a span (named after it by default)."""
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        span_name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            parent = CURRENT_SPAN.get()
+            if parent is None or not parent.recording:
+                return fn(*args, **kwargs)
+            with span(span_name, parent):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def bind_span(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap `fn` to run under the caller's current span, for work submitted to a thread
+    pool (which does not inherit context variables).
+    """
+    parent = CURRENT_SPAN.get()
+    if parent is None or not parent.recording:
+        return fn
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = CURRENT_SPAN.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            CURRENT_SPAN.reset(token)
+
+    return wrapper
+
+
+def current_turn_id() -> Optional[str]:
+    """Turn id of the recorded turn being run, if any."""
+    current = CURRENT_SPAN.get()
+    return current.turn_id if current is not None else None
@@ -0,0 +1,79 @@
+# warmup.py
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from agent.llm.llm_client import LLMClient
+from agent.logic.services.trakt.session import warm_trakt_connections
+from agent.logic.services.trakt.get_movies import TOP_LIST_CACHE
+from agent.logic.services.trakt.trakt_lists import mirror_user_list
+from agent.utils.background import submit_background
+
+logger = logging.getLogger(__name__)
+
+# Top lists prefetched on startup
+WARMUP_TOP_LISTS = ("trending", "popular")
+
+
+def run_warmup(get_llm_client: Optional[Callable[[], LLMClient]] = None) -> dict:
+    """
+    Warm every cold path the first user after a deploy would otherwise pay for.
+
+    Steps (run concurrently, each timed independently):
+        - Open pooled TLS connections to Trakt.
+        - Build the LLM client and open its provider connection (if `get_llm_client` is given).
+        - Prefetch the WARMUP_TOP_LISTS into TOP_LIST_CACHE.
+        - Mirror the configured account's watchlist into USER_LIST_CACHE.
+
+    A failing step never stops the others; it is reported under "failed".
+
+    Returns:
+        dict: {
+            "warmed": {step_name: seconds},
+            "failed": {step_name: error message},
+            "total_seconds": float
+        }
+    """
+    steps: Dict[str, Callable[[], object]] = {
+        "trakt_connections": warm_trakt_connections,
+        "watchlist": lambda: mirror_user_list(list_type="watchlist"),
+    }
+    if get_llm_client is not None:
+        steps["llm_connection"] = lambda: get_llm_client().warm_connection()
+    for list_type in WARMUP_TOP_LISTS:
+        steps[f"top_list:{list_type}"] = lambda list_type=list_type: TOP_LIST_CACHE.get(list_type)
+
+    def timed(step: Callable[[], object]) -> float:
+        step_start = time.perf_counter()
+        step()
+        return time.perf_counter() - step_start
+
+    report = {"warmed": {}, "failed": {}, "total_seconds": 0.0}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+        futures = {name: executor.submit(timed, step) for name, step in steps.items()}
+        for name, future in futures.items():
+            try:
+                report["warmed"][name] = round(future.result(), 3)
+            except Exception as e:
+                report["failed"][name] = str(e)
+
+    report["total_seconds"] = round(time.perf_counter() - start, 3)
+
+    logger.info(
+        "Warm-up finished in %ss | warmed: %s | failed: %s",
+        report["total_seconds"], report["warmed"], report["failed"],
+    )
+    return report
+
+
+def start_warmup(get_llm_client: Optional[Callable[[], LLMClient]] = None) -> Future:
+    """
+    Run `run_warmup` on the shared background executor so app startup is not delayed.
+
+    Returns:
+        Future: Resolves to the warm-up report.
+    """
+    return submit_background(run_warmup, get_llm_client)
@@ -1,5 +1,6 @@
 # app.py
 
+import atexit
 import os
 import gradio as gr
 from dotenv import load_dotenv
@@ -8,11 +9,13 @@ from dotenv import load_dotenv
 # Load .env for local
 load_dotenv()
 
-from agent.interface.chat_tab import get_chat_tab
-from agent.interface.login_tab import get_login_tab
-
-
-from agent import config
+# The agent modules are imported after load_dotenv(): agent.config reads the
+# environment when it is first imported
+from agent import config  # noqa: E402
+from agent.interface.chat_tab import get_chat_tab  # noqa: E402
+from agent.interface.login_tab import get_login_tab  # noqa: E402
+from agent.logic.services.trakt.get_movies import start_top_list_refresher  # noqa: E402
+from agent.movie_agent import get_llm_client, start_movie_agent_build  # noqa: E402
 
 with gr.Blocks(
     css="""
@@ -59,4 +62,39 @@ with gr.Blocks(
     # with gr.Tab("Step 2: Chat + Trakt Setup"):
     get_chat_tab()
 
-demo.launch()
+# Start from a cache snapshot exported by another node, if one is configured
+if config.CACHE_SNAPSHOT_PATH:
+    from agent.logic.services.trakt.snapshot import export_cache_snapshot, load_cache_snapshot
+    if os.path.exists(config.CACHE_SNAPSHOT_PATH):
+        print(f"Loaded cache snapshot: {load_cache_snapshot(config.CACHE_SNAPSHOT_PATH)}")
+    if config.CACHE_SNAPSHOT_SAVE_ON_EXIT:
+        atexit.register(export_cache_snapshot, config.CACHE_SNAPSHOT_PATH)
+
+# Keep trending/popular lists warm in the background (no-op unless configured)
+start_top_list_refresher()
+
+# Build the LLM client + agent graph in the background instead of at import time
+start_movie_agent_build()
+
+# Optionally warm connections and caches without delaying launch
+if config.STARTUP_WARMUP:
+    from agent.warmup import start_warmup
+    start_warmup(get_llm_client=get_llm_client)
+
+if config.METRICS_ENABLED:
+    # Serve Prometheus metrics from the same server as the UI
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+    from agent.utils.metrics import METRICS
+
+    app = FastAPI()
+
+    @app.get(config.METRICS_PATH, include_in_schema=False)
+    def metrics() -> PlainTextResponse:
+        return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+    app = gr.mount_gradio_app(app, demo, path="/")
+    uvicorn.run(app, host=config.SERVER_NAME, port=config.SERVER_PORT)
+else:
+    demo.launch()